@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Script to add the ai_summary_cache table and the summary_jobs.source column.
+
+Seeds the cache with the summaries already stored on unencrypted pastes, so
+forks and reposts of those pastes are answered from it straight away. Run
+add_summary_jobs_table.py first.
+
+This should be run as a one-time migration.
+"""
+
+import sys
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+# Add the current directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from app import db
+    from models import AISummaryCache
+    from utils import SUMMARY_MODEL, SUMMARY_PROMPT_VERSION
+    from utils.summary_cache import TTL, content_hash
+except ImportError as e:
+    print(f"Error importing required modules: {e}")
+    sys.exit(1)
+
+# Pastes read per round trip while seeding
+SEED_BATCH = 1000
+
+def seed_summary_cache(conn):
+    """Copy existing paste summaries into the cache; returns the number of entries added"""
+    now = datetime.utcnow()
+    rows = conn.execute(text("""
+        SELECT content, syntax, ai_summary FROM pastes
+        WHERE ai_summary IS NOT NULL AND ai_summary != '' AND NOT COALESCE(is_encrypted, FALSE)
+    """))
+    added = 0
+    while batch := rows.fetchmany(SEED_BATCH):
+        entries = [{
+            'content_hash': content_hash(row.content),
+            'language': (row.syntax or '').lower(),
+            'model': SUMMARY_MODEL,
+            'prompt_version': SUMMARY_PROMPT_VERSION,
+            'summary': row.ai_summary,
+            'now': now,
+            'expires_at': now + timedelta(seconds=TTL),
+        } for row in batch]
+        added += conn.execute(text("""
+            INSERT INTO ai_summary_cache (content_hash, language, model, prompt_version, summary, created_at, expires_at)
+            VALUES (:content_hash, :language, :model, :prompt_version, :summary, :now, :expires_at)
+            ON CONFLICT (content_hash, language, model, prompt_version) DO NOTHING
+        """), entries).rowcount
+    return added
+
+def add_ai_summary_cache_table():
+    """Add the ai_summary_cache table and summary_jobs.source, then seed the cache"""
+    inspector = inspect(db.engine)
+    
+    try:
+        if 'summary_jobs' in inspector.get_table_names():
+            columns = [column['name'] for column in inspector.get_columns('summary_jobs')]
+            if 'source' not in columns:
+                with db.engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE summary_jobs ADD COLUMN source VARCHAR(20)"))
+                print("Successfully added 'source' column to summary_jobs table")
+        
+        # Check if the table already exists
+        if 'ai_summary_cache' in inspector.get_table_names():
+            print("ai_summary_cache table already exists. Skipping.")
+            return False
+        
+        AISummaryCache.__table__.create(db.engine)
+        print("Successfully created ai_summary_cache table")
+        
+        with db.engine.begin() as conn:
+            added = seed_summary_cache(conn)
+        print(f"Seeded the cache with {added} existing paste summaries")
+        return True
+    except SQLAlchemyError as e:
+        print(f"Error creating ai_summary_cache table: {e}")
+        return False
+
+def main():
+    """Main entry point for the script."""
+    print("Starting migration: Adding ai_summary_cache table...")
+    
+    from app import app
+    with app.app_context():
+        result = add_ai_summary_cache_table()
+    
+    if result:
+        print("Migration completed successfully")
+    else:
+        print("Migration finished with errors or was skipped")
+
+if __name__ == "__main__":
+    main()
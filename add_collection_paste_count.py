@@ -0,0 +1,63 @@
+"""
+Script to add the denormalised paste_count column to the paste_collections table.
+
+The column is filled from the pastes table once here and maintained by the
+application afterwards (see utils/collection_counts.py).
+
+This should be run as a one-time migration.
+"""
+import os
+import sys
+
+from sqlalchemy import create_engine, MetaData, text
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.collection_counts import reconcile_collection_counts
+
+def add_collection_paste_count():
+    """Add paste_count column to paste_collections and backfill it"""
+    try:
+        # Create the database engine
+        engine = create_engine(os.environ.get('DATABASE_URL'))
+        
+        # Reflect existing tables
+        metadata = MetaData()
+        metadata.reflect(bind=engine, only=['paste_collections'])
+        
+        column_exists = 'paste_count' in metadata.tables['paste_collections'].columns
+        
+        with engine.begin() as conn:
+            if not column_exists:
+                conn.execute(text('ALTER TABLE paste_collections ADD COLUMN paste_count INTEGER NOT NULL DEFAULT 0'))
+                print("Added paste_count column to paste_collections table")
+            else:
+                print("paste_count column already exists in paste_collections table")
+            
+            fixed = reconcile_collection_counts(conn)
+            print(f"Backfilled paste_count for {fixed} collections")
+            
+        return True
+    except OperationalError as e:
+        print(f"Database error occurred: {e}")
+        return False
+    except SQLAlchemyError as e:
+        print(f"SQLAlchemy error occurred: {e}")
+        return False
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return False
+
+def main():
+    """Main entry point for the script."""
+    print("Starting migration to add paste_count to paste collections...")
+    if add_collection_paste_count():
+        print("Migration completed successfully.")
+    else:
+        print("Migration failed.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
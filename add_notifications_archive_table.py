@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Script to add the notifications_archive table used by prune_notifications.py --archive.
+
+This should be run as a one-time migration.
+"""
+import os
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+# Add the current directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+
+
+def add_notifications_archive_table():
+    """Add notifications_archive table to the database"""
+    try:
+        inspector = inspect(db.engine)
+        
+        if 'notifications_archive' in inspector.get_table_names():
+            print("The notifications_archive table already exists.")
+            return True
+        
+        # Same columns as notifications, keeping the original ids, without
+        # foreign keys so archived rows outlive the users and pastes they name
+        with db.engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE notifications_archive (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    sender_id INTEGER,
+                    paste_id INTEGER,
+                    comment_id INTEGER,
+                    type VARCHAR(50) NOT NULL,
+                    message TEXT NOT NULL,
+                    read BOOLEAN,
+                    created_at TIMESTAMP,
+                    archived_at TIMESTAMP NOT NULL
+                )
+            """))
+            conn.execute(text(
+                "CREATE INDEX ix_notifications_archive_user_id_created_at "
+                "ON notifications_archive (user_id, created_at)"
+            ))
+        
+        print("Successfully added notifications_archive table.")
+        return True
+        
+    except SQLAlchemyError as e:
+        print(f"SQLAlchemy error: {e}")
+        return False
+
+
+def main():
+    """Main entry point for the script."""
+    with app.app_context():
+        print("Starting migration: add notifications_archive table")
+        
+        result = add_notifications_archive_table()
+        
+        if result:
+            print("Migration completed successfully.")
+        else:
+            print("Migration failed! See above for details.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Script to add the paste_cipher_segments table holding the ciphertext of stream-encrypted pastes.
+
+This should be run as a one-time migration.
+"""
+
+import sys
+import os
+from sqlalchemy import inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+# Add the current directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from app import db
+    from models import PasteCipherSegment
+except ImportError as e:
+    print(f"Error importing required modules: {e}")
+    sys.exit(1)
+
+def add_paste_cipher_segments_table():
+    """Add paste_cipher_segments table to the database"""
+    inspector = inspect(db.engine)
+    
+    # Check if the table already exists
+    if 'paste_cipher_segments' in inspector.get_table_names():
+        print("paste_cipher_segments table already exists. Skipping.")
+        return False
+        
+    try:
+        PasteCipherSegment.__table__.create(db.engine)
+        print("Successfully created paste_cipher_segments table")
+        return True
+    except SQLAlchemyError as e:
+        print(f"Error creating paste_cipher_segments table: {e}")
+        return False
+
+def main():
+    """Main entry point for the script."""
+    print("Starting migration: Adding paste_cipher_segments table...")
+    
+    from app import app
+    with app.app_context():
+        result = add_paste_cipher_segments_table()
+    
+    if result:
+        print("Migration completed successfully")
+    else:
+        print("Migration finished with errors or was skipped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Script to add the paste_symbols table used by symbol search.
+
+Creates the table and fills it from existing pastes. Pass --rebuild to
+re-harvest the symbols of every paste into an existing table.
+
+This should be run as a one-time migration.
+"""
+
+import sys
+import os
+import argparse
+from sqlalchemy import text, inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+# Add the current directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from app import db
+    from models import PasteSymbol
+    from utils.symbol_index import extract_symbols, replace_paste_symbols
+except ImportError as e:
+    print(f"Error importing required modules: {e}")
+    sys.exit(1)
+
+
+def backfill_symbols(batch_size=1000):
+    """Harvest symbols for every unencrypted paste"""
+    last_id = 0
+    indexed = 0
+    while True:
+        with db.engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT id, content, syntax FROM pastes
+                WHERE id > :last_id AND is_encrypted IS NOT TRUE
+                ORDER BY id LIMIT :limit
+            """), {'last_id': last_id, 'limit': batch_size}).fetchall()
+        if not rows:
+            break
+        for paste_id, content, syntax in rows:
+            replace_paste_symbols(db.engine, paste_id, extract_symbols(content, syntax))
+        last_id = rows[-1][0]
+        indexed += len(rows)
+        print(f"  indexed {indexed} pastes", end='\r')
+    print()
+    return indexed
+
+
+def add_paste_symbols_table(rebuild=False):
+    """Add paste_symbols table to the database and fill it"""
+    inspector = inspect(db.engine)
+
+    try:
+        if 'paste_symbols' in inspector.get_table_names():
+            if not rebuild:
+                print("paste_symbols table already exists. Skipping.")
+                return False
+        else:
+            PasteSymbol.__table__.create(db.engine)
+            print("Successfully created paste_symbols table")
+
+        indexed = backfill_symbols()
+        print(f"Harvested symbols from {indexed} pastes")
+        return True
+    except SQLAlchemyError as e:
+        print(f"Error creating paste_symbols table: {e}")
+        return False
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Add and fill the paste_symbols table')
+    parser.add_argument('--rebuild', action='store_true', help='Re-harvest symbols into an existing table')
+    args = parser.parse_args()
+
+    print("Starting migration: Adding paste_symbols table...")
+
+    from app import app
+    with app.app_context():
+        result = add_paste_symbols_table(rebuild=args.rebuild)
+
+    if result:
+        print("Migration completed successfully")
+    else:
+        print("Migration finished with errors or was skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Script to move paste_views onto monthly partitions.
+
+Creates the paste_view_daily rollup table and the paste_view_partitions
+catalog. On PostgreSQL it then rebuilds paste_views as a RANGE partitioned
+table on created_at: one partition per month from the oldest view to two
+months ahead, plus a default partition. Existing rows are copied in a single
+transaction, so run it in a maintenance window on large databases. On SQLite
+the existing table becomes the first active partition.
+
+Afterwards run maintain_view_partitions.py daily (see MAINTENANCE.md).
+
+This should be run as a one-time migration.
+"""
+
+import sys
+import os
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+# Add the current directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from app import db
+    from models import PasteViewDaily, PasteViewPartition
+    from utils.view_partitions import (
+        ACTIVE_TABLE, AHEAD_MONTHS, DEFAULT_PARTITION, add_months, create_pg_partition,
+        is_partitioned, maintain_partitions, month_start,
+    )
+except ImportError as e:
+    print(f"Error importing required modules: {e}")
+    sys.exit(1)
+
+
+def partition_postgres(conn, now):
+    """Rebuild paste_views as a partitioned table and copy its rows over"""
+    if is_partitioned(conn):
+        print("paste_views is already partitioned. Skipping.")
+        return
+
+    oldest = conn.execute(text(f"SELECT MIN(created_at) FROM {ACTIVE_TABLE}")).scalar() or now
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': ACTIVE_TABLE}).scalar()
+    # Secondary indexes are recreated on the parent, which cascades them to
+    # every partition; unique indexes would have to include created_at
+    indexes = conn.execute(text("""
+        SELECT i.relname, pg_get_indexdef(i.oid), ix.indisunique
+        FROM pg_index ix
+        JOIN pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_class t ON t.oid = ix.indrelid
+        WHERE t.relname = :table AND pg_table_is_visible(t.oid) AND NOT ix.indisprimary
+    """), {'table': ACTIVE_TABLE}).fetchall()
+
+    legacy = f"{ACTIVE_TABLE}_legacy"
+    conn.execute(text(f"ALTER TABLE {ACTIVE_TABLE} RENAME TO {legacy}"))
+    conn.execute(text(f"UPDATE {legacy} SET created_at = :now WHERE created_at IS NULL"), {'now': now})
+    conn.execute(text(f"""
+        CREATE TABLE {ACTIVE_TABLE} (LIKE {legacy} INCLUDING DEFAULTS)
+        PARTITION BY RANGE (created_at)
+    """))
+    conn.execute(text(f"ALTER TABLE {ACTIVE_TABLE} ALTER COLUMN created_at SET NOT NULL"))
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {ACTIVE_TABLE}.id"))
+
+    month = month_start(oldest)
+    last = add_months(month_start(now), AHEAD_MONTHS)
+    while month <= last:
+        create_pg_partition(conn, month)
+        month = add_months(month, 1)
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {ACTIVE_TABLE} DEFAULT"))
+
+    copied = conn.execute(text(f"INSERT INTO {ACTIVE_TABLE} SELECT * FROM {legacy}")).rowcount
+    print(f"Copied {copied} view rows into monthly partitions")
+    conn.execute(text(f"DROP TABLE {legacy}"))
+
+    conn.execute(text(f"ALTER TABLE {ACTIVE_TABLE} ADD PRIMARY KEY (id, created_at)"))
+    conn.execute(text(f"ALTER TABLE {ACTIVE_TABLE} ADD FOREIGN KEY (paste_id) REFERENCES pastes (id)"))
+    for name, definition, unique in indexes:
+        if unique:
+            print(f"Not recreating unique index {name}; it would have to include created_at")
+            continue
+        conn.execute(text(definition))
+        print(f"Recreated index {name}")
+
+
+def add_paste_view_partitions():
+    """Create the rollup and catalog tables and partition paste_views"""
+    inspector = inspect(db.engine)
+    tables = inspector.get_table_names()
+
+    try:
+        for model in (PasteViewDaily, PasteViewPartition):
+            if model.__tablename__ in tables:
+                print(f"{model.__tablename__} table already exists. Skipping.")
+            else:
+                model.__table__.create(db.engine)
+                print(f"Successfully created {model.__tablename__} table")
+
+        now = datetime.utcnow()
+        if db.engine.dialect.name == 'postgresql':
+            with db.engine.begin() as conn:
+                partition_postgres(conn, now)
+        else:
+            # Registers the existing table as the active partition
+            maintain_partitions(db.engine, now=now)
+            print("Registered paste_views as the active partition")
+        return True
+    except SQLAlchemyError as e:
+        print(f"Error partitioning paste_views: {e}")
+        return False
+
+
+def main():
+    """Main entry point for the script."""
+    print("Starting migration: Partitioning paste_views by month...")
+
+    from app import app
+    with app.app_context():
+        result = add_paste_view_partitions()
+
+    if result:
+        print("Migration completed successfully")
+    else:
+        print("Migration finished with errors or was skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Script to add composite indexes for the hot query shapes.
+
+Covers the public archive/recent listing, syntax archive, user profile and
+dashboard listings, collection listings, paste view windows, the
+notification inbox and the admin dashboard's last-24-hours activity counts. Run check_query_plans.py afterwards to confirm that none
+of these queries fall back to a sequential scan.
+
+This should be run as a one-time migration.
+"""
+import os
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+# Add the current directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+
+# (index name, table, column list)
+# Column order is equality columns first, then the ORDER BY column, so the
+# index can serve both the filter and the sort without an extra sort step.
+QUERY_INDEXES = [
+    # visibility = 'public' AND (expires_at IS NULL OR expires_at > now) ORDER BY created_at DESC
+    ('ix_pastes_visibility_created_at', 'pastes', 'visibility, created_at'),
+    # syntax = ? (search and the per-syntax archive, both also filter on visibility)
+    ('ix_pastes_syntax_visibility_created_at', 'pastes', 'syntax, visibility, created_at'),
+    # user_id = ? ORDER BY created_at
+    ('ix_pastes_user_id_created_at', 'pastes', 'user_id, created_at'),
+    # Dashboard breakdown: user_id = ? GROUP BY syntax, visibility with the expiry
+    # check, answered from the index alone
+    ('ix_pastes_user_id_syntax_visibility', 'pastes', 'user_id, syntax, visibility, expires_at'),
+    # Dashboard "most viewed": user_id = ? ORDER BY views DESC LIMIT 5
+    ('ix_pastes_user_id_views', 'pastes', 'user_id, views'),
+    # Pruner: expires_at < now ORDER BY expires_at, one chunk at a time
+    ('ix_pastes_expires_at', 'pastes', 'expires_at'),
+    # collection_id = ? ORDER BY created_at
+    ('ix_pastes_collection_id_created_at', 'pastes', 'collection_id, created_at'),
+    # PasteView(paste_id, created_at) for the 7/30 day dashboard windows
+    ('ix_paste_views_paste_id_created_at', 'paste_views', 'paste_id, created_at'),
+    # Notification(user_id, read) plus the inbox ordering
+    ('ix_notifications_user_id_read_created_at', 'notifications', 'user_id, read, created_at'),
+    # Full inbox: user_id = ? ORDER BY created_at DESC, id DESC, one keyset page at a time
+    ('ix_notifications_user_id_created_at', 'notifications', 'user_id, created_at, id'),
+    # Retention: read = true AND created_at < cutoff ORDER BY created_at, in batches
+    ('ix_notifications_read_created_at', 'notifications', 'read, created_at'),
+    # Admin dashboard activity: created_at >= now - 24h on each table
+    ('ix_users_created_at', 'users', 'created_at'),
+    ('ix_pastes_created_at', 'pastes', 'created_at'),
+    ('ix_comments_created_at', 'comments', 'created_at'),
+]
+
+# Indexes made redundant by the set above. idx_notifications_user_id is a prefix
+# of the new notification index and idx_notifications_read is a bare boolean
+# index that the planner never picks but every write has to maintain.
+REDUNDANT_INDEXES = [
+    'idx_notifications_user_id',
+    'idx_notifications_read',
+]
+
+
+def add_query_indexes():
+    """Create the hot-path indexes and drop the ones they supersede"""
+    try:
+        inspector = inspect(db.engine)
+        existing_tables = inspector.get_table_names()
+        is_postgres = db.engine.dialect.name == 'postgresql'
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so use
+        # an autocommit connection. This keeps the pastes table writable while
+        # the indexes build on a live PostgreSQL database.
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for index_name, table, columns in QUERY_INDEXES:
+                if table not in existing_tables:
+                    print(f"Table {table} does not exist, skipping {index_name}.")
+                    continue
+
+                existing = {ix['name'] for ix in inspector.get_indexes(table)}
+                if index_name in existing:
+                    print(f"Index {index_name} already exists.")
+                    continue
+
+                concurrently = "CONCURRENTLY " if is_postgres else ""
+                conn.execute(text(
+                    f"CREATE INDEX {concurrently}IF NOT EXISTS {index_name} ON {table} ({columns})"
+                ))
+                print(f"Created index {index_name} on {table} ({columns})")
+
+            for index_name in REDUNDANT_INDEXES:
+                concurrently = "CONCURRENTLY " if is_postgres else ""
+                conn.execute(text(f"DROP INDEX {concurrently}IF EXISTS {index_name}"))
+                print(f"Dropped redundant index {index_name} (if present)")
+
+            # Refresh planner statistics so the new indexes are costed correctly
+            conn.execute(text("ANALYZE"))
+
+        return True
+
+    except SQLAlchemyError as e:
+        print(f"SQLAlchemy error: {e}")
+        return False
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+
+
+def main():
+    """Main entry point for the script."""
+    with app.app_context():
+        print("Starting migration: add hot query indexes")
+
+        result = add_query_indexes()
+
+        if result:
+            print("Migration completed successfully.")
+        else:
+            print("Migration failed! See above for details.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Script to add the site_stats_snapshots table used by the admin dashboard.
+
+Creates the table and computes the first snapshot so the dashboard has
+distributions to show before the scheduled refresh first runs.
+
+This should be run as a one-time migration.
+"""
+
+import sys
+import os
+from sqlalchemy import inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+# Add the current directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from app import db
+    from models import SiteStatsSnapshot
+    from utils.site_stats import refresh_site_stats
+except ImportError as e:
+    print(f"Error importing required modules: {e}")
+    sys.exit(1)
+
+def add_site_stats_snapshots_table():
+    """Add site_stats_snapshots table to the database and compute the first snapshot"""
+    inspector = inspect(db.engine)
+    
+    # Check if the table already exists
+    if 'site_stats_snapshots' in inspector.get_table_names():
+        print("site_stats_snapshots table already exists. Skipping.")
+        return False
+        
+    try:
+        SiteStatsSnapshot.__table__.create(db.engine)
+        print("Successfully created site_stats_snapshots table")
+        
+        with db.engine.begin() as conn:
+            timings = refresh_site_stats(conn)
+        print(f"Computed {len(timings)} initial snapshot(s)")
+        return True
+    except SQLAlchemyError as e:
+        print(f"Error creating site_stats_snapshots table: {e}")
+        return False
+
+def main():
+    """Main entry point for the script."""
+    print("Starting migration: Adding site_stats_snapshots table...")
+    
+    from app import app
+    with app.app_context():
+        result = add_site_stats_snapshots_table()
+    
+    if result:
+        print("Migration completed successfully")
+    else:
+        print("Migration finished with errors or was skipped")
+
+if __name__ == "__main__":
+    main()
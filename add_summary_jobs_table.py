@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Script to add the summary_jobs table used by background AI summary generation.
+
+This should be run as a one-time migration.
+"""
+
+import sys
+import os
+from sqlalchemy import inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+# Add the current directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from app import db
+    from models import SummaryJob
+except ImportError as e:
+    print(f"Error importing required modules: {e}")
+    sys.exit(1)
+
+def add_summary_jobs_table():
+    """Add summary_jobs table to the database"""
+    inspector = inspect(db.engine)
+    
+    # Check if the table already exists
+    if 'summary_jobs' in inspector.get_table_names():
+        print("summary_jobs table already exists. Skipping.")
+        return False
+        
+    try:
+        SummaryJob.__table__.create(db.engine)
+        print("Successfully created summary_jobs table")
+        return True
+    except SQLAlchemyError as e:
+        print(f"Error creating summary_jobs table: {e}")
+        return False
+
+def main():
+    """Main entry point for the script."""
+    print("Starting migration: Adding summary_jobs table...")
+    
+    from app import app
+    with app.app_context():
+        result = add_summary_jobs_table()
+    
+    if result:
+        print("Migration completed successfully")
+    else:
+        print("Migration finished with errors or was skipped")
+
+if __name__ == "__main__":
+    main()
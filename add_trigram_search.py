@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Script to install the trigram index used for code fragment search.
+
+On PostgreSQL this enables pg_trgm and adds trigram GIN indexes on the title
+and content columns. On SQLite (3.34+) it creates the pastes_trigram FTS5 side
+table with its sync triggers and fills it from the existing pastes. Pass
+--rebuild to repopulate an existing index.
+
+This should be run as a one-time migration.
+"""
+import os
+import sys
+import argparse
+
+from sqlalchemy.exc import SQLAlchemyError
+
+# Add the current directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from utils.search_backends import PostgresTrigramBackend, SQLiteTrigramBackend
+
+
+def add_trigram_search(rebuild=False):
+    """Install (or rebuild) the native trigram index for the current database"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        backend = PostgresTrigramBackend()
+    elif dialect == 'sqlite':
+        backend = SQLiteTrigramBackend()
+    else:
+        print(f"No trigram backend for {dialect}; fragment search will use ILIKE.")
+        return True
+
+    try:
+        # Autocommit so PostgreSQL can build the GIN indexes CONCURRENTLY
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if backend.is_available(conn):
+                if not rebuild:
+                    print(f"The {backend.name} search index already exists.")
+                    return True
+                backend.rebuild(conn)
+                print(f"Rebuilt the {backend.name} search index.")
+                return True
+
+            backend.install(conn)
+            print(f"Successfully installed the {backend.name} search index.")
+        return True
+
+    except SQLAlchemyError as e:
+        print(f"SQLAlchemy error: {e}")
+        return False
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Install the trigram search index')
+    parser.add_argument('--rebuild', action='store_true', help='Repopulate an existing index')
+    args = parser.parse_args()
+
+    with app.app_context():
+        print("Starting migration: add trigram search index")
+
+        result = add_trigram_search(rebuild=args.rebuild)
+
+        if result:
+            print("Migration completed successfully.")
+        else:
+            print("Migration failed! See above for details.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
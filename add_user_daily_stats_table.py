@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Script to add the user_daily_stats rollup table used by the user dashboard.
+
+Creates the table and fills it from the existing pastes, paste views and
+comments.
+
+This should be run as a one-time migration.
+"""
+
+import sys
+import os
+from sqlalchemy import inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+# Add the current directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from app import db
+    from models import UserDailyStats
+    from utils.user_stats import reconcile_user_stats
+except ImportError as e:
+    print(f"Error importing required modules: {e}")
+    sys.exit(1)
+
+def add_user_daily_stats_table():
+    """Add user_daily_stats table to the database and backfill it"""
+    inspector = inspect(db.engine)
+    
+    # Check if the table already exists
+    if 'user_daily_stats' in inspector.get_table_names():
+        print("user_daily_stats table already exists. Skipping.")
+        return False
+        
+    try:
+        UserDailyStats.__table__.create(db.engine)
+        print("Successfully created user_daily_stats table")
+        
+        with db.engine.begin() as conn:
+            rows = reconcile_user_stats(conn)
+        print(f"Backfilled {rows} daily rollup rows")
+        return True
+    except SQLAlchemyError as e:
+        print(f"Error creating user_daily_stats table: {e}")
+        return False
+
+def main():
+    """Main entry point for the script."""
+    print("Starting migration: Adding user_daily_stats table...")
+    
+    from app import app
+    with app.app_context():
+        result = add_user_daily_stats_table()
+    
+    if result:
+        print("Migration completed successfully")
+    else:
+        print("Migration finished with errors or was skipped")
+
+if __name__ == "__main__":
+    main()
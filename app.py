@@ -14,6 +14,9 @@ from flask_limiter.util import get_remote_address
 # Import db from db module
 from db import db, init_db
 
+# Registers the mmap:// rate limit storage shared by all workers on a node
+from utils.rate_limit_storage import DEFAULT_PATH as RATELIMIT_DEFAULT_PATH
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -24,8 +27,8 @@ csrf = CSRFProtect()
 limiter = Limiter(
     key_func=get_remote_address,
     default_limits=["200 per day", "50 per hour"],
-    storage_uri="memory://",
-    strategy="fixed-window"
+    storage_uri=os.environ.get("RATELIMIT_STORAGE_URI", f"mmap://{RATELIMIT_DEFAULT_PATH}"),
+    strategy=os.environ.get("RATELIMIT_STRATEGY", "sliding-window-counter")
 )
 
 def create_app():
@@ -47,6 +50,10 @@ def create_app():
     # Initialize database with the app
     init_db(app)
     
+    # Keep session data on the server; the cookie only carries an ID
+    from utils.session_store import init_session_store
+    init_session_store(app, db)
+    
     # Initialize the app with extensions
     login_manager.init_app(app)
     csrf.init_app(app)
@@ -103,9 +110,18 @@ def create_app():
                     
             return False
         
+        def unread_notification_count():
+            """Cached unread notification count for the logged-in user"""
+            from flask_login import current_user
+            if not current_user.is_authenticated:
+                return 0
+            from utils.notification_counts import get_unread_count
+            return get_unread_count(current_user.id)
+        
         return {
             'now': datetime.utcnow(),
-            'is_ten_minute_expiration': is_ten_minute_expiration
+            'is_ten_minute_expiration': is_ten_minute_expiration,
+            'unread_notification_count': unread_notification_count
         }
 
     with app.app_context():
@@ -146,7 +162,37 @@ def create_app():
         # Create database tables
         db.create_all()
         logger.info("Database tables created")
-        
+
+        # Per-user daily rollups are updated in the same flush as the writes
+        from utils.user_stats import register_user_stats_hooks
+        register_user_stats_hooks()
+
+        # Collection paste counts move with pastes.collection_id
+        from utils.collection_counts import register_collection_count_hooks
+        register_collection_count_hooks()
+
+        # Committed notification changes are pushed to open event streams
+        from utils.notification_events import register_notification_event_hooks
+        register_notification_event_hooks()
+
+        # Notifications queued during a request are inserted in one batch after it
+        from utils.notification_writer import register_notification_writer
+        register_notification_writer(app, db.engine)
+
+        # Symbols of new and edited pastes are harvested in the background
+        from utils.symbol_index import register_symbol_index_hooks
+        register_symbol_index_hooks(db.engine)
+
+        # Pastes are deleted as they expire by one elected process
+        if os.environ.get('EXPIRY_SCHEDULER') == 'on':
+            from utils.expiry_scheduler import register_expiry_scheduler
+            register_expiry_scheduler(app, db.engine)
+
+        # The in-process search index is maintained from the ORM session
+        if os.environ.get('SEARCH_BACKEND') == 'engine':
+            from utils.search_backends import register_search_index_hooks
+            register_search_index_hooks()
+
         # Register error handlers
         @app.errorhandler(404)
         def not_found_error(error):
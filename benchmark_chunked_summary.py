@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark for map-reduce summaries of large pastes against the mock OpenAI server.
+
+Generates pastes of increasing size and summarises each one three ways: a
+single truncated request (the old behaviour, and still the path for pastes
+up to MAX_CODE_CHARS), map-reduce with one chunk worker, and map-reduce with
+--workers chunk workers. Reports latency, upstream requests, the tokens the
+mock server counted and how much of the paste the summary covers. The mock
+server charges --latency per request plus prompt tokens / --tokens-per-second,
+roughly like a hosted model. Exits with an error if a paste goes over its
+token budget.
+
+Examples:
+python benchmark_chunked_summary.py
+python benchmark_chunked_summary.py --sizes 20000,200000,2000000 --workers 8 --budget 40000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mock_openai_server import start_mock_server
+
+
+def generate_code(size, seed=1):
+    """A Python-looking module of about ``size`` characters"""
+    rng = random.Random(seed)
+    parts, length, number = ['"""Generated module."""\nimport os\nimport sys\n\n'], 0, 0
+    while length < size:
+        number += 1
+        if number % 4 == 0:
+            methods = ''.join(
+                f"    def method_{number}_{m}(self, value):\n"
+                + ''.join(f"        value = value * {rng.randint(2, 9)} + {i}\n" for i in range(rng.randint(3, 25)))
+                + "        return value\n\n"
+                for m in range(rng.randint(2, 6))
+            )
+            part = f"\nclass Handler{number}:\n    \"\"\"Handles case {number}.\"\"\"\n\n{methods}"
+        else:
+            body = ''.join(f"    total += item.get('field_{i}', {i})\n" for i in range(rng.randint(5, 40)))
+            part = f"\ndef process_{number}(items):\n    total = 0\n    for item in items:\n{body}    return total\n"
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)
+
+
+def run(server, label, summarize):
+    requests, prompt, completion = server.requests, server.prompt_tokens, server.completion_tokens
+    started = time.perf_counter()
+    summary, coverage = summarize()
+    elapsed = time.perf_counter() - started
+    tokens = server.prompt_tokens - prompt + server.completion_tokens - completion
+    print(f"  {label:<24}{elapsed:>8.2f}s{server.requests - requests:>10}{tokens:>10}{coverage:>10.0%}"
+          f"{'' if summary else '  (no summary)'}")
+    return tokens
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Benchmark map-reduce summaries of large pastes')
+    parser.add_argument('--sizes', default='8000,40000,160000,640000', help='Comma-separated paste sizes in characters')
+    parser.add_argument('--workers', type=int, default=4, help='Chunk workers (SUMMARY_CHUNK_WORKERS)')
+    parser.add_argument('--budget', type=int, default=24000, help='Token budget per paste (SUMMARY_TOKEN_BUDGET)')
+    parser.add_argument('--latency', type=float, default=0.3, help='Mock seconds per request')
+    parser.add_argument('--tokens-per-second', type=float, default=20000, help='Mock prompt processing speed')
+    args = parser.parse_args()
+
+    server = start_mock_server(latency=args.latency, tokens_per_second=args.tokens_per_second)
+    os.environ['OPENAI_BASE_URL'] = server.base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+    import utils.chunked_summary as chunked_summary
+    from utils import MAX_CODE_CHARS, SUMMARY_SYSTEM_PROMPT, generate_ai_summary, summary_completion
+
+    def truncated(code):
+        chunked_summary.CHUNKING = False
+        try:
+            return generate_ai_summary(code, language='python'), min(1.0, MAX_CODE_CHARS / len(code))
+        finally:
+            chunked_summary.CHUNKING = True
+
+    def map_reduce(code, workers):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            summary, stats = chunked_summary.summarize_chunked(
+                code, 'python', summary_completion, SUMMARY_SYSTEM_PROMPT, budget=args.budget, executor=executor
+            )
+        chunks = chunked_summary.split_chunks(code)
+        covered = sum(len(text) for _, _, text in chunked_summary.select_chunks(chunks, args.budget, 150))
+        return summary, covered / len(code)
+
+    over_budget = False
+    print(f"  {'mode':<24}{'latency':>9}{'requests':>10}{'tokens':>10}{'coverage':>10}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        code = generate_code(size)
+        print(f"{len(code)} chars, {code.count(chr(10)) + 1} lines, "
+              f"{len(chunked_summary.split_chunks(code))} chunks")
+        run(server, 'single (truncated)', lambda: truncated(code))
+        if len(code) <= MAX_CODE_CHARS:
+            continue
+        run(server, 'map-reduce, 1 worker', lambda: map_reduce(code, 1))
+        tokens = run(server, f"map-reduce, {args.workers} workers", lambda: map_reduce(code, args.workers))
+        over_budget |= tokens > args.budget
+
+    if over_budget:
+        print(f"FAILED: a paste used more than the {args.budget} token budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark for server CPU per view of an encrypted paste.
+
+Serves the same content through a small Flask app the way the raw page does
+for each encryption method: 'fernet-random' (decrypted on the server with the
+key from the URL), 'fernet-password' (key derived and content decrypted on
+every view) and 'client-aes-gcm' (the stored envelope served as-is for the
+browser to decrypt). Reports CPU time per view and the stored size of each
+form. Exits with an error if the envelope does not round-trip or the
+client-encrypted view is not cacheable.
+
+Examples:
+python benchmark_client_encryption.py
+python benchmark_client_encryption.py --views 500 --size 100000
+"""
+import os
+import sys
+import time
+import argparse
+from types import SimpleNamespace
+
+from flask import Flask, Response
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils import decrypt_content, encrypt_content
+from utils.client_encryption import cache_ciphertext, decrypt_envelope, encrypt_envelope, generate_key, is_envelope
+
+PASSWORD = 'correct horse battery staple'
+
+
+def create_app(stored):
+    app = Flask(__name__)
+
+    @app.route('/<method>/raw')
+    def raw(method):
+        paste = stored[method]
+        if method == 'client-aes-gcm':
+            return cache_ciphertext(Response(paste.content, mimetype='text/plain'), paste)
+        content = decrypt_content(paste.content, paste.encryption_salt, method, PASSWORD)
+        return Response(content, mimetype='text/plain')
+
+    return app
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Benchmark server CPU per encrypted paste view')
+    parser.add_argument('--views', type=int, default=100, help='Views per method')
+    parser.add_argument('--size', type=int, default=20000, help='Paste size in characters')
+    args = parser.parse_args()
+
+    content = ("def handler(request):\n    return request.args\n" * (args.size // 44 + 1))[:args.size]
+    stored = {}
+    for method, password in (('fernet-random', None), ('fernet-password', PASSWORD)):
+        encrypted, salt, _ = encrypt_content(content, password)
+        # Random-key pastes keep their key in encryption_salt (and the URL)
+        stored[method] = SimpleNamespace(content=encrypted, encryption_salt=salt or encrypted)
+    key = generate_key()
+    envelope = encrypt_envelope(content, key)
+    stored['client-aes-gcm'] = SimpleNamespace(content=envelope, expires_at=None, burn_after_read=False,
+                                               visibility='public')
+    client = create_app(stored).test_client()
+
+    print(f"{args.views} views of a {len(content)}-character paste")
+    print(f"  {'method':<18}{'CPU / view':>12}{'stored':>10}")
+    failed = not is_envelope(envelope) or decrypt_envelope(envelope, key) != content
+    failed |= decrypt_envelope(envelope, generate_key()) is not None
+    for method, paste in stored.items():
+        started = time.process_time()
+        for _ in range(args.views):
+            response = client.get(f"/{method}/raw")
+        elapsed = time.process_time() - started
+        print(f"  {method:<18}{elapsed * 1000 / args.views:>10.3f}ms{len(paste.content) / len(content):>9.2f}x")
+        if method == 'client-aes-gcm':
+            failed |= response.get_data(as_text=True) != envelope or not response.cache_control.public
+        else:
+            failed |= response.get_data(as_text=True) != content
+
+    if failed:
+        print("FAILED: an encrypted paste did not round-trip or the ciphertext is not cacheable")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
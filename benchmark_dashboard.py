@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the user dashboard: raw-table aggregation against rollups.
+
+Fills a scratch database with one heavy user (100k pastes and 10M views by
+default), then times the dashboard's original per-request aggregation queries
+against the reads it now makes from user_daily_stats, and checks that both
+report the same numbers.
+
+Examples:
+python benchmark_dashboard.py                       # 100k pastes, 10M views
+python benchmark_dashboard.py --pastes 10000 --views 1000000
+python benchmark_dashboard.py --database-url postgresql://localhost/flaskbin_bench
+
+Only point --database-url at an empty scratch database: the script creates and
+fills its own tables.
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.user_stats import reconcile_user_stats, get_daily_stats, sum_recent
+
+USER_ID = 1
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS pastes (
+        id INTEGER PRIMARY KEY, user_id INTEGER, syntax VARCHAR(50), visibility VARCHAR(20),
+        views INTEGER DEFAULT 0, created_at TIMESTAMP, expires_at TIMESTAMP)""",
+    """CREATE TABLE IF NOT EXISTS paste_views (
+        id INTEGER PRIMARY KEY, paste_id INTEGER, created_at TIMESTAMP)""",
+    """CREATE TABLE IF NOT EXISTS comments (
+        id INTEGER PRIMARY KEY, paste_id INTEGER, user_id INTEGER, created_at TIMESTAMP)""",
+    """CREATE TABLE IF NOT EXISTS user_daily_stats (
+        user_id INTEGER NOT NULL, day DATE NOT NULL,
+        pastes_created INTEGER NOT NULL DEFAULT 0, views_received INTEGER NOT NULL DEFAULT 0,
+        comments_received INTEGER NOT NULL DEFAULT 0, comments_made INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day))""",
+    "CREATE INDEX IF NOT EXISTS ix_pastes_user_id_created_at ON pastes (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_pastes_user_id_syntax_visibility ON pastes (user_id, syntax, visibility, expires_at)",
+    "CREATE INDEX IF NOT EXISTS ix_pastes_user_id_views ON pastes (user_id, views)",
+    "CREATE INDEX IF NOT EXISTS ix_paste_views_paste_id_created_at ON paste_views (paste_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_comments_paste_id ON comments (paste_id)",
+    "CREATE INDEX IF NOT EXISTS ix_comments_user_id_created_at ON comments (user_id, created_at)",
+]
+
+
+def generate(engine, pastes, views, comments):
+    """Fill the scratch tables with one user's year of activity"""
+    start = datetime.utcnow() - timedelta(days=365)
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        if conn.execute(text("SELECT COUNT(*) FROM pastes")).scalar():
+            print("Reusing existing data")
+            return
+
+    syntaxes = ['python', 'javascript', 'text', 'go', 'rust', 'sql']
+    visibilities = ['public', 'unlisted', 'private']
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO pastes (id, user_id, syntax, visibility, views, created_at, expires_at)
+            VALUES (:id, :user_id, :syntax, :visibility, 0, :created_at, :expires_at)
+        """), [{
+            'id': i,
+            'user_id': USER_ID,
+            'syntax': syntaxes[i % len(syntaxes)],
+            'visibility': visibilities[i % len(visibilities)],
+            'created_at': start + timedelta(seconds=i * 365 * 86400 // pastes),
+            'expires_at': start + timedelta(days=30) if i % 10 == 0 else None,
+        } for i in range(1, pastes + 1)])
+    print(f"  inserted {pastes} pastes")
+
+    batch = 500000
+    for offset in range(0, views, batch):
+        rows = [{
+            'paste_id': 1 + (i * 7919) % pastes,
+            'created_at': start + timedelta(seconds=i * 365 * 86400 // views),
+        } for i in range(offset, min(views, offset + batch))]
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO paste_views (paste_id, created_at) VALUES (:paste_id, :created_at)"), rows)
+        print(f"  inserted {min(views, offset + batch)}/{views} views", end='\r')
+    print()
+
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO comments (paste_id, user_id, created_at) VALUES (:paste_id, :user_id, :created_at)
+        """), [{
+            'paste_id': 1 + (i * 31) % pastes,
+            'user_id': USER_ID if i % 4 == 0 else 2,
+            'created_at': start + timedelta(seconds=i * 365 * 86400 // comments),
+        } for i in range(comments)])
+        conn.execute(text("""
+            UPDATE pastes SET views = (SELECT COUNT(*) FROM paste_views v WHERE v.paste_id = pastes.id)
+        """))
+        conn.execute(text("ANALYZE"))
+    print(f"  inserted {comments} comments")
+
+
+def legacy_dashboard(conn, now):
+    """The original dashboard aggregation, one query per number"""
+    week_ago, month_ago = now - timedelta(days=7), now - timedelta(days=30)
+    params = {'user_id': USER_ID, 'now': now, 'week': week_ago, 'month': month_ago}
+    views_join = "FROM paste_views v JOIN pastes p ON p.id = v.paste_id WHERE p.user_id = :user_id"
+    comments_join = "FROM comments c JOIN pastes p ON p.id = c.paste_id WHERE p.user_id = :user_id"
+    queries = {
+        'total_pastes': "SELECT COUNT(*) FROM pastes WHERE user_id = :user_id",
+        'active_pastes': "SELECT COUNT(*) FROM pastes WHERE user_id = :user_id AND (expires_at IS NULL OR expires_at > :now)",
+        'expired_pastes': "SELECT COUNT(*) FROM pastes WHERE user_id = :user_id AND expires_at IS NOT NULL AND expires_at <= :now",
+        'pastes_last_week': "SELECT COUNT(*) FROM pastes WHERE user_id = :user_id AND created_at >= :week",
+        'pastes_last_month': "SELECT COUNT(*) FROM pastes WHERE user_id = :user_id AND created_at >= :month",
+        'total_views': f"SELECT COUNT(*) {views_join}",
+        'views_last_week': f"SELECT COUNT(*) {views_join} AND v.created_at >= :week",
+        'views_last_month': f"SELECT COUNT(*) {views_join} AND v.created_at >= :month",
+        'total_comments': f"SELECT COUNT(*) {comments_join}",
+        'comments_made': "SELECT COUNT(*) FROM comments WHERE user_id = :user_id",
+        'most_viewed': f"SELECT p.id, COUNT(v.id) AS n {views_join} GROUP BY p.id ORDER BY n DESC LIMIT 5",
+        'syntax': "SELECT syntax, COUNT(*) FROM pastes WHERE user_id = :user_id GROUP BY syntax",
+        'visibility': "SELECT visibility, COUNT(*) FROM pastes WHERE user_id = :user_id GROUP BY visibility",
+    }
+    results = {name: conn.execute(text(sql), params).fetchall() for name, sql in queries.items()}
+    for i in range(6, -1, -1):
+        day_params = dict(params, start=now - timedelta(days=i), end=now - timedelta(days=i - 1))
+        conn.execute(text("SELECT COUNT(*) FROM pastes WHERE user_id = :user_id AND created_at >= :start AND created_at < :end"), day_params)
+        conn.execute(text(f"SELECT COUNT(*) {views_join} AND v.created_at >= :start AND v.created_at < :end"), day_params)
+    return {name: rows[0][0] for name, rows in results.items() if len(rows) == 1 and len(rows[0]) == 1}, len(queries) + 14
+
+
+def rollup_dashboard(conn, now):
+    """The dashboard's reads now: rollups plus one breakdown and one top-5 query"""
+    totals, recent = get_daily_stats(conn, USER_ID, days=30, now=now)
+    breakdown = conn.execute(text("""
+        SELECT syntax, visibility, COUNT(*), SUM(CASE WHEN expires_at <= :now THEN 1 ELSE 0 END)
+        FROM pastes WHERE user_id = :user_id GROUP BY syntax, visibility
+    """), {'user_id': USER_ID, 'now': now}).fetchall()
+    conn.execute(text(
+        "SELECT id, views FROM pastes WHERE user_id = :user_id AND views > 0 ORDER BY views DESC LIMIT 5"
+    ), {'user_id': USER_ID}).fetchall()
+    total = sum(row[2] for row in breakdown)
+    expired = sum(row[3] or 0 for row in breakdown)
+    return {
+        'total_pastes': total,
+        'expired_pastes': expired,
+        'active_pastes': total - expired,
+        'total_views': totals['views_received'],
+        'views_last_month': sum_recent(recent, 'views_received', 30, now),
+        'total_comments': totals['comments_received'],
+        'comments_made': totals['comments_made'],
+    }, 4
+
+
+def time_call(function, conn, now, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(conn, now)
+        samples.append(time.perf_counter() - started)
+    return result, sorted(samples)[len(samples) // 2]
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Benchmark the user dashboard queries')
+    parser.add_argument('--pastes', type=int, default=100000)
+    parser.add_argument('--views', type=int, default=10000000)
+    parser.add_argument('--comments', type=int, default=200000)
+    parser.add_argument('--database-url', default='sqlite:///dashboard_benchmark.db',
+                        help='Scratch database to fill and query')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per variant')
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    print(f"Generating {args.pastes} pastes / {args.views} views in {args.database_url}")
+    generate(engine, args.pastes, args.views, args.comments)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        rows = reconcile_user_stats(conn)
+    print(f"Full rollup rebuild: {rows} rows in {time.perf_counter() - started:.1f}s")
+
+    # Pin "now" to the end of a UTC day so calendar-day rollup windows and the
+    # legacy rolling windows cover the same range
+    now = datetime.combine(datetime.utcnow().date(), datetime.max.time())
+    with engine.connect() as conn:
+        legacy, legacy_time = time_call(legacy_dashboard, conn, now, args.repeat)
+        rollup, rollup_time = time_call(rollup_dashboard, conn, now, args.repeat)
+
+    legacy_numbers, legacy_queries = legacy
+    rollup_numbers, rollup_queries = rollup
+    print(f"\n{'variant':<10}{'queries':>9}{'median ms':>12}")
+    print(f"{'legacy':<10}{legacy_queries:>9}{legacy_time * 1000:>12.1f}")
+    print(f"{'rollups':<10}{rollup_queries:>9}{rollup_time * 1000:>12.1f}")
+
+    mismatches = {
+        name: (legacy_numbers[name], value) for name, value in rollup_numbers.items()
+        if name in legacy_numbers and legacy_numbers[name] != value
+    }
+    if mismatches:
+        print(f"\nMismatched numbers (legacy, rollup): {mismatches}")
+        sys.exit(1)
+    print("\nRollup numbers match the raw-table aggregation.")
+
+
+if __name__ == "__main__":
+    main()
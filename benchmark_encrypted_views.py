@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark for views of password-encrypted pastes.
+
+Encrypts a paste with a password, then has --sessions visitors each unlock it
+once and view it --views more times through a small Flask app with the
+regular cookie session. Compares deriving the key with PBKDF2 on every view
+(the old behaviour) with the per-session key cache in utils.derived_keys, and
+reports key derivations per view and view latency for both. Exits with an
+error if a cached re-view derives a key.
+
+Examples:
+python benchmark_encrypted_views.py
+python benchmark_encrypted_views.py --sessions 20 --views 50
+"""
+import os
+import sys
+import time
+import argparse
+from types import SimpleNamespace
+
+from flask import Flask
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import utils
+from utils import decrypt_content, encrypt_content
+from utils.derived_keys import get_session_content, unlock
+
+PASSWORD = 'correct horse battery staple'
+
+
+def create_app(paste):
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+
+    @app.route('/uncached', methods=['POST'])
+    def uncached():
+        content = decrypt_content(paste.content, paste.encryption_salt, paste.encryption_method, PASSWORD)
+        return ('ok', 200) if content else ('failed', 403)
+
+    @app.route('/unlock', methods=['POST'])
+    def unlock_view():
+        return ('ok', 200) if unlock(paste, PASSWORD) else ('failed', 403)
+
+    @app.route('/view')
+    def view():
+        return ('ok', 200) if get_session_content(paste) else ('failed', 403)
+
+    return app
+
+
+def run(app, sessions, views, cached):
+    kdf_calls, latencies = utils.kdf_calls, []
+    for _ in range(sessions):
+        client = app.test_client()
+        for number in range(views + 1):
+            started = time.perf_counter()
+            if not cached:
+                response = client.post('/uncached')
+            elif number == 0:
+                response = client.post('/unlock')
+            else:
+                response = client.get('/view')
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f"View failed: {response.get_data(as_text=True)}")
+    return utils.kdf_calls - kdf_calls, latencies
+
+
+def report(label, kdf_calls, latencies):
+    latencies = sorted(latencies)
+    print(f"  {label:<22}{kdf_calls / len(latencies):>12.2f}{latencies[len(latencies) // 2] * 1000:>10.2f}ms"
+          f"{sum(latencies) * 1000 / len(latencies):>10.2f}ms")
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Benchmark views of password-encrypted pastes')
+    parser.add_argument('--sessions', type=int, default=5, help='Visitors who unlock the paste')
+    parser.add_argument('--views', type=int, default=20, help='Views per visitor after unlocking')
+    parser.add_argument('--size', type=int, default=20000, help='Paste size in characters')
+    args = parser.parse_args()
+
+    content = ("def handler(request):\n    return request.args\n" * (args.size // 44 + 1))[:args.size]
+    encrypted, salt, method = encrypt_content(content, PASSWORD)
+    paste = SimpleNamespace(id=1, content=encrypted, encryption_salt=salt, encryption_method=method,
+                            get_content=lambda: None)
+    app = create_app(paste)
+
+    print(f"{args.sessions} sessions x (1 unlock + {args.views} views), {len(content)} chars")
+    print(f"  {'mode':<22}{'KDF / view':>12}{'p50':>12}{'mean':>12}")
+    report('derive every view', *run(app, args.sessions, args.views, cached=False))
+    kdf_calls, latencies = run(app, args.sessions, args.views, cached=True)
+    report('cached key', kdf_calls, latencies)
+
+    if kdf_calls != args.sessions:
+        print(f"FAILED: {kdf_calls} key derivations for {args.sessions} unlocks")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
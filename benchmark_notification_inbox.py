@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the notification inbox at 100k notifications per account.
+
+Fills a scratch database with one heavy account, then times the original
+load-everything inbox against keyset pages taken from the start, middle and
+end of the inbox, the single-UPDATE mark-all-read, and a retention run.
+Keyset pages should take the same time wherever they start.
+
+Examples:
+python benchmark_notification_inbox.py
+python benchmark_notification_inbox.py --notifications 1000000
+python benchmark_notification_inbox.py --database-url postgresql://localhost/flaskbin_bench
+
+Only point --database-url at an empty scratch database: the script creates and
+fills its own tables.
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.notification_writer import notifications
+from utils.notification_retention import prune_read_notifications
+from utils.pagination import encode_cursor, keyset_page
+
+USER_ID = 1
+PAGE_SIZE = 20
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS notifications (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, sender_id INTEGER, paste_id INTEGER,
+        comment_id INTEGER, type VARCHAR(50) NOT NULL, message TEXT NOT NULL,
+        read BOOLEAN DEFAULT FALSE, created_at TIMESTAMP)""",
+    "CREATE INDEX IF NOT EXISTS ix_notifications_user_id_read_created_at ON notifications (user_id, read, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_notifications_user_id_created_at ON notifications (user_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_notifications_read_created_at ON notifications (read, created_at)",
+]
+
+
+def generate(engine, total):
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        if conn.execute(text("SELECT COUNT(*) FROM notifications")).scalar():
+            print("Reusing existing data")
+            return
+    start = datetime.utcnow() - timedelta(days=365)
+    batch = 50000
+    for offset in range(0, total, batch):
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO notifications (user_id, sender_id, paste_id, type, message, read, created_at)
+                VALUES (:user_id, 2, :paste_id, 'comment', 'commented on your paste', :read, :created_at)
+            """), [{
+                'user_id': USER_ID,
+                'paste_id': i % 5000,
+                'read': i < total * 0.9,
+                'created_at': start + timedelta(seconds=i * 365 * 86400 // total),
+            } for i in range(offset, min(total, offset + batch))])
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    print(f"  inserted {total} notifications")
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Benchmark the notification inbox queries')
+    parser.add_argument('--notifications', type=int, default=100000)
+    parser.add_argument('--database-url', default='sqlite:///notification_benchmark.db',
+                        help='Scratch database to fill and query')
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    print(f"Generating {args.notifications} notifications in {args.database_url}")
+    generate(engine, args.notifications)
+
+    session = Session(engine)
+    inbox = session.query(notifications).filter(notifications.c.user_id == USER_ID)
+    columns = (notifications.c.created_at, notifications.c.id)
+
+    def legacy():
+        return inbox.order_by(notifications.c.created_at.desc()).all()
+
+    results = []
+    rows, elapsed = timed(legacy)
+    results.append((f"legacy .all() ({len(rows)} rows)", elapsed))
+    for label, position in (('first', 0), ('middle', args.notifications // 2), ('last', args.notifications - PAGE_SIZE - 1)):
+        # Resolve the cursor outside the timed call; only the page fetch is measured
+        cursor_row = None
+        if position:
+            cursor_row = inbox.order_by(notifications.c.created_at.desc(), notifications.c.id.desc()).offset(position).first()
+        cursor = encode_cursor(cursor_row.created_at, cursor_row.id) if cursor_row else None
+        (rows, _), elapsed = timed(keyset_page, inbox, *columns, cursor, PAGE_SIZE)
+        results.append((f"keyset page, {label} ({len(rows)} rows)", elapsed))
+    session.close()
+
+    def mark_all_read():
+        with engine.begin() as conn:
+            return conn.execute(text(
+                "UPDATE notifications SET read = :read WHERE user_id = :user_id AND read = :unread"
+            ), {'read': True, 'user_id': USER_ID, 'unread': False}).rowcount
+
+    updated, elapsed = timed(mark_all_read)
+    results.append((f"mark all read ({updated} rows, one UPDATE)", elapsed))
+    removed, elapsed = timed(prune_read_notifications, engine, 180)
+    results.append((f"retention, older than 180 days ({removed} rows)", elapsed))
+
+    print(f"\n{'operation':<52}{'ms':>10}")
+    for label, elapsed in results:
+        print(f"{label:<52}{elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the rate limit storage backends.
+
+Times a limit check (Flask-Limiter's hit through the ``limits`` strategy)
+for the in-memory storage and the shared mmap storage, with the fixed-window
+and sliding-window-counter strategies, first from one process and then from
+several processes hitting the same table at once (wall time over all
+their checks, process start-up included). Also checks that the
+processes together never exceed a shared limit. Exits with an error if a
+shared-storage check takes longer than --budget microseconds on average.
+
+Examples:
+python benchmark_rate_limiter.py
+python benchmark_rate_limiter.py --checks 200000 --processes 8
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+from limits import parse, storage, strategies
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Registers the mmap:// scheme
+import utils.rate_limit_storage  # noqa: F401
+
+STRATEGIES = {
+    'fixed-window': strategies.FixedWindowRateLimiter,
+    'sliding-window-counter': strategies.SlidingWindowCounterRateLimiter,
+}
+
+
+def time_checks(uri, strategy, checks, keys):
+    limiter = STRATEGIES[strategy](storage.storage_from_string(uri))
+    item = parse('1000000 per hour')
+    identifiers = [f"203.0.113.{i % 256}/{i}" for i in range(keys)]
+    started = time.perf_counter()
+    for i in range(checks):
+        limiter.hit(item, identifiers[i % keys])
+    return (time.perf_counter() - started) / checks * 1e6
+
+
+def _worker(uri, strategy, checks, keys, results):
+    results.put(time_checks(uri, strategy, checks, keys))
+
+
+def _shared_limit_worker(uri, attempts, results):
+    limiter = strategies.SlidingWindowCounterRateLimiter(storage.storage_from_string(uri))
+    item = parse('100 per hour')
+    results.put(sum(limiter.hit(item, 'shared-key') for _ in range(attempts)))
+
+
+def run_parallel(target, args, processes):
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=target, args=args + (results,)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [results.get() for _ in workers]
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Benchmark the rate limit storage backends')
+    parser.add_argument('--checks', type=int, default=100000, help='Checks per run')
+    parser.add_argument('--keys', type=int, default=5000, help='Distinct client keys')
+    parser.add_argument('--processes', type=int, default=4, help='Processes in the contended run')
+    parser.add_argument('--budget', type=float, default=50, help='Microseconds allowed per shared check')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='flaskbin-ratelimit-')
+    shared_uri = f"mmap://{os.path.join(directory, 'bench.bin')}"
+    failed = False
+
+    print(f"{'storage':<10}{'strategy':<26}{'processes':>10}{'us/check':>12}")
+    for strategy in STRATEGIES:
+        memory = time_checks('memory://', strategy, args.checks, args.keys)
+        print(f"{'memory':<10}{strategy:<26}{1:>10}{memory:>12.1f}")
+        single = time_checks(shared_uri, strategy, args.checks, args.keys)
+        # Contended runs report wall time over all checks, so time slicing on
+        # a machine with fewer cores than processes is not counted twice
+        started = time.perf_counter()
+        run_parallel(_worker, (shared_uri, strategy, args.checks // args.processes, args.keys), args.processes)
+        contended = (time.perf_counter() - started) / args.checks * 1e6
+        for processes, per_check in ((1, single), (args.processes, contended)):
+            failed |= per_check > args.budget
+            print(f"{'mmap':<10}{strategy:<26}{processes:>10}{per_check:>12.1f}")
+
+    allowed = sum(run_parallel(_shared_limit_worker, (shared_uri, 100), args.processes))
+    print(f"\n{args.processes} processes x 100 attempts against '100 per hour': {allowed} allowed")
+    failed |= allowed != 100
+
+    if failed:
+        print(f"FAILED: over the {args.budget:.0f}us budget or the shared limit was not enforced")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the paste search backends.
+
+Fills a scratch database with synthetic pastes and times the ILIKE path
+against the native full-text backend for a fixed set of queries.
+
+Examples:
+python benchmark_search.py                                  # 1M pastes, scratch SQLite file
+python benchmark_search.py --rows 100000
+python benchmark_search.py --database-url postgresql://localhost/flaskbin_bench
+
+Only point --database-url at an empty scratch database: the script creates and
+fills its own pastes table.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.search_backends import BACKENDS
+
+VOCABULARY = (
+    "def class return import from self print value result request response "
+    "session query filter order paste user config logger error exception "
+    "handler render template json parse token cache index search update delete "
+    "create insert select commit rollback thread worker queue buffer stream "
+    "socket client server router middleware decorator generator iterator "
+    "lambda async await future promise callback closure module package"
+).split()
+
+QUERIES = ['session', 'render template', 'rollback', 'socket server', 'nonexistentterm']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pastes (
+    id INTEGER PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    content TEXT NOT NULL,
+    syntax VARCHAR(50),
+    visibility VARCHAR(20),
+    is_encrypted BOOLEAN DEFAULT FALSE,
+    user_id INTEGER,
+    created_at TIMESTAMP,
+    expires_at TIMESTAMP
+)
+"""
+
+
+def generate_pastes(engine, rows, batch_size=10000):
+    """Insert ``rows`` synthetic pastes in batches"""
+    rng = random.Random(42)
+    start = datetime.utcnow() - timedelta(days=365)
+    inserted = 0
+    with engine.begin() as conn:
+        conn.execute(text(SCHEMA))
+        existing = conn.execute(text("SELECT COUNT(*) FROM pastes")).scalar()
+    if existing >= rows:
+        print(f"Reusing {existing} existing pastes")
+        return
+
+    while inserted < rows - existing:
+        batch = []
+        for _ in range(min(batch_size, rows - existing - inserted)):
+            lines = [
+                ' '.join(rng.choice(VOCABULARY) for _ in range(rng.randint(4, 12)))
+                for _ in range(rng.randint(5, 40))
+            ]
+            batch.append({
+                'title': ' '.join(rng.choice(VOCABULARY) for _ in range(3)),
+                'content': '\n'.join(lines),
+                'syntax': 'python',
+                'visibility': 'public' if rng.random() < 0.8 else 'private',
+                'is_encrypted': False,
+                'created_at': start + timedelta(seconds=rng.randint(0, 365 * 86400)),
+            })
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO pastes (title, content, syntax, visibility, is_encrypted, created_at)
+                VALUES (:title, :content, :syntax, :visibility, :is_encrypted, :created_at)
+            """), batch)
+        inserted += len(batch)
+        print(f"  inserted {existing + inserted}/{rows}", end='\r')
+    print()
+
+
+def time_backend(engine, backend, field, repeat):
+    """Return {query: [latency seconds, ...]} for one backend"""
+    timings = {}
+    with engine.connect() as conn:
+        for query in QUERIES:
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                hits, total = backend.search(conn, query, field=field, limit=20)
+                backend.snippets(conn, query, field, [paste_id for paste_id, _ in hits])
+                samples.append(time.perf_counter() - started)
+            timings[query] = (samples, total)
+    return timings
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Benchmark ILIKE against full-text search')
+    parser.add_argument('--rows', type=int, default=1000000, help='Number of pastes to generate')
+    parser.add_argument('--database-url', default='sqlite:///search_benchmark.db',
+                        help='Scratch database to fill and query')
+    parser.add_argument('--field', choices=['content', 'title'], default='content')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query')
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    native = 'postgres' if engine.dialect.name == 'postgresql' else 'fts5'
+
+    print(f"Generating {args.rows} pastes in {args.database_url}")
+    generate_pastes(engine, args.rows)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not BACKENDS[native].is_available(conn):
+            print(f"Installing the {native} index")
+            started = time.perf_counter()
+            BACKENDS[native].install(conn)
+            print(f"  built in {time.perf_counter() - started:.1f}s")
+        conn.execute(text("ANALYZE"))
+
+    print(f"\n{'query':<18}{'backend':<10}{'matches':>10}{'median ms':>12}{'p95 ms':>10}")
+    for name in ('like', native):
+        timings = time_backend(engine, BACKENDS[name], args.field, args.repeat)
+        for query, (samples, total) in timings.items():
+            samples.sort()
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            print(f"{query:<18}{name:<10}{total:>10}"
+                  f"{statistics.median(samples) * 1000:>12.1f}{p95 * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark for server-side sessions against Flask's signed cookie sessions.
+
+Runs the same small Flask app with each session interface and reports the
+Cookie header a logged-in visitor sends with every request, and the time per
+request that reads the session. Then checks that anonymous readers get no
+cookie and no stored row, that logging in and out issues a new session ID,
+that a change made through one worker is seen by another sharing the store,
+also when both save the same session at once, and how many loads the
+in-memory tier answered.
+
+Examples:
+python benchmark_session_store.py
+python benchmark_session_store.py --requests 2000 --unlocked 50
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+from flask import Flask, session
+from flask import request as flask_request
+from sqlalchemy import text
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.session_store import ServerSideSessionInterface, SessionStore, sqlite_engine
+
+
+def create_app(interface=None):
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+    if interface is not None:
+        app.session_interface = interface
+
+    @app.route('/static')
+    def static_file():
+        return 'body {}'
+
+    @app.route('/read')
+    def read():
+        # What every page does to find the current user
+        return str(session.get('_user_id'))
+
+    @app.route('/login/<int:unlocked>')
+    def login(unlocked):
+        session['_user_id'] = '42'
+        session['_fresh'] = True
+        session['csrf_token'] = 'f' * 40
+        session['key_cache_id'] = 'k' * 22
+        session['decrypted_pastes'] = {f"paste{number:04d}": True for number in range(unlocked)}
+        return 'ok'
+
+    @app.route('/saved-by')
+    def saved_by():
+        return str(session.get('saved_by'))
+
+    @app.route('/logout')
+    def logout():
+        session.pop('_user_id', None)
+        session.pop('_fresh', None)
+        return 'ok'
+
+    return app
+
+
+def cookie_header(client, app):
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+    return f"{cookie.key}={cookie.value}" if cookie else ''
+
+
+def time_reads(client, requests):
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get('/read')
+    return (time.perf_counter() - started) * 1000 / requests
+
+
+def check(path, unlocked):
+    """Cookie, rotation and cross-worker checks; returns a list of failures"""
+    failures = []
+    first = ServerSideSessionInterface(lambda: SessionStore(sqlite_engine(path)))
+    second = ServerSideSessionInterface(lambda: SessionStore(sqlite_engine(path)))
+    app, other = create_app(first), create_app(second)
+    client = app.test_client()
+
+    for url in ('/static', '/read'):
+        if 'Set-Cookie' in client.get(url).headers:
+            failures.append(f"anonymous {url} set a cookie")
+    with first.store.engine.connect() as conn:
+        if conn.execute(text("SELECT COUNT(*) FROM flask_sessions")).scalar():
+            failures.append('anonymous visit stored a session')
+
+    client.get('/read')
+    client.get(f"/login/{unlocked}")
+    logged_in = cookie_header(client, app)
+    if client.get('/read').get_data(as_text=True) != '42':
+        failures.append('login not kept')
+
+    # Another worker sharing the store sees the session and its changes
+    other_client = other.test_client()
+    other_client.set_cookie(app.config['SESSION_COOKIE_NAME'], logged_in.split('=', 1)[1])
+    if other_client.get('/read').get_data(as_text=True) != '42':
+        failures.append('session not shared between workers')
+    client.get('/logout')
+    if other_client.get('/read').get_data(as_text=True) != 'None':
+        failures.append('other worker used a stale session')
+    if cookie_header(client, app) == logged_in:
+        failures.append('session ID kept across logout')
+
+    client.get(f"/login/{unlocked}")
+    if cookie_header(client, app) in (logged_in, ''):
+        failures.append('session ID not rotated on login')
+
+    # Two workers save the same session at once; the one overwritten must not
+    # keep serving its own copy
+    headers = {'Cookie': cookie_header(client, app)}
+    opened = []
+    for worker_app in (app, other):
+        with worker_app.test_request_context('/read', headers=headers):
+            opened.append(worker_app.session_interface.open_session(worker_app, flask_request))
+            opened[-1].get('_user_id')
+    for name, worker_app, worker_session in zip(('first', 'second'), (app, other), opened):
+        worker_session['saved_by'] = name
+        worker_app.session_interface.save_session(worker_app, worker_session, worker_app.response_class())
+    if client.get('/saved-by').get_data(as_text=True) != 'second':
+        failures.append('worker kept a session overwritten by a concurrent save')
+    return failures
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Benchmark server-side sessions against cookie sessions')
+    parser.add_argument('--requests', type=int, default=1000, help='Requests timed per session interface')
+    parser.add_argument('--unlocked', type=int, default=20, help='Encrypted pastes the visitor has unlocked')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='flaskbin-sessions-')
+    interface = ServerSideSessionInterface(lambda: SessionStore(sqlite_engine(os.path.join(directory, 'bench.db'))))
+
+    print(f"Logged-in visitor with {args.unlocked} unlocked pastes, {args.requests} requests")
+    print(f"  {'sessions':<14}{'cookie':>10}{'per request':>14}")
+    for name, app in (('cookie', create_app()), ('server-side', create_app(interface))):
+        client = app.test_client()
+        client.get(f"/login/{args.unlocked}")
+        per_request = time_reads(client, args.requests)
+        print(f"  {name:<14}{len(cookie_header(client, app)):>9}B{per_request:>12.3f}ms")
+
+    cache = interface.store.cache
+    print(f"In-memory tier answered {cache.hits} of {cache.hits + cache.misses} loads")
+
+    failures = check(os.path.join(directory, 'check.db'), args.unlocked)
+    if failures:
+        print(f"FAILED: {', '.join(failures)}")
+        sys.exit(1)
+    print("Cookie, rotation and cross-worker checks passed")
+
+
+if __name__ == "__main__":
+    main()
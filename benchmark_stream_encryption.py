@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the segmented paste encryption format against Fernet.
+
+Encrypts pastes of increasing size both ways with a random key and reports
+the stored size relative to the plaintext, encrypt and decrypt time, and the
+peak memory allocated while decrypting: all at once for Fernet, one segment
+at a time from a scratch SQLite table for the segmented format (as the raw
+and download routes stream it). Then checks that the format round-trips
+(including characters split across segments) and rejects a wrong key and
+modified, reordered or truncated ciphertext.
+
+Examples:
+python benchmark_stream_encryption.py
+python benchmark_stream_encryption.py --sizes 100000,10000000 --segment-size 16384
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils import decrypt_content, encrypt_content
+from utils.stream_encryption import (DecryptionError, decrypt_stream, encrypt_stream, iter_text, new_key,
+                                     open_text_stream, read_paste_text, store_ciphertext)
+
+
+def measure(function):
+    """(result, seconds, peak bytes allocated) of calling ``function``"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def consume(stream):
+    """Walk a streamed response body without keeping it, returning its length"""
+    return sum(len(piece) for piece in stream)
+
+
+def check(engine, segment_size):
+    """Round-trip and tamper checks; returns a list of failures"""
+    failures = []
+    key, _ = new_key()
+    content = 'é' * segment_size + 'tail'  # multi-byte characters straddle segment boundaries
+    pieces = list(encrypt_stream([content], key, segment_size))
+    if ''.join(iter_text(pieces, key)) != content:
+        failures.append('round trip')
+    if ''.join(iter_text([b''.join(pieces)], key)) != content:
+        failures.append('round trip from one blob')
+    if ''.join(iter_text(list(encrypt_stream([''], key)), key)) != '':
+        failures.append('empty paste')
+
+    tampered = {
+        'wrong key': (pieces, new_key()[0]),
+        'modified byte': (pieces[:1] + [bytes([pieces[1][0] ^ 1]) + pieces[1][1:]] + pieces[2:], key),
+        'reordered segments': (pieces[:1] + [pieces[2], pieces[1]] + pieces[3:], key),
+        'truncated': (pieces[:-1], key),
+    }
+    for name, (stream, stream_key) in tampered.items():
+        try:
+            list(decrypt_stream(stream, stream_key))
+            failures.append(f"accepted {name}")
+        except DecryptionError:
+            pass
+
+    with engine.begin() as conn:
+        store_ciphertext(conn, 2, encrypt_stream([content], key, segment_size))
+    paste = SimpleNamespace(id=2)
+    if read_paste_text(paste, key, engine) != content or open_text_stream(paste, new_key()[0], engine) is not None:
+        failures.append('stored paste')
+    return failures
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Benchmark segmented paste encryption against Fernet')
+    parser.add_argument('--sizes', default='10000,1000000,10000000', help='Comma-separated paste sizes in characters')
+    parser.add_argument('--segment-size', type=int, default=64 * 1024, help='Segment size (ENCRYPTION_SEGMENT_SIZE)')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='flaskbin-encryption-')
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE paste_cipher_segments (paste_id INTEGER, seq INTEGER, data BLOB, PRIMARY KEY (paste_id, seq))
+        """))
+
+    print(f"  {'size':>10}  {'format':<10}{'stored':>8}{'encrypt':>10}{'decrypt':>10}{'peak memory':>14}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        content = ("def handler(request):\n    return request.args\n" * (size // 44 + 1))[:size]
+
+        (encrypted, _, _), encrypt_time, _ = measure(lambda: encrypt_content(content))
+        _, decrypt_time, peak = measure(lambda: len(decrypt_content(encrypted, method='fernet-random')))
+        print(f"  {size:>10}  {'fernet':<10}{len(encrypted) / size:>7.2f}x{encrypt_time * 1000:>8.1f}ms"
+              f"{decrypt_time * 1000:>8.1f}ms{peak / 1048576:>11.1f}MiB")
+
+        key, _ = new_key()
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM paste_cipher_segments WHERE paste_id = 1"))
+        with engine.begin() as conn:
+            stored, encrypt_time, _ = measure(
+                lambda: store_ciphertext(conn, 1, encrypt_stream([content], key, args.segment_size))
+            )
+        paste = SimpleNamespace(id=1)
+        _, decrypt_time, peak = measure(lambda: consume(open_text_stream(paste, key, engine)))
+        print(f"  {size:>10}  {'segmented':<10}{stored / size:>7.2f}x{encrypt_time * 1000:>8.1f}ms"
+              f"{decrypt_time * 1000:>8.1f}ms{peak / 1048576:>11.1f}MiB")
+
+    failures = check(engine, args.segment_size)
+    if failures:
+        print(f"FAILED: {', '.join(failures)}")
+        sys.exit(1)
+    print("Round-trip and tamper checks passed")
+
+
+if __name__ == "__main__":
+    main()
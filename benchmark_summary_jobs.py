@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark for background AI summary jobs against the mock OpenAI server.
+
+Fills a scratch database with users and pastes, starts mock_openai_server.py
+in-process with a fixed model latency, and runs a burst of summary jobs
+through a SummaryJobPool. Reports how long queueing a job takes (what a
+request now waits for), how long the burst takes to finish compared with
+calling the model inline one request at a time, and the peak number of
+concurrent model calls. Then checks that quota was charged exactly once per
+summary the model generated and never past a user's allowance.
+
+With --distinct the pastes share that many contents (think forks) and jobs
+go through the summary cache. The report then adds how jobs were answered,
+and without failures each content must reach the model only once.
+
+Examples:
+python benchmark_summary_jobs.py
+python benchmark_summary_jobs.py --jobs 200 --workers 8 --latency 0.5 --fail-rate 0.2
+python benchmark_summary_jobs.py --distinct 10 --fail-rate 0
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mock_openai_server import start_mock_server
+
+SCHEMA = [
+    """CREATE TABLE users (
+        id INTEGER PRIMARY KEY, ai_calls_remaining INTEGER DEFAULT 0, free_ai_trials_used INTEGER DEFAULT 0)""",
+    "CREATE TABLE pastes (id INTEGER PRIMARY KEY, content TEXT, syntax VARCHAR(50), ai_summary TEXT)",
+    """CREATE TABLE summary_jobs (
+        id VARCHAR(32) PRIMARY KEY, paste_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+        kind VARCHAR(20) NOT NULL, charge VARCHAR(20) NOT NULL, status VARCHAR(20) NOT NULL,
+        summary TEXT, source VARCHAR(20), error VARCHAR(255), created_at TIMESTAMP NOT NULL,
+        finished_at TIMESTAMP)""",
+    """CREATE TABLE ai_summary_cache (
+        content_hash VARCHAR(64), language VARCHAR(50), model VARCHAR(50), prompt_version INTEGER,
+        summary TEXT, claimed_at TIMESTAMP, created_at TIMESTAMP NOT NULL, expires_at TIMESTAMP,
+        PRIMARY KEY (content_hash, language, model, prompt_version))""",
+]
+
+# Premium users 1-10 with 5 calls each, free users 11-20 with all 3 trials left
+PREMIUM_CALLS = 5
+
+
+def generate(engine, jobs, distinct):
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO users (id, ai_calls_remaining, free_ai_trials_used) VALUES (:id, :calls, 0)"),
+                     [{'id': i, 'calls': PREMIUM_CALLS if i <= 10 else 0} for i in range(1, 21)])
+        conn.execute(text("INSERT INTO pastes (id, content, syntax) VALUES (:id, :content, 'python')"),
+                     [{'id': i, 'content': f"def handler_{i % distinct}(request):\n    return {i % distinct}\n" * 20}
+                      for i in range(1, jobs + 1)])
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Benchmark background AI summary jobs')
+    parser.add_argument('--jobs', type=int, default=100, help='Jobs in the burst')
+    parser.add_argument('--workers', type=int, default=4, help='Summary workers (SUMMARY_WORKERS)')
+    parser.add_argument('--latency', type=float, default=0.5, help='Mock model latency in seconds')
+    parser.add_argument('--fail-rate', type=float, default=0.1, help='Share of model calls that fail')
+    parser.add_argument('--distinct', type=int, default=0,
+                        help='Distinct paste contents, served through the summary cache (0: all distinct, no cache)')
+    args = parser.parse_args()
+
+    server = start_mock_server(latency=args.latency, fail_rate=args.fail_rate)
+    os.environ['OPENAI_BASE_URL'] = server.base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+    from utils import SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, generate_ai_summary
+    from utils.summary_cache import SummaryCache
+    from utils.summary_jobs import SummaryJobPool, new_job_id
+
+    directory = tempfile.mkdtemp(prefix='flaskbin-summary-')
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}",
+                           connect_args={'timeout': 30, 'check_same_thread': False})
+    generate(engine, args.jobs, args.distinct or args.jobs)
+    cache = SummaryCache(engine, SUMMARY_MODEL, SUMMARY_PROMPT_VERSION) if args.distinct else None
+    pool = SummaryJobPool(engine, generate_ai_summary, workers=args.workers, queue_limit=args.jobs, cache=cache)
+
+    # Jobs are spread over the users, so several run against each allowance at once
+    queue_times = []
+    started = time.perf_counter()
+    for paste_id in range(1, args.jobs + 1):
+        user_id = (paste_id - 1) % 20 + 1
+        queued = time.perf_counter()
+        job_id = new_job_id()
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO summary_jobs (id, paste_id, user_id, kind, charge, status, created_at)
+                VALUES (:id, :paste_id, :user_id, 'generate', :charge, 'queued', :now)
+            """), {'id': job_id, 'paste_id': paste_id, 'user_id': user_id,
+                   'charge': 'call' if user_id <= 10 else 'trial', 'now': datetime.utcnow()})
+        pool.submit(job_id)
+        queue_times.append(time.perf_counter() - queued)
+    while pool.pending:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    with engine.connect() as conn:
+        statuses = dict(conn.execute(text("SELECT status, COUNT(*) FROM summary_jobs GROUP BY status")).fetchall())
+        stored = conn.execute(text("SELECT COUNT(*) FROM pastes WHERE ai_summary IS NOT NULL")).scalar()
+        sources = dict(conn.execute(text(
+            "SELECT source, COUNT(*) FROM summary_jobs WHERE status = 'done' GROUP BY source"
+        )).fetchall())
+        spent = conn.execute(text(f"""
+            SELECT SUM({PREMIUM_CALLS} - ai_calls_remaining) FROM users WHERE id <= 10
+        """)).scalar() + conn.execute(text("SELECT SUM(free_ai_trials_used) FROM users WHERE id > 10")).scalar()
+        overdrawn = conn.execute(text(
+            "SELECT COUNT(*) FROM users WHERE ai_calls_remaining < 0 OR free_ai_trials_used > 3"
+        )).scalar()
+
+    queue_times.sort()
+    print(f"Queue a job:           p50 {queue_times[len(queue_times) // 2] * 1000:.1f}ms, "
+          f"max {queue_times[-1] * 1000:.1f}ms (inline call held the request ~{args.latency * 1000:.0f}ms)")
+    print(f"Burst of {args.jobs} jobs:      {elapsed:.1f}s with {args.workers} workers "
+          f"(~{args.jobs * args.latency:.1f}s calling the model inline, one at a time)")
+    print(f"Peak concurrent calls: {server.peak_in_flight}")
+    print(f"Job results:           {statuses}")
+    print(f"Answered by:           {sources}, {server.requests} upstream requests")
+    print(f"Summaries stored:      {stored}, quota charged: {spent}, users overdrawn: {overdrawn}")
+
+    failed = server.peak_in_flight > args.workers or overdrawn
+    failed |= stored != statuses.get('done', 0) or spent != sources.get('model', 0)
+    if args.distinct and not args.fail_rate:
+        failed |= server.requests > args.distinct
+    if failed:
+        print("FAILED: concurrency, quota accounting or request coalescing is wrong")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark for counting unique paste views without sessions.
+
+Serves a page that identifies its viewer the way the paste routes do, both
+with the old approach (a random ID kept in the session) and with
+get_viewer_id(), and reports the time per view and how many responses set a
+cookie. Then checks that anonymous IDs are stable for a viewer within a day
+and differ across IP addresses, user agents, days and secrets.
+
+Examples:
+python benchmark_viewer_id.py
+python benchmark_viewer_id.py --views 5000
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+from datetime import date, timedelta
+
+from flask import Flask, session
+from flask_login import LoginManager
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils import anonymous_viewer_id, get_viewer_id
+
+
+def create_app():
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: None)
+
+    @app.route('/session')
+    def session_viewer():
+        if 'viewer_id' not in session:
+            session['viewer_id'] = str(uuid.uuid4())
+        return session['viewer_id']
+
+    @app.route('/stateless')
+    def stateless_viewer():
+        return get_viewer_id()
+
+    return app
+
+
+def check():
+    """Identity checks; returns a list of failures"""
+    failures = []
+    secret, today = b'secret', date(2026, 1, 1)
+    viewer = anonymous_viewer_id(secret, '203.0.113.7', 'Firefox', today)
+    if anonymous_viewer_id(secret, '203.0.113.7', 'Firefox', today) != viewer:
+        failures.append('unstable within a day')
+    others = {
+        'IP address': anonymous_viewer_id(secret, '203.0.113.8', 'Firefox', today),
+        'user agent': anonymous_viewer_id(secret, '203.0.113.7', 'Chrome', today),
+        'day': anonymous_viewer_id(secret, '203.0.113.7', 'Firefox', today + timedelta(days=1)),
+        'secret': anonymous_viewer_id(b'other', '203.0.113.7', 'Firefox', today),
+    }
+    failures += [f"same ID for another {name}" for name, other in others.items() if other == viewer]
+    return failures
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Benchmark session-free viewer identification')
+    parser.add_argument('--views', type=int, default=1000, help='Anonymous first views per approach')
+    args = parser.parse_args()
+
+    app = create_app()
+    print(f"{args.views} first views by anonymous visitors")
+    print(f"  {'viewer ID':<12}{'per view':>12}{'cookies set':>14}")
+    for name in ('session', 'stateless'):
+        cookies = 0
+        started = time.perf_counter()
+        for number in range(args.views):
+            # A new client per view: each visitor arrives without a cookie
+            address = f"10.0.{number // 256}.{number % 256}"
+            response = app.test_client().get(f"/{name}", environ_base={'REMOTE_ADDR': address})
+            cookies += 'Set-Cookie' in response.headers
+        elapsed = time.perf_counter() - started
+        print(f"  {name:<12}{elapsed * 1000 / args.views:>10.3f}ms{cookies:>14}")
+
+    failures = check()
+    if cookies:
+        failures.append('stateless viewer IDs set a cookie')
+    if failures:
+        print(f"FAILED: {', '.join(failures)}")
+        sys.exit(1)
+    print("Viewer identity checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Query count check for the collection routes and paste count hooks.
+
+Builds a scratch database with one user owning 500 collections, then counts
+the statements issued by the collection listing, collection delete and
+paste removal, the way those routes now run them, next to the per-collection
+and per-paste statements they used to issue. Pastes are then added, moved,
+taken out of collections and deleted through an ORM session with the
+utils.collection_counts flush hooks installed. Exits with a non-zero status
+if any operation issues more statements than its budget or if the maintained
+paste counts drift from the pastes table.
+
+python check_collection_queries.py
+python check_collection_queries.py --collections 2000 --pastes-per-collection 20
+"""
+import os
+import sys
+import argparse
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, event, select, text
+from sqlalchemy.orm import Session, declarative_base
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.collection_counts import (
+    PASTE_COUNT, detach_collection_pastes, reconcile_collection_counts, register_collection_count_hooks,
+    remove_paste_from_collection
+)
+
+USER_ID = 1
+
+# Statements each operation may issue
+BUDGETS = {
+    'list_collections': 1,
+    'delete_collection': 3,
+    'remove_paste': 2,
+}
+
+SCHEMA = [
+    """CREATE TABLE paste_collections (
+        id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, user_id INTEGER NOT NULL,
+        paste_count INTEGER NOT NULL DEFAULT 0)""",
+    """CREATE TABLE pastes (
+        id INTEGER PRIMARY KEY, user_id INTEGER, collection_id INTEGER, created_at TIMESTAMP)""",
+    "CREATE INDEX ix_paste_collections_user_id ON paste_collections (user_id)",
+    "CREATE INDEX ix_pastes_collection_id_created_at ON pastes (collection_id, created_at)",
+]
+
+paste_collections = Table(
+    'paste_collections', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('name', String(100)),
+    Column('user_id', Integer),
+)
+
+Base = declarative_base()
+
+
+class Paste(Base):
+    """The pastes columns the flush hooks read; they match on the table name"""
+    __tablename__ = 'pastes'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)
+    collection_id = Column(Integer)
+    created_at = Column(DateTime)
+
+
+class StatementCounter:
+    """Counts statements sent to the database while active"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # An executemany still runs once per row on the server
+        self.count += len(parameters) if executemany else 1
+
+    def measure(self, function, *args):
+        self.count = 0
+        result = function(*args)
+        return result, self.count
+
+
+def generate(engine, collections, pastes_per_collection):
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO paste_collections (id, name, user_id) VALUES (:id, :name, :user_id)"
+        ), [{'id': i, 'name': f"collection {i:05d}", 'user_id': USER_ID} for i in range(1, collections + 1)])
+        conn.execute(text(
+            "INSERT INTO pastes (user_id, collection_id, created_at) VALUES (:user_id, :collection_id, :now)"
+        ), [{'user_id': USER_ID, 'collection_id': 1 + i % collections, 'now': datetime.utcnow()}
+            for i in range(collections * pastes_per_collection)])
+        reconcile_collection_counts(conn)
+
+
+def legacy_list(conn):
+    rows = conn.execute(text(
+        "SELECT id, name FROM paste_collections WHERE user_id = :user_id ORDER BY name"
+    ), {'user_id': USER_ID}).fetchall()
+    return {row[0]: conn.execute(text(
+        "SELECT COUNT(*) FROM pastes WHERE collection_id = :collection_id"
+    ), {'collection_id': row[0]}).scalar() for row in rows}
+
+
+def current_list(conn):
+    # The statement the listing builds: the collection rows with their counter
+    rows = conn.execute(
+        select(paste_collections, PASTE_COUNT)
+        .where(paste_collections.c.user_id == USER_ID)
+        .order_by(paste_collections.c.name)
+    ).fetchall()
+    return {row.id: row.paste_count for row in rows}
+
+
+def legacy_delete(conn, collection_id):
+    ids = conn.execute(text(
+        "SELECT id FROM pastes WHERE collection_id = :collection_id"
+    ), {'collection_id': collection_id}).scalars().all()
+    conn.execute(text("UPDATE pastes SET collection_id = NULL WHERE id = :id"), [{'id': i} for i in ids])
+    conn.execute(text("DELETE FROM paste_collections WHERE id = :id"), {'id': collection_id})
+
+
+def current_delete(conn, collection_id):
+    detach_collection_pastes(conn, collection_id)
+    conn.execute(text("DELETE FROM paste_collections WHERE id = :id"), {'id': collection_id})
+
+
+def orm_changes(engine, first, second):
+    """Add, move, detach and delete pastes through an ORM session"""
+    with Session(engine) as session:
+        pastes = session.query(Paste).filter_by(collection_id=first).order_by(Paste.id).limit(3).all()
+        pastes[0].collection_id = second
+        pastes[1].collection_id = None
+        session.delete(pastes[2])
+        session.add(Paste(user_id=USER_ID, collection_id=second, created_at=datetime.utcnow()))
+        session.commit()
+        # Moved back after the commit expired it, so the old value is unloaded
+        pastes[0].collection_id = first
+        session.commit()
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Check statement counts of the collection routes')
+    parser.add_argument('--collections', type=int, default=500)
+    parser.add_argument('--pastes-per-collection', type=int, default=10)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    generate(engine, args.collections, args.pastes_per_collection)
+    counter = StatementCounter(engine)
+
+    results = {}
+    with engine.begin() as conn:
+        legacy_counts, results['legacy list_collections'] = counter.measure(legacy_list, conn)
+        counts, results['list_collections'] = counter.measure(current_list, conn)
+        paste_id = conn.execute(text("SELECT MIN(id) FROM pastes WHERE collection_id = 2")).scalar()
+        _, results['remove_paste'] = counter.measure(remove_paste_from_collection, conn, 2, paste_id)
+        _, results['legacy delete_collection'] = counter.measure(legacy_delete, conn, 3)
+        _, results['delete_collection'] = counter.measure(current_delete, conn, 1)
+        drift = reconcile_collection_counts(conn)
+
+    register_collection_count_hooks()
+    orm_changes(engine, 4, 5)
+    with engine.begin() as conn:
+        orm_drift = reconcile_collection_counts(conn)
+
+    print(f"{args.collections} collections, {args.pastes_per_collection} pastes each\n")
+    print(f"{'operation':<28}{'statements':>12}{'budget':>8}")
+    failures = []
+    for name, count in results.items():
+        budget = BUDGETS.get(name)
+        print(f"{name:<28}{count:>12}{budget if budget is not None else '':>8}")
+        if budget is not None and count > budget:
+            failures.append(name)
+
+    if counts != legacy_counts:
+        print("\nMaintained paste counts differ from COUNT(*) per collection.")
+        failures.append('counts')
+    if drift:
+        print(f"\n{drift} collection counts drifted after remove/delete.")
+        failures.append('drift')
+    if orm_drift:
+        print(f"\n{orm_drift} collection counts drifted after ORM changes.")
+        failures.append('orm drift')
+    if failures:
+        sys.exit(1)
+    print("\nAll collection operations are within their statement budget and counts are in step.")
+
+
+if __name__ == "__main__":
+    main()
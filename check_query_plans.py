@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Query plan regression check for the hot query shapes.
+
+Captures EXPLAIN output for each hot query on the configured database
+(SQLite or PostgreSQL) and exits with a non-zero status when any of them
+falls back to a sequential scan of its table. Run it after add_query_indexes.py
+and after any schema change that touches pastes, paste_views or notifications:
+
+python check_query_plans.py
+python check_query_plans.py --verbose   # also print the captured plans
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+# Add the current directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+
+# name -> (SQL, parameters). These mirror the filters used by the archive,
+# search, profile, collection, dashboard and notification routes.
+HOT_QUERIES = {
+    'recent_public_pastes': (
+        "SELECT id FROM pastes "
+        "WHERE visibility = :visibility AND (expires_at IS NULL OR expires_at > :now) "
+        "ORDER BY created_at DESC LIMIT 20",
+        {'visibility': 'public'},
+    ),
+    'public_pastes_by_syntax': (
+        "SELECT id FROM pastes "
+        "WHERE visibility = :visibility AND syntax = :syntax "
+        "AND (expires_at IS NULL OR expires_at > :now) "
+        "ORDER BY created_at DESC LIMIT 20",
+        {'visibility': 'public', 'syntax': 'python'},
+    ),
+    'user_pastes': (
+        "SELECT id FROM pastes WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 10",
+        {'user_id': 1},
+    ),
+    'collection_pastes': (
+        "SELECT id FROM pastes WHERE collection_id = :collection_id "
+        "ORDER BY created_at DESC LIMIT 10",
+        {'collection_id': 1},
+    ),
+    'paste_views_window': (
+        "SELECT COUNT(*) FROM paste_views WHERE paste_id = :paste_id AND created_at >= :since",
+        {'paste_id': 1},
+    ),
+    'unread_notifications': (
+        "SELECT COUNT(*) FROM notifications WHERE user_id = :user_id AND read = :read",
+        {'user_id': 1, 'read': False},
+    ),
+    'notification_inbox_page': (
+        "SELECT id FROM notifications WHERE user_id = :user_id "
+        "AND (created_at < :now OR (created_at = :now AND id < :id)) "
+        "ORDER BY created_at DESC, id DESC LIMIT 21",
+        {'user_id': 1, 'id': 1000},
+    ),
+    'expired_pastes_chunk': (
+        "SELECT id FROM pastes WHERE expires_at IS NOT NULL AND expires_at < :now "
+        "ORDER BY expires_at LIMIT 500",
+        {},
+    ),
+    'recent_users_count': (
+        "SELECT COUNT(*) FROM users WHERE created_at >= :since",
+        {},
+    ),
+    'recent_pastes_count': (
+        "SELECT COUNT(*) FROM pastes WHERE created_at >= :since",
+        {},
+    ),
+    'recent_comments_count': (
+        "SELECT COUNT(*) FROM comments WHERE created_at >= :since",
+        {},
+    ),
+    'notification_retention_batch': (
+        "SELECT id FROM notifications WHERE read = :read AND created_at < :now "
+        "ORDER BY created_at LIMIT 1000",
+        {'read': True},
+    ),
+}
+
+
+def explain_sqlite(conn, sql, params):
+    """
+    Return (plan_lines, seq_scans) for a query on SQLite.
+
+    A plain "SCAN <table>" without "USING ... INDEX" is a full table scan.
+    """
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+    plan_lines = [row[-1] for row in rows]
+    seq_scans = [
+        line for line in plan_lines
+        if line.startswith('SCAN') and 'USING' not in line
+    ]
+    return plan_lines, seq_scans
+
+
+def _walk_pg_plan(node):
+    """Yield every node of a PostgreSQL JSON plan tree"""
+    yield node
+    for child in node.get('Plans', []):
+        yield from _walk_pg_plan(child)
+
+
+def explain_postgres(conn, sql, params):
+    """
+    Return (plan_lines, seq_scans) for a query on PostgreSQL.
+
+    enable_seqscan is switched off for the duration of the check so that a
+    Seq Scan only appears when no usable index exists. Without this the planner
+    legitimately prefers sequential scans on small development tables.
+    """
+    conn.execute(text("SET LOCAL enable_seqscan = off"))
+    result = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()
+    plan = result if isinstance(result, list) else json.loads(result)
+    nodes = list(_walk_pg_plan(plan[0]['Plan']))
+    plan_lines = [
+        f"{node['Node Type']} {node.get('Relation Name', '')} {node.get('Index Name', '')}".strip()
+        for node in nodes
+    ]
+    seq_scans = [
+        f"Seq Scan on {node.get('Relation Name')}"
+        for node in nodes if node['Node Type'] == 'Seq Scan'
+    ]
+    return plan_lines, seq_scans
+
+
+def check_query_plans(verbose=False):
+    """
+    Run EXPLAIN for every hot query.
+
+    Returns:
+        list: Names of the queries that fell back to a sequential scan
+    """
+    dialect = db.engine.dialect.name
+    explain = explain_postgres if dialect == 'postgresql' else explain_sqlite
+    now = datetime.utcnow()
+
+    failures = []
+    for name, (sql, params) in HOT_QUERIES.items():
+        bound = dict(params, now=now, since=now - timedelta(days=7))
+        # Each query gets its own transaction so SET LOCAL does not leak
+        with db.engine.begin() as conn:
+            plan_lines, seq_scans = explain(conn, sql, bound)
+
+        if seq_scans:
+            failures.append(name)
+            print(f"FAIL {name}: {', '.join(seq_scans)}")
+        else:
+            print(f"ok   {name}")
+
+        if verbose or seq_scans:
+            for line in plan_lines:
+                print(f"       {line}")
+
+    return failures
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Check that hot queries are served by indexes')
+    parser.add_argument('--verbose', action='store_true', help='Print the captured plan for every query')
+    args = parser.parse_args()
+
+    with app.app_context():
+        print(f"Checking query plans on {db.engine.dialect.name}")
+        failures = check_query_plans(verbose=args.verbose)
+
+    if failures:
+        print(f"{len(failures)} hot queries fall back to a sequential scan. Run add_query_indexes.py.")
+        sys.exit(1)
+
+    print("All hot queries are index-backed.")
+
+
+if __name__ == "__main__":
+    main()
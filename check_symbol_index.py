@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Check for the code symbol index behind symbol search.
+
+Builds a scratch SQLite database with the pastes and paste_symbols tables,
+harvests symbols from a few small pastes (including names that differ only
+in case, such as MAX and Max, which share one paste_symbols row) and stores
+them the way the background indexer does. Exits with a non-zero status if a
+paste ends up without its symbols or symbol search does not find it.
+
+python check_symbol_index.py
+"""
+import os
+import sys
+
+from sqlalchemy import create_engine, text
+
+# Add the current directory to the path so we can import the app modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.symbol_index import SymbolSearchBackend, extract_symbols, replace_paste_symbols
+
+SCHEMA = [
+    """CREATE TABLE pastes (
+        id INTEGER PRIMARY KEY, visibility VARCHAR(20), created_at TIMESTAMP, expires_at TIMESTAMP)""",
+    """CREATE TABLE paste_symbols (
+        paste_id INTEGER NOT NULL, name_lower VARCHAR(100) NOT NULL, kind VARCHAR(10) NOT NULL,
+        name VARCHAR(100) NOT NULL, PRIMARY KEY (paste_id, name_lower, kind))""",
+    "CREATE INDEX ix_paste_symbols_name_lower ON paste_symbols (name_lower, paste_id)",
+]
+
+# paste id -> (syntax, content, query that must find it)
+PASTES = {
+    1: ('python', "def render_page(request):\n    return request\n", 'render_page'),
+    2: ('python', "MAX = 10\nMax = 20\n\ndef parse():\n    pass\n\ndef Parse():\n    pass\n", 'max'),
+    3: ('javascript', "const Foo = 1;\nlet foo = 2;\nfunction handler() {}\n", 'foo'),
+}
+
+
+def main():
+    """Main entry point for the script."""
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO pastes (id, visibility, created_at) VALUES (:id, 'public', CURRENT_TIMESTAMP)"
+        ), [{'id': paste_id} for paste_id in PASTES])
+
+    backend = SymbolSearchBackend()
+    failures = []
+    for paste_id, (syntax, content, query) in PASTES.items():
+        symbols = extract_symbols(content, syntax)
+        replace_paste_symbols(engine, paste_id, symbols)
+        with engine.connect() as conn:
+            stored = conn.execute(text(
+                "SELECT name_lower, kind FROM paste_symbols WHERE paste_id = :paste_id"
+            ), {'paste_id': paste_id}).fetchall()
+            results, _ = backend.search(conn, query)
+
+        expected = {(name.lower(), kind) for name, kind in symbols}
+        print(f"paste {paste_id} ({syntax}): {len(symbols)} names, {len(stored)} rows, "
+              f"'{query}' -> {[result[0] for result in results]}")
+        if set(map(tuple, stored)) != expected:
+            failures.append(f"paste {paste_id} stored {len(stored)} of {len(expected)} symbols")
+        if paste_id not in [result[0] for result in results]:
+            failures.append(f"symbol search for '{query}' missed paste {paste_id}")
+
+    if failures:
+        print(f"\nFAILED: {'; '.join(failures)}")
+        sys.exit(1)
+    print("\nEvery paste kept its symbols and symbol search found it.")
+
+
+if __name__ == "__main__":
+    main()
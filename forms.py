@@ -178,6 +178,8 @@ class PasteForm(FlaskForm):
         Optional(), 
         EqualTo('encryption_password', message='Passwords must match.')
     ])
+    # Set by the browser once it has replaced the content with its ciphertext
+    client_encryption = BooleanField('Encrypt in My Browser', default=False)
     
     post_as_guest = BooleanField('Paste as a guest', default=False)
     edit_description = StringField('Edit Description (for existing pastes)', validators=[Optional(), Length(max=255)])
@@ -254,6 +256,8 @@ class SearchForm(FlaskForm):
     search_type = SelectField('Search By', choices=[
         ('content', 'Content'),
         ('title', 'Title'),
+        ('fragment', 'Code fragment'),
+        ('symbol', 'Symbol'),
         ('syntax', 'Syntax'),
         ('author', 'Author'),
         ('tag', 'Tag (Premium)')
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Idle-connection load test for the notification event stream.
+
+Opens many concurrent connections to /notification/notifications/stream on a
+running server, holds them idle, and reports how many connected, how long
+connecting took, how many heartbeats arrived, and how many streams were
+dropped. The server must run with NOTIFICATION_STREAM=on and a worker class
+that can hold many idle connections (see DEPLOYMENT.md).
+
+Examples:
+python loadtest_notification_stream.py --cookie "session=..." --connections 10000
+python loadtest_notification_stream.py --url http://node1:5000/notification/notifications/stream \\
+    --cookie "session=..." --connections 10000 --hold 120
+
+Every connection uses the same session cookie, which is enough to exercise
+the broker: streams for one user share a subscriber set just as streams for
+different users share the broker. Keep --hold below the server's
+NOTIFICATION_STREAM_MAX_AGE, or rotated streams are reported as dropped.
+"""
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from urllib.parse import urlsplit
+
+
+class Stats:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.dropped = 0
+        self.heartbeats = 0
+        self.events = 0
+        self.connect_times = []
+        self.errors = {}
+
+    def error(self, reason):
+        self.failed += 1
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+
+async def hold_stream(url, cookie, hold, stats):
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, port, ssl=parts.scheme == 'https'
+        )
+    except OSError as e:
+        stats.error(type(e).__name__)
+        return
+
+    writer.write((
+        f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nAccept: text/event-stream\r\n"
+        f"Cookie: {cookie}\r\nConnection: keep-alive\r\n\r\n"
+    ).encode())
+    try:
+        status = await asyncio.wait_for(reader.readline(), timeout=30)
+        if b' 200 ' not in status:
+            stats.error(status.decode(errors='replace').strip() or 'empty response')
+            return
+        while (await reader.readline()) not in (b'\r\n', b''):
+            pass
+        stats.connected += 1
+        stats.connect_times.append(time.perf_counter() - started)
+
+        deadline = time.monotonic() + hold
+        while time.monotonic() < deadline:
+            line = await asyncio.wait_for(reader.readline(), timeout=deadline - time.monotonic())
+            if not line:
+                stats.dropped += 1
+                return
+            if line.startswith(b': heartbeat'):
+                stats.heartbeats += 1
+            elif line.startswith(b'event:'):
+                stats.events += 1
+    except asyncio.TimeoutError:
+        pass
+    except OSError as e:
+        stats.error(type(e).__name__)
+    finally:
+        writer.close()
+
+
+async def run(args):
+    stats = Stats()
+    tasks = []
+    for i in range(args.connections):
+        tasks.append(asyncio.create_task(hold_stream(args.url, args.cookie, args.hold, stats)))
+        if args.ramp and i % args.ramp == args.ramp - 1:
+            await asyncio.sleep(1)
+    report_every = max(args.hold // 6, 5)
+    while not all(task.done() for task in tasks):
+        await asyncio.sleep(report_every)
+        print(f"  open {stats.connected - stats.dropped}, failed {stats.failed}, "
+              f"heartbeats {stats.heartbeats}")
+    return stats
+
+
+def raise_file_limit(needed):
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < needed:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Hold many idle notification streams open')
+    parser.add_argument('--url', default='http://127.0.0.1:5000/notification/notifications/stream')
+    parser.add_argument('--cookie', required=True, help='Cookie header of a logged-in session')
+    parser.add_argument('--connections', type=int, default=10000)
+    parser.add_argument('--hold', type=int, default=60, help='Seconds to hold each stream')
+    parser.add_argument('--ramp', type=int, default=1000, help='Connections opened per second (0: all at once)')
+    args = parser.parse_args()
+
+    raise_file_limit(args.connections + 100)
+    print(f"Opening {args.connections} streams to {args.url} for {args.hold}s")
+    stats = asyncio.run(run(args))
+
+    print(f"\nconnected   {stats.connected}/{args.connections}")
+    print(f"failed      {stats.failed} {stats.errors or ''}")
+    print(f"dropped     {stats.dropped}")
+    print(f"heartbeats  {stats.heartbeats}")
+    print(f"events      {stats.events}")
+    if stats.connect_times:
+        times = sorted(stats.connect_times)
+        print(f"connect ms  median {statistics.median(times) * 1000:.1f}, "
+              f"p99 {times[int(len(times) * 0.99)] * 1000:.1f}")
+    if stats.connected < args.connections or stats.dropped:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Script to maintain the monthly paste_views partitions.
+
+Creates next months' partitions ahead of time on PostgreSQL, rotates the
+active table at the start of a month on SQLite, and rolls partitions older
+than PASTE_VIEW_RETENTION_MONTHS up into paste_view_daily before dropping
+them. Safe to run daily; steps that are not due do nothing.
+
+Example cron entry:
+20 0 * * * /path/to/python /path/to/maintain_view_partitions.py
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger('view_partition_maintainer')
+
+# Add the current directory to the path so we can import our app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from utils.view_partitions import AHEAD_MONTHS, RETENTION_MONTHS, list_partitions, maintain_partitions
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Create, rotate, roll up and drop paste_views partitions')
+    parser.add_argument('--retention-months', type=int, default=RETENTION_MONTHS,
+                        help='Whole months of raw view rows to keep')
+    parser.add_argument('--ahead', type=int, default=AHEAD_MONTHS,
+                        help='Months of partitions to create ahead (PostgreSQL)')
+    parser.add_argument('--list', action='store_true', help='Only list the catalogued partitions')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.list:
+            with db.engine.connect() as conn:
+                for row in list_partitions(conn, live=False):
+                    state = f"rolled up {row.rolled_up_at} ({row.row_count} views)" if row.rolled_up_at else "live"
+                    logger.info(f"{row.name}: {row.range_start} to {row.range_end or 'now'}, {state}")
+            return
+
+        started = time.perf_counter()
+        try:
+            result = maintain_partitions(db.engine, retention_months=args.retention_months, ahead=args.ahead)
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
+            sys.exit(1)
+        for name in result['created']:
+            logger.info(f"Created partition {name}")
+        for name, rows in result['rolled_up'].items():
+            logger.info(f"Rolled up and dropped {name} ({rows} views)")
+        logger.info(f"Partition maintenance done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Answers POST /v1/chat/completions after a configurable delay with a short
+canned summary and an approximate token usage, and can fail a share of
+requests, so the AI summary features can be exercised and benchmarked without
+an API key or network access. Point the app at it with:
+
+OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=test
+
+Examples:
+python mock_openai_server.py
+python mock_openai_server.py --port 8089 --latency 1.5 --fail-rate 0.1
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def estimate_tokens(text):
+    # Close enough to the tokenizer for English and code
+    return max(1, len(text) // 4)
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=1.0, jitter=0.0, fail_rate=0.0, tokens_per_second=0):
+        super().__init__(address, MockOpenAIHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.tokens_per_second = tokens_per_second
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        server = self.server
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self._reply(404, {'error': {'message': 'Not found'}})
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        prompt = ''.join(message.get('content', '') for message in request.get('messages', []))
+        prompt_tokens = estimate_tokens(prompt)
+
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+        try:
+            delay = server.latency + random.uniform(0, server.jitter)
+            if server.tokens_per_second:
+                delay += prompt_tokens / server.tokens_per_second
+            time.sleep(delay)
+            if random.random() < server.fail_rate:
+                return self._reply(500, {'error': {'message': 'Mock upstream failure', 'type': 'server_error'}})
+
+            lines = prompt.count('\n') + 1
+            content = (f"This code spans {lines} lines and defines its main functionality "
+                       f"in a few components (mock summary of {prompt_tokens} prompt tokens).")
+            completion_tokens = min(estimate_tokens(content), request.get('max_tokens') or 150)
+            with server.lock:
+                server.prompt_tokens += prompt_tokens
+                server.completion_tokens += completion_tokens
+            self._reply(200, {
+                'id': f"chatcmpl-mock{server.requests}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request.get('model', 'mock'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens,
+                },
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+def start_mock_server(port=0, **options):
+    """Serve from a daemon thread; returns the server (see .base_url)"""
+    server = MockOpenAIServer(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, name='mock-openai', daemon=True).start()
+    return server
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Serve a stand-in for the OpenAI chat completions API')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8089, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=1.0, help='Seconds before each reply')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay of up to this many seconds')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of requests answered with a 500')
+    parser.add_argument('--tokens-per-second', type=float, default=0,
+                        help='Add prompt_tokens / this to each delay (0 to disable)')
+    args = parser.parse_args()
+
+    server = MockOpenAIServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                              fail_rate=args.fail_rate, tokens_per_second=args.tokens_per_second)
+    print(f"Mock OpenAI API on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"{server.requests} requests, {server.prompt_tokens} prompt tokens, "
+              f"{server.completion_tokens} completion tokens")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -392,7 +392,125 @@ if not _MODELS_INITIALIZED:
             
         def __repr__(self):
             return f'<PasswordResetToken user_id={self.user_id}>'
-    
+
+    class PasteSymbol(db.Model):
+        """Definition name harvested from a paste's code, for symbol search"""
+        __tablename__ = 'paste_symbols'
+
+        paste_id = db.Column(db.Integer, db.ForeignKey('pastes.id', ondelete='CASCADE'), primary_key=True)
+        name_lower = db.Column(db.String(100), primary_key=True)
+        kind = db.Column(db.String(10), primary_key=True)  # function, class, variable
+        name = db.Column(db.String(100), nullable=False)
+
+        __table_args__ = (
+            # Exact and prefix lookups; pattern ops let PostgreSQL use it for LIKE 'abc%'
+            db.Index('ix_paste_symbols_name_lower', 'name_lower', 'paste_id',
+                     postgresql_ops={'name_lower': 'varchar_pattern_ops'}),
+        )
+
+        def __repr__(self):
+            return f'<PasteSymbol {self.kind} {self.name} paste_id={self.paste_id}>'
+
+    class UserDailyStats(db.Model):
+        """Per-user, per-day activity rollup maintained by utils.user_stats"""
+        __tablename__ = 'user_daily_stats'
+
+        user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+        day = db.Column(db.Date, primary_key=True)
+        pastes_created = db.Column(db.Integer, default=0, nullable=False)
+        views_received = db.Column(db.Integer, default=0, nullable=False)
+        comments_received = db.Column(db.Integer, default=0, nullable=False)
+        comments_made = db.Column(db.Integer, default=0, nullable=False)
+
+        def __repr__(self):
+            return f'<UserDailyStats user_id={self.user_id} day={self.day}>'
+
+    class SiteStatsSnapshot(db.Model):
+        """Stored site-wide statistics snapshot refreshed by utils.site_stats"""
+        __tablename__ = 'site_stats_snapshots'
+
+        name = db.Column(db.String(50), primary_key=True)
+        data = db.Column(db.Text, nullable=False)
+        computed_at = db.Column(db.DateTime, nullable=False)
+        duration_ms = db.Column(db.Integer, default=0, nullable=False)
+
+        def __repr__(self):
+            return f'<SiteStatsSnapshot {self.name} at {self.computed_at}>'
+
+    class PasteViewDaily(db.Model):
+        """Views per paste per day, rolled up from dropped paste_views partitions"""
+        __tablename__ = 'paste_view_daily'
+
+        paste_id = db.Column(db.Integer, db.ForeignKey('pastes.id', ondelete='CASCADE'), primary_key=True)
+        day = db.Column(db.Date, primary_key=True)
+        views = db.Column(db.Integer, default=0, nullable=False)
+
+        def __repr__(self):
+            return f'<PasteViewDaily paste_id={self.paste_id} day={self.day}>'
+
+    class PasteViewPartition(db.Model):
+        """Catalog of paste_views partitions kept by utils.view_partitions"""
+        __tablename__ = 'paste_view_partitions'
+
+        name = db.Column(db.String(63), primary_key=True)
+        range_start = db.Column(db.DateTime, nullable=False)
+        range_end = db.Column(db.DateTime, nullable=True)  # open for the active SQLite table
+        row_count = db.Column(db.Integer, default=0, nullable=False)  # set when rolled up
+        rolled_up_at = db.Column(db.DateTime, nullable=True)
+
+        def __repr__(self):
+            return f'<PasteViewPartition {self.name}>'
+
+    class SummaryJob(db.Model):
+        """A queued or finished AI summary request, run by utils.summary_jobs"""
+        __tablename__ = 'summary_jobs'
+
+        id = db.Column(db.String(32), primary_key=True)
+        paste_id = db.Column(db.Integer, db.ForeignKey('pastes.id', ondelete='CASCADE'), nullable=False)
+        user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+        kind = db.Column(db.String(20), nullable=False)  # generate or refresh
+        charge = db.Column(db.String(20), nullable=False)  # call, trial or none, charged on success
+        status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, done, failed
+        summary = db.Column(db.Text, nullable=True)
+        source = db.Column(db.String(20), nullable=True)  # model, cache or coalesced, see utils.summary_cache
+        error = db.Column(db.String(255), nullable=True)
+        created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+        finished_at = db.Column(db.DateTime, nullable=True)
+
+        __table_args__ = (
+            db.Index('ix_summary_jobs_user_id_status', 'user_id', 'status'),
+        )
+
+        def __repr__(self):
+            return f'<SummaryJob {self.id} {self.status}>'
+
+    class AISummaryCache(db.Model):
+        """Summaries shared by pastes with the same content, see utils.summary_cache"""
+        __tablename__ = 'ai_summary_cache'
+
+        content_hash = db.Column(db.String(64), primary_key=True)  # SHA-256 of the normalised content
+        language = db.Column(db.String(50), primary_key=True, default='')
+        model = db.Column(db.String(50), primary_key=True)
+        prompt_version = db.Column(db.Integer, primary_key=True)
+        summary = db.Column(db.Text, nullable=True)  # NULL while the first summary is generated
+        claimed_at = db.Column(db.DateTime, nullable=True)  # set while a request is generating
+        created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+        expires_at = db.Column(db.DateTime, nullable=True)
+
+        def __repr__(self):
+            return f'<AISummaryCache {self.content_hash[:12]} {self.model} v{self.prompt_version}>'
+
+    class PasteCipherSegment(db.Model):
+        """Ciphertext of a stream-encrypted paste, see utils.stream_encryption"""
+        __tablename__ = 'paste_cipher_segments'
+
+        paste_id = db.Column(db.Integer, db.ForeignKey('pastes.id', ondelete='CASCADE'), primary_key=True)
+        seq = db.Column(db.Integer, primary_key=True)  # 0 is the header, then one row per segment
+        data = db.Column(db.LargeBinary, nullable=False)
+
+        def __repr__(self):
+            return f'<PasteCipherSegment {self.paste_id}:{self.seq}>'
+
     # Define other models here...
     # Copy from your original models.py
 
@@ -3,16 +3,27 @@
 Script to prune expired pastes from the database.
 This should be run as a scheduled task (e.g., cron job) every 10 minutes.
 
+Pastes are deleted in chunks of --batch-size, each committed on its own with
+its view records, comments and other dependent rows, and with the authors'
+paste and view totals and collection counts corrected in the same
+transaction. Several nodes may run it at the same time on PostgreSQL.
+Afterwards it deletes expired AI summary cache entries, those made with an
+older model or prompt version, summary jobs finished over 30 days ago and
+expired server-side sessions.
+
 Example cron entry:
 */10 * * * * /path/to/python /path/to/prune_expired.py
 """
 
 import os
 import sys
+import time
 import logging
 from datetime import datetime
 import argparse
 
+from sqlalchemy import inspect, text
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -27,77 +38,99 @@ logger = logging.getLogger('paste_pruner')
 # Add the current directory to the path so we can import our app modules
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-# Import our Flask app and models
+# Import our Flask app
 from app import app, db
-from models import Paste, PasteView
+from utils import SUMMARY_MODEL, SUMMARY_PROMPT_VERSION
+from utils.paste_pruning import PastePruner, count_expired
+from utils.session_store import purge_expired_sessions
+from utils.summary_cache import purge_summary_cache
+from utils.summary_jobs import prune_finished_jobs
+
+# Expired pastes listed individually by --dry-run
+DRY_RUN_SAMPLE = 20
+
 
-def prune_expired_pastes(dry_run=False):
+def prune_expired_pastes(dry_run=False, batch_size=500, lock_timeout=5, statement_timeout=60, pause=0):
     """
     Remove all expired pastes from the database.
-    
+
     Args:
         dry_run (bool): If True, only log what would be deleted without actually removing anything
-    
+        batch_size (int): Pastes deleted per transaction
+        lock_timeout (float): Seconds a chunk may wait for locks
+        statement_timeout (float): Seconds a single statement may run
+        pause (float): Seconds to sleep between chunks
+
     Returns:
         int: Number of pastes pruned
     """
     now = datetime.utcnow()
     logger.info(f"Starting prune operation at {now} (UTC)")
 
-    # Find all expired pastes
-    expired_pastes = Paste.query.filter(
-        (Paste.expires_at.isnot(None)) & (Paste.expires_at < now)
-    ).all()
-    
-    count = len(expired_pastes)
-    logger.info(f"Found {count} expired pastes to prune")
-
-    if count == 0:
-        return 0
-    
-    if dry_run:
-        logger.info("DRY RUN: The following pastes would be pruned:")
-        for paste in expired_pastes:
-            logger.info(f"  ID: {paste.id}, Title: {paste.title}, Short ID: {paste.short_id}, Expired at: {paste.expires_at}")
-        return count
-
-    # Delete the expired pastes
-    for paste in expired_pastes:
-        logger.info(f"Pruning paste ID {paste.id}, Title: {paste.title}, Short ID: {paste.short_id}, Expired at: {paste.expires_at}")
-        
-        # First delete associated views to avoid foreign key constraint issues
-        paste_views = PasteView.query.filter_by(paste_id=paste.id).all()
-        logger.info(f"  Deleting {len(paste_views)} view records")
-        for view in paste_views:
-            db.session.delete(view)
-        
-        # Update user stats if this paste has an author
-        if paste.user_id:
-            # Update the author's total_pastes count if it's greater than 0
-            if paste.author.total_pastes > 0:
-                paste.author.total_pastes -= 1
-                # Also subtract the view count from the user's total
-                if paste.views > 0 and paste.author.total_views >= paste.views:
-                    paste.author.total_views -= paste.views
-        
-        # Delete the paste
-        db.session.delete(paste)
-    
-    # Commit the changes
-    db.session.commit()
-    logger.info(f"Successfully pruned {count} expired pastes")
-    
-    return count
+    with db.engine.connect() as conn:
+        count = count_expired(conn, now)
+        logger.info(f"Found {count} expired pastes to prune")
+        if count == 0:
+            return 0
+
+        if dry_run:
+            logger.info("DRY RUN: The following pastes would be pruned:")
+            rows = conn.execute(text("""
+                SELECT id, title, short_id, expires_at FROM pastes
+                WHERE expires_at IS NOT NULL AND expires_at < :now
+                ORDER BY expires_at LIMIT :limit
+            """), {'now': now, 'limit': DRY_RUN_SAMPLE})
+            for row in rows:
+                logger.info(f"  ID: {row.id}, Title: {row.title}, Short ID: {row.short_id}, Expired at: {row.expires_at}")
+            if count > DRY_RUN_SAMPLE:
+                logger.info(f"  ... and {count - DRY_RUN_SAMPLE} more")
+            return count
+
+    started = time.perf_counter()
+
+    def progress(deleted, chunk_seconds):
+        elapsed = time.perf_counter() - started
+        rate = deleted / elapsed if elapsed else 0
+        remaining = max(count - deleted, 0)
+        eta = f", about {remaining / rate:.0f}s left" if rate and remaining else ""
+        logger.info(f"Pruned {deleted}/{count} pastes ({chunk_seconds * 1000:.0f}ms for the last chunk, "
+                    f"{rate:.0f}/s{eta})")
+
+    pruner = PastePruner(db.engine, batch_size=batch_size, lock_timeout=lock_timeout,
+                         statement_timeout=statement_timeout)
+    pruned = pruner.run(now=now, pause=pause, progress=progress)
+    logger.info(f"Successfully pruned {pruned} expired pastes in {time.perf_counter() - started:.1f}s")
+
+    return pruned
 
 def main():
     """Main entry point for the script."""
     parser = argparse.ArgumentParser(description='Prune expired pastes from the database')
     parser.add_argument('--dry-run', action='store_true', help='Only log what would be deleted without removing anything')
+    parser.add_argument('--batch-size', type=int, default=500, help='Pastes deleted per transaction')
+    parser.add_argument('--lock-timeout', type=float, default=5,
+                        help='Seconds a chunk may wait for locks before it is retried')
+    parser.add_argument('--statement-timeout', type=float, default=60,
+                        help='Seconds a single statement may run (PostgreSQL)')
+    parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between chunks')
     args = parser.parse_args()
-    
+
     with app.app_context():
-        pruned = prune_expired_pastes(dry_run=args.dry_run)
+        try:
+            pruned = prune_expired_pastes(dry_run=args.dry_run, batch_size=args.batch_size,
+                                          lock_timeout=args.lock_timeout,
+                                          statement_timeout=args.statement_timeout, pause=args.pause)
+        except Exception as e:
+            logger.error(f"Prune operation failed: {e}")
+            sys.exit(1)
         logger.info(f"Prune operation completed. {pruned} pastes {'would be' if args.dry_run else 'were'} pruned.")
 
+        if not args.dry_run and inspect(db.engine).has_table('ai_summary_cache'):
+            purged = purge_summary_cache(db.engine, SUMMARY_MODEL, SUMMARY_PROMPT_VERSION)
+            logger.info(f"Purged {purged} stale AI summary cache entries")
+            logger.info(f"Deleted {prune_finished_jobs(db.engine)} finished summary jobs")
+        if not args.dry_run:
+            logger.info(f"Deleted {purge_expired_sessions(app)} expired sessions")
+
 if __name__ == '__main__':
     main()
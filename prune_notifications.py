@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Script to apply the notification retention policy.
+
+Deletes read notifications older than NOTIFICATION_RETENTION_DAYS (90 by
+default), or moves them to notifications_archive with --archive, in batches
+that each commit on their own. Unread notifications are kept however old they
+are. Safe to run from several nodes at once on PostgreSQL.
+
+Example cron entry:
+15 4 * * * /path/to/python /path/to/prune_notifications.py --archive
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger('notification_pruner')
+
+# Add the current directory to the path so we can import our app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from utils.notification_retention import RETENTION_DAYS, prune_read_notifications
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Delete or archive old read notifications')
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS,
+                        help='Keep read notifications younger than this many days')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per batch')
+    parser.add_argument('--archive', action='store_true',
+                        help='Move rows to notifications_archive instead of deleting them outright')
+    parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+    parser.add_argument('--dry-run', action='store_true', help='Only count what would be removed')
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        logger.info(f"{'Archiving' if args.archive else 'Deleting'} read notifications "
+                    f"older than {args.days} days{' (dry run)' if args.dry_run else ''}")
+        try:
+            removed = prune_read_notifications(
+                db.engine, days=args.days, batch_size=args.batch_size, archive=args.archive,
+                dry_run=args.dry_run, pause=args.pause,
+                progress=lambda total: logger.info(f"  {total} notifications removed so far"),
+            )
+        except Exception as e:
+            logger.error(f"Notification pruning failed: {e}")
+            sys.exit(1)
+        logger.info(f"{removed} notifications {'would be' if args.dry_run else 'were'} removed "
+                    f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Script to run the cross-node rate limit aggregator.
+
+Each app node whose RATELIMIT_STORAGE_URI has ``?aggregator=host:port``
+reports its live counters here once a second and gets back the other nodes'
+counts for the same keys, so a limit holds across the whole deployment to
+within one sync interval. Run a single instance; nodes keep enforcing their
+own counts if it is unreachable.
+
+Example:
+python rate_limit_aggregator.py --host 0.0.0.0 --port 7010
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import argparse
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger('rate_limit_aggregator')
+
+# Add the current directory to the path so we can import our app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.rate_limit_storage import RateLimitAggregator
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Exchange rate limit counters between app nodes')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=7010, help='Port to listen on')
+    parser.add_argument('--node-ttl', type=float, default=30,
+                        help='Seconds after which a silent node is forgotten')
+    args = parser.parse_args()
+
+    logger.info(f"Listening for rate limit syncs on {args.host}:{args.port}")
+    try:
+        asyncio.run(RateLimitAggregator(node_ttl=args.node_ttl).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info("Aggregator stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Script to rebuild the in-process search index used by SEARCH_BACKEND=engine.
+
+The id range of the pastes table is split into chunks that worker processes
+tokenise and write as index segments in parallel, one database connection
+per worker. The new segments are installed in a single manifest swap, so the
+site keeps serving the old index until the rebuild finishes, and edits made
+while it runs are kept.
+
+Examples:
+python rebuild_search_index.py                 # one worker per CPU core
+python rebuild_search_index.py --workers 4 --chunk-size 20000
+python rebuild_search_index.py --merge         # also merge into one segment
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+from multiprocessing import Pool, cpu_count
+
+from sqlalchemy import create_engine, text
+
+# Add the current directory to the path so we can import the app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.search_backends import PUBLIC_FILTER, get_search_index
+from utils.search_engine import make_document, write_segment
+
+_worker_engine = None
+
+
+def _init_worker(database_url):
+    global _worker_engine
+    _worker_engine = create_engine(database_url)
+
+
+def index_chunk(task):
+    """Index pastes with ids in [low, high) into one segment"""
+    directory, low, high, now = task
+    with _worker_engine.connect() as conn:
+        rows = conn.execute(text(f"""
+            SELECT p.id, p.title, p.content, p.expires_at
+            FROM pastes p
+            WHERE p.id >= :low AND p.id < :high
+              AND p.is_encrypted IS NOT TRUE AND {PUBLIC_FILTER}
+        """), {'low': low, 'high': high, 'visibility': 'public', 'now': now}).fetchall()
+    if not rows:
+        return None
+    documents = [make_document(*row) for row in rows]
+    return write_segment(directory, documents), len(documents)
+
+
+def rebuild_search_index(database_url, workers=None, chunk_size=50000, merge=False):
+    """Rebuild the index from the pastes table using a pool of worker processes"""
+    index = get_search_index()
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        low, high = conn.execute(text("SELECT MIN(id), MAX(id) FROM pastes")).one()
+    engine.dispose()
+
+    generation = index.reserve_generation()
+    segments = []
+    if low is not None:
+        now = datetime.utcnow()
+        tasks = [
+            (index.directory, start, start + chunk_size, now)
+            for start in range(low, high + 1, chunk_size)
+        ]
+        workers = workers or cpu_count()
+        print(f"Indexing ids {low}-{high} in {len(tasks)} chunks with {workers} workers")
+        with Pool(workers, initializer=_init_worker, initargs=(database_url,)) as pool:
+            for done, result in enumerate(pool.imap_unordered(index_chunk, tasks), 1):
+                if result:
+                    segments.append(result)
+                print(f"  {done}/{len(tasks)} chunks", end='\r')
+        print()
+
+    index.replace_segments(generation, segments)
+    documents = sum(count for _, count in segments)
+    print(f"Installed {len(segments)} segments with {documents} documents")
+
+    if merge:
+        index.merge(force=True)
+        print("Merged all segments")
+    return True
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Rebuild the in-process search index')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='Paste ids per segment')
+    parser.add_argument('--merge', action='store_true', help='Merge into a single segment afterwards')
+    args = parser.parse_args()
+
+    from app import app, db
+
+    with app.app_context():
+        database_url = db.engine.url.render_as_string(hide_password=False)
+
+    print(f"Rebuilding search index in {get_search_index().directory}")
+    started = time.perf_counter()
+    rebuild_search_index(database_url, workers=args.workers,
+                         chunk_size=args.chunk_size, merge=args.merge)
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Script to reconcile the per-user daily rollups with the raw tables.
+
+The rollups are maintained incrementally on every write, but bulk deletes
+(pruning, paste deletion) bypass that path. This recomputes recent days from
+pastes, paste_views and comments. Run it nightly; --all rebuilds everything.
+Collection paste counts are checked on the same run.
+
+Example cron entry:
+30 3 * * * /path/to/python /path/to/reconcile_user_stats.py --days 3
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+from datetime import datetime, timedelta
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger('user_stats_reconciler')
+
+# Add the current directory to the path so we can import our app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from utils.user_stats import reconcile_user_stats
+from utils.collection_counts import reconcile_collection_counts
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description='Recompute per-user daily rollups')
+    parser.add_argument('--days', type=int, default=3, help='Number of recent days to recompute')
+    parser.add_argument('--all', action='store_true', help='Recompute every day')
+    parser.add_argument('--user-id', type=int, default=None, help='Only recompute this user')
+    args = parser.parse_args()
+
+    since = None if args.all else (datetime.utcnow() - timedelta(days=args.days - 1)).date()
+
+    with app.app_context():
+        started = time.perf_counter()
+        logger.info(f"Reconciling user rollups since {since or 'the beginning'}"
+                    + (f" for user {args.user_id}" if args.user_id else ""))
+        try:
+            with db.engine.begin() as conn:
+                rows = reconcile_user_stats(conn, since=since, user_id=args.user_id)
+                fixed = reconcile_collection_counts(conn, user_id=args.user_id)
+        except Exception as e:
+            logger.error(f"Reconciliation failed: {e}")
+            sys.exit(1)
+        logger.info(f"Wrote {rows} rollup rows and corrected {fixed} collection counts "
+                    f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
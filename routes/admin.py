@@ -8,6 +8,7 @@ from models import (
     FlaggedPaste, FlaggedComment
 )
 from functools import wraps
+from utils.site_stats import get_site_stats
 
 # Create a blueprint for admin routes
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -27,10 +28,9 @@ def admin_required(f):
 @login_required
 @admin_required
 def dashboard():
-    # Get stats for the admin dashboard
-    total_users = User.query.count()
-    total_pastes = Paste.query.count()
-    total_comments = Comment.query.count()
+    # Totals are catalog estimates on PostgreSQL and distributions come from
+    # the scheduled snapshot, so the dashboard never scans the big tables
+    stats = get_site_stats(db.session.connection())
     
     # Get flagged content stats
     pending_flagged_pastes = FlaggedPaste.get_pending_count()
@@ -46,9 +46,10 @@ def dashboard():
     
     return render_template(
         'admin/dashboard.html',
-        total_users=total_users,
-        total_pastes=total_pastes,
-        total_comments=total_comments,
+        stats=stats,
+        total_users=stats['totals']['users'],
+        total_pastes=stats['totals']['pastes'],
+        total_comments=stats['totals']['comments'],
         pending_flagged_pastes=pending_flagged_pastes,
         pending_flagged_comments=pending_flagged_comments,
         recent_pastes=recent_pastes,
@@ -5,6 +5,8 @@ from datetime import datetime
 from app import db
 from models import Paste, PasteCollection
 from forms import CollectionForm
+from utils.collection_counts import PASTE_COUNT, detach_collection_pastes, remove_paste_from_collection
+from utils.stream_encryption import URL_KEY_METHODS
 
 collection_bp = Blueprint('collection', __name__, url_prefix='/collections')
 
@@ -12,14 +14,18 @@ collection_bp = Blueprint('collection', __name__, url_prefix='/collections')
 @login_required
 def list_collections():
     """List all collections for the current user"""
-    collections = PasteCollection.query.filter_by(user_id=current_user.id).order_by(
+    # Paste counts are maintained on the collection row, so one query covers
+    # the whole listing
+    rows = db.session.query(PasteCollection, PASTE_COUNT).filter(
+        PasteCollection.user_id == current_user.id
+    ).order_by(
         PasteCollection.name
     ).all()
     
-    # Get the count of pastes in each collection for display
+    collections = []
     collection_stats = {}
-    for collection in collections:
-        paste_count = Paste.query.filter_by(collection_id=collection.id).count()
+    for collection, paste_count in rows:
+        collections.append(collection)
         collection_stats[collection.id] = {
             'paste_count': paste_count
         }
@@ -71,7 +77,7 @@ def view(collection_id):
     encryption_keys = {}
     if collection.user_id == current_user.id:
         for paste in pastes.items:
-            if paste.is_encrypted and paste.encryption_method == 'fernet-random' and paste.encryption_salt:
+            if paste.is_encrypted and paste.encryption_method in URL_KEY_METHODS and paste.encryption_salt:
                 encryption_keys[paste.short_id] = paste.encryption_salt
     
     return render_template('collection/view.html', 
@@ -120,9 +126,7 @@ def delete(collection_id):
         abort(403)  # Forbidden
     
     # Remove collection_id from pastes (rather than deleting them)
-    pastes = Paste.query.filter_by(collection_id=collection.id).all()
-    for paste in pastes:
-        paste.collection_id = None
+    detach_collection_pastes(db.session.connection(), collection.id)
     
     # Delete the collection
     db.session.delete(collection)
@@ -136,15 +140,13 @@ def delete(collection_id):
 def remove_paste(collection_id, paste_id):
     """Remove a paste from a collection"""
     collection = PasteCollection.query.get_or_404(collection_id)
-    paste = Paste.query.get_or_404(paste_id)
     
     # Check permissions - only the owner can remove pastes
     if collection.user_id != current_user.id:
         abort(403)  # Forbidden
     
     # Remove collection association
-    if paste.collection_id == collection.id:
-        paste.collection_id = None
+    if remove_paste_from_collection(db.session.connection(), collection.id, paste_id):
         db.session.commit()
         flash('Paste removed from collection.', 'success')
     else:
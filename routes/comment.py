@@ -2,9 +2,10 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import current_user, login_required
 from datetime import datetime
 from app import db, limiter
-from models import Comment, Paste, User, Notification, FlaggedComment
+from models import Comment, Paste, User, FlaggedComment
 from forms import CommentForm, CommentEditForm, FlagContentForm
 from utils import sanitize_html, check_shadowban
+from utils.notification_writer import queue_notification
 
 comment_bp = Blueprint('comment', __name__)
 
@@ -45,7 +46,7 @@ def add_comment(short_id):
         if paste.user_id and paste.user_id != current_user.id:
             paste_title = paste.title if paste.title else "Untitled"
             notification_message = f"commented on your paste: '{paste_title}'"
-            Notification.create_notification(
+            queue_notification(
                 user_id=paste.user_id,
                 type='comment',
                 message=notification_message,
@@ -59,7 +60,7 @@ def add_comment(short_id):
             parent_comment = Comment.query.get(form.parent_id.data)
             if parent_comment and parent_comment.user_id != current_user.id:
                 notification_message = f"replied to your comment on '{paste.title}'"
-                Notification.create_notification(
+                queue_notification(
                     user_id=parent_comment.user_id,
                     type='comment',
                     message=notification_message,
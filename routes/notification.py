@@ -1,27 +1,42 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, jsonify, request
+import os
+
+from flask import Blueprint, render_template, redirect, url_for, flash, jsonify, request, Response
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 
-from app import db
+from app import db, limiter
 from models import Notification
+from utils.notification_events import get_broker, event_stream, publish_unread_count
+from utils.notification_counts import get_unread_count
+from utils.pagination import keyset_page
 
 # Create a blueprint for notification routes
 notification_bp = Blueprint('notification', __name__)
 
+# Notifications per inbox page
+INBOX_PAGE_SIZE = 20
+
 
 @notification_bp.route('/notifications')
 @login_required
 def list_notifications():
     """View all notifications for the current user"""
-    # Get notifications for the current user, ordered by creation time (newest first)
-    notifications = current_user.notifications.order_by(Notification.created_at.desc()).all()
+    # One page at a time, newest first, continuing from the ?before= cursor
+    notifications, next_cursor = keyset_page(
+        Notification.query.filter_by(user_id=current_user.id).options(joinedload(Notification.sender)),
+        Notification.created_at, Notification.id,
+        request.args.get('before'), INBOX_PAGE_SIZE
+    )
     
     # Get unread notification count
-    unread_count = Notification.get_unread_count(current_user.id)
+    unread_count = get_unread_count(current_user.id)
     
     return render_template(
         'notification/list.html',
         notifications=notifications,
-        unread_count=unread_count
+        unread_count=unread_count,
+        next_cursor=next_cursor,
+        is_first_page=not request.args.get('before')
     )
 
 
@@ -29,20 +44,23 @@ def list_notifications():
 @login_required
 def unread_notifications():
     """View unread notifications for the current user"""
-    # Get unread notifications for the current user, ordered by creation time (newest first)
-    notifications = (current_user.notifications
-                     .filter_by(read=False)
-                     .order_by(Notification.created_at.desc())
-                     .all())
+    # Get unread notifications for the current user, newest first, one page at a time
+    notifications, next_cursor = keyset_page(
+        Notification.query.filter_by(user_id=current_user.id, read=False).options(joinedload(Notification.sender)),
+        Notification.created_at, Notification.id,
+        request.args.get('before'), INBOX_PAGE_SIZE
+    )
     
     # Get unread notification count
-    unread_count = len(notifications)
+    unread_count = get_unread_count(current_user.id)
     
     return render_template(
         'notification/list.html',
         notifications=notifications,
         unread_count=unread_count,
-        unread_only=True
+        unread_only=True,
+        next_cursor=next_cursor,
+        is_first_page=not request.args.get('before')
     )
 
 
@@ -59,6 +77,7 @@ def mark_as_read(notification_id):
     
     # Mark the notification as read
     Notification.mark_as_read(notification_id)
+    publish_unread_count(db.session.connection(), current_user.id)
     
     # Check if there's a redirect URL in the request
     redirect_url = request.args.get('redirect')
@@ -81,7 +100,12 @@ def mark_as_read(notification_id):
 @login_required
 def mark_all_as_read():
     """Mark all notifications as read for the current user"""
-    Notification.mark_all_as_read(current_user.id)
+    # A single UPDATE however many notifications are unread
+    Notification.query.filter_by(user_id=current_user.id, read=False).update(
+        {'read': True}, synchronize_session=False
+    )
+    db.session.commit()
+    publish_unread_count(db.session.connection(), current_user.id)
     flash('All notifications marked as read.', 'success')
     return redirect(url_for('notification.list_notifications'))
 
@@ -109,5 +133,28 @@ def delete_notification(notification_id):
 @login_required
 def notification_count():
     """Get the number of unread notifications for the current user (JSON response)"""
-    count = Notification.get_unread_count(current_user.id)
-    return jsonify({'count': count})
\ No newline at end of file
+    # Served from the unread count cache; only a cache miss reaches the database
+    count = get_unread_count(current_user.id)
+    return jsonify({'count': count})
+
+
+@notification_bp.route('/notifications/stream')
+@limiter.exempt
+@login_required
+def notification_stream():
+    """Server-sent event stream of unread count changes and new notifications"""
+    if os.environ.get('NOTIFICATION_STREAM', 'off') != 'on':
+        # 204 tells EventSource not to reconnect; the client falls back to polling
+        return Response(status=204)
+    
+    # Subscribe before reading the count so no change can slip in between.
+    # The generator runs after the request context is gone, so it must not
+    # touch the database or current_user.
+    subscription = get_broker().subscribe(current_user.id)
+    count = get_unread_count(current_user.id)
+    
+    response = Response(event_stream(subscription, count), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    response.call_on_close(subscription.close)
+    return response
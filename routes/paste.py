@@ -1,11 +1,18 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, Response, session, after_this_request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, Response, session, after_this_request, jsonify, make_response
 from flask_login import current_user, login_required
 from sqlalchemy import or_, and_
 from datetime import datetime
 from app import db, limiter
-from models import Paste, User, PasteView, Comment, PasteRevision, Notification, PasteCollection, FlaggedPaste, FlaggedComment
+from models import Paste, User, PasteView, Comment, PasteRevision, PasteCollection, FlaggedPaste, FlaggedComment, SummaryJob
 from forms import PasteForm, CommentForm, FlagContentForm
-from utils import generate_short_id, highlight_code, sanitize_html, check_shadowban, generate_ai_summary
+from utils import generate_short_id, get_viewer_id, highlight_code, sanitize_html, check_shadowban
+from utils.client_encryption import cache_ciphertext, is_client_encrypted, is_envelope, CLIENT_METHOD
+from utils.derived_keys import get_session_content, session_key, unlock
+from utils.notification_writer import queue_notification
+from utils.stream_encryption import (PASSWORD_METHODS, URL_KEY_METHODS, copy_ciphertext, encrypt_paste,
+                                     is_stream_encrypted, open_text_stream, store_ciphertext)
+from utils.summary_cache import get_summary_cache
+from utils.summary_jobs import JOBS_PER_USER, active_jobs, finish, get_job, get_summary_pool, new_job_id
 
 paste_bp = Blueprint('paste', __name__)
 
@@ -64,12 +71,18 @@ def create():
                 # Increment template usage count
                 template.increment_usage()
         
+        # Content encrypted in the browser arrives as an opaque envelope
+        client_encrypted = hasattr(form, 'client_encryption') and form.client_encryption.data
+        if client_encrypted and not is_envelope(content):
+            flash('The encrypted content was malformed. Please try again.', 'danger')
+            return redirect(url_for('paste.index'))
+        
         # Test if we're reaching this code block
         import logging
         logging.debug(f"Syntax before detection check: {syntax}")
         
         # If syntax is set to 'text' (the default), try to auto-detect the language
-        if syntax == 'text' and content.strip():
+        if syntax == 'text' and content.strip() and not client_encrypted:
             from utils import detect_language
             from flask import current_app
             
@@ -125,7 +138,13 @@ def create():
         
         # Handle encryption if enabled
         encryption_key = None
-        if hasattr(form, 'enable_encryption') and form.enable_encryption.data:
+        ciphertext = None
+        if client_encrypted:
+            # Already encrypted by the browser; the key stays in the URL fragment
+            paste.is_encrypted = True
+            paste.encryption_method = CLIENT_METHOD
+            paste.encryption_salt = None
+        elif hasattr(form, 'enable_encryption') and form.enable_encryption.data:
             encryption_type = form.encryption_type.data
             encryption_password = None
             
@@ -140,31 +159,31 @@ def create():
             else:
                 logging.debug("Using random key encryption")
                     
-            # Store the encryption type on the paste
-            paste.encryption_method = encryption_type
-                    
-            # Encrypt the paste content
-            if paste.encrypt(encryption_password):
-                current_app.logger.info(f"Paste encrypted successfully with method: {encryption_type}")
-                # Log extra confirmation
-                logging.debug(f"Encryption successful. Is encrypted: {paste.is_encrypted}, Method: {paste.encryption_method}")
+            # Encrypt the paste content segment by segment (see utils.stream_encryption)
+            from utils import HAS_CRYPTO
+            if HAS_CRYPTO:
+                ciphertext = encrypt_paste(paste, content, encryption_password)
+                current_app.logger.info(f"Paste encrypted successfully with method: {paste.encryption_method}")
                 
                 # If using random key, save the key for the redirect
-                if encryption_type == 'fernet-random':
-                    # Extract the encryption key from the salt
+                if paste.encryption_method in URL_KEY_METHODS:
+                    # The random key is kept in the salt
                     encryption_key = paste.encryption_salt
-                    logging.debug(f"Generated encryption key: {encryption_key}")
             else:
                 current_app.logger.error("Failed to encrypt paste")
                 flash('Failed to encrypt paste.', 'danger')
         
         db.session.add(paste)
+        if ciphertext is not None:
+            # The segments reference the paste, so it needs its id first
+            db.session.flush()
+            store_ciphertext(db.session, paste.id, ciphertext)
         db.session.commit()
         
         flash('Paste created successfully!', 'success')
         
         # Redirect to the appropriate URL based on encryption type
-        if paste.is_encrypted and paste.encryption_method == 'fernet-random':
+        if paste.is_encrypted and paste.encryption_method in URL_KEY_METHODS:
             # For random key encryption, include the key in the URL
             from urllib.parse import quote_plus
             
@@ -219,9 +238,8 @@ def view(short_id):
     if current_user.is_authenticated:
         is_paste_owner = current_user.id == paste.user_id
     
-    # Get or create a unique viewer ID for tracking view counts
-    viewer_ip = request.remote_addr
-    viewer_id = PasteView.get_or_create_viewer_id(session, viewer_ip)
+    # Identify the viewer for unique view counts (without starting a session)
+    viewer_id = get_viewer_id()
     
     # Update view count only for unique viewers
     is_new_view = paste.update_view_count(viewer_id)
@@ -230,7 +248,8 @@ def view(short_id):
     content = paste.content
     password_form = None
     decryption_error = None
-    is_encrypted = paste.is_encrypted
+    # Pastes encrypted in the browser are decrypted there, never here
+    is_encrypted = paste.is_encrypted and not is_client_encrypted(paste)
     
     # Added debug logging
     import logging
@@ -244,7 +263,11 @@ def view(short_id):
         # Check if this is a password submission
         if request.method == 'POST' and password_form.validate_on_submit():
             password = password_form.password.data
-            decrypted_content = paste.decrypt(password)
+            if paste.encryption_method in PASSWORD_METHODS:
+                # Derives the key once and keeps it for this session's re-views
+                decrypted_content = unlock(paste, password)
+            else:
+                decrypted_content = paste.decrypt(password)
             
             if decrypted_content:
                 # Successfully decrypted
@@ -263,8 +286,8 @@ def view(short_id):
                 
         # Check if we've already decrypted this paste in this session
         elif session.get('decrypted_pastes', {}).get(paste.short_id):
-            # Paste was already decrypted in this session, decrypt again
-            decrypted_content = paste.get_content()
+            # Paste was already decrypted in this session, decrypt again with the cached key
+            decrypted_content = get_session_content(paste)
             if decrypted_content:
                 content = decrypted_content
             else:
@@ -286,7 +309,7 @@ def view(short_id):
             logging.debug(f"Random key from URL: {key}")
             
             # For random key encryption, key is required in the URL
-            if paste.encryption_method == 'fernet-random':
+            if paste.encryption_method in URL_KEY_METHODS:
                 if not key:
                     # No key provided, show error and redirect to home
                     logging.error(f"No encryption key provided for random-key encrypted paste: {paste.short_id}")
@@ -299,7 +322,7 @@ def view(short_id):
                 logging.debug(f"Using key from URL: {key}")
                 
                 # Try to decrypt with the key from URL
-                decrypted_content = paste.get_content()
+                decrypted_content = get_session_content(paste)
                 if decrypted_content:
                     content = decrypted_content
                     # Store in session for future reference
@@ -321,7 +344,11 @@ def view(short_id):
                     session['decrypted_pastes'] = session_decrypted
             
     # Syntax highlighting (now using potentially decrypted content)
-    highlighted_code, css = highlight_code(content, paste.syntax)
+    if is_client_encrypted(paste):
+        # Highlighted in the browser after decryption
+        highlighted_code, css = None, ''
+    else:
+        highlighted_code, css = highlight_code(content, paste.syntax)
     
     # Initialize comment form if comments are enabled and user is logged in
     comment_form = None
@@ -398,9 +425,8 @@ def raw(short_id):
     if current_user.is_authenticated:
         is_paste_owner = current_user.id == paste.user_id
     
-    # Get or create a unique viewer ID for tracking view counts
-    viewer_ip = request.remote_addr
-    viewer_id = PasteView.get_or_create_viewer_id(session, viewer_ip)
+    # Identify the viewer for unique view counts (without starting a session)
+    viewer_id = get_viewer_id()
     
     # Update view count only for unique viewers
     is_new_view = paste.update_view_count(viewer_id)
@@ -412,14 +438,14 @@ def raw(short_id):
     import logging
     logging.debug(f"RAW: Handling encrypted paste: {paste.short_id}, Encrypted: {paste.is_encrypted}, Method: {paste.encryption_method}")
     
-    if paste.is_encrypted:
+    if paste.is_encrypted and not is_client_encrypted(paste):
         # If password protected and not already decrypted in this session, redirect to the standard view
         if paste.password_protected and not session.get('decrypted_pastes', {}).get(paste.short_id):
             flash('This paste is password protected. Please enter the password to view.', 'warning')
             return redirect(url_for('paste.view', short_id=paste.short_id))
         
         # For random key encryption, check if we need to get the key from URL
-        if paste.encryption_method == 'fernet-random' and not session.get('decrypted_pastes', {}).get(paste.short_id):
+        if paste.encryption_method in URL_KEY_METHODS and not session.get('decrypted_pastes', {}).get(paste.short_id):
             # Get key from URL for random key encryption
             key = request.args.get('key')
             logging.debug(f"RAW: Random key from URL: {key}")
@@ -434,7 +460,11 @@ def raw(short_id):
             logging.debug(f"RAW: Using key from URL for paste {short_id}")
         
         # Try to decrypt with the key or from session
-        decrypted_content = paste.get_content()
+        if is_stream_encrypted(paste) and not is_burn_after_read:
+            # Decrypted segment by segment while the response is sent
+            decrypted_content = open_text_stream(paste, session_key(paste))
+        else:
+            decrypted_content = get_session_content(paste)
         if decrypted_content:
             content = decrypted_content
             # Store in session for future reference if not already stored
@@ -477,7 +507,11 @@ def raw(short_id):
             return response
     
     # Return plain text
-    return Response(content, mimetype='text/plain')
+    response = Response(content, mimetype='text/plain')
+    if is_client_encrypted(paste):
+        # Only ciphertext, so caches may keep it
+        cache_ciphertext(response, paste, private=session.modified)
+    return response
 
 @paste_bp.route('/paste/<short_id>/download')
 def download(short_id):
@@ -496,9 +530,8 @@ def download(short_id):
     is_burn_after_read = paste.burn_after_read
     is_paste_owner = current_user.is_authenticated and current_user.id == paste.user_id
     
-    # Get or create a unique viewer ID for tracking view counts
-    viewer_ip = request.remote_addr
-    viewer_id = PasteView.get_or_create_viewer_id(session, viewer_ip)
+    # Identify the viewer for unique view counts (without starting a session)
+    viewer_id = get_viewer_id()
     
     # Update view count only for unique viewers
     is_new_view = paste.update_view_count(viewer_id)
@@ -510,14 +543,14 @@ def download(short_id):
     import logging
     logging.debug(f"PRINT: Handling encrypted paste: {paste.short_id}, Encrypted: {paste.is_encrypted}, Method: {paste.encryption_method}")
     
-    if paste.is_encrypted:
+    if paste.is_encrypted and not is_client_encrypted(paste):
         # If password protected and not already decrypted in this session, redirect to the standard view
         if paste.password_protected and not session.get('decrypted_pastes', {}).get(paste.short_id):
             flash('This paste is password protected. Please enter the password to view.', 'warning')
             return redirect(url_for('paste.view', short_id=paste.short_id))
         
         # For random key encryption, check if we need to get the key from URL
-        if paste.encryption_method == 'fernet-random' and not session.get('decrypted_pastes', {}).get(paste.short_id):
+        if paste.encryption_method in URL_KEY_METHODS and not session.get('decrypted_pastes', {}).get(paste.short_id):
             # Get key from URL for random key encryption
             key = request.args.get('key')
             logging.debug(f"PRINT: Random key from URL: {key}")
@@ -532,7 +565,11 @@ def download(short_id):
             logging.debug(f"PRINT: Using key from URL for paste {short_id}")
         
         # Try to decrypt with the key or from session
-        decrypted_content = paste.get_content()
+        if is_stream_encrypted(paste) and not is_burn_after_read:
+            # Decrypted segment by segment while the response is sent
+            decrypted_content = open_text_stream(paste, session_key(paste))
+        else:
+            decrypted_content = get_session_content(paste)
         if decrypted_content:
             content = decrypted_content
             # Store in session for future reference if not already stored
@@ -547,6 +584,8 @@ def download(short_id):
     
     # Create download response
     filename = f"{paste.title.replace(' ', '_')}.txt"
+    if is_client_encrypted(paste):
+        filename = f"{paste.title.replace(' ', '_')}.encrypted.txt"
     response = Response(content, mimetype='text/plain')
     response.headers['Content-Disposition'] = f'attachment; filename={filename}'
     
@@ -598,9 +637,8 @@ def embed(short_id):
     is_burn_after_read = paste.burn_after_read
     is_paste_owner = current_user.is_authenticated and current_user.id == paste.user_id
     
-    # Get or create a unique viewer ID for tracking view counts
-    viewer_ip = request.remote_addr
-    viewer_id = PasteView.get_or_create_viewer_id(session, viewer_ip)
+    # Identify the viewer for unique view counts (without starting a session)
+    viewer_id = get_viewer_id()
     
     # Update view count only for unique viewers
     is_new_view = paste.update_view_count(viewer_id)    # Handle encrypted content
@@ -610,14 +648,14 @@ def embed(short_id):
     import logging
     logging.debug(f"EMBED: Handling encrypted paste: {paste.short_id}, Encrypted: {paste.is_encrypted}, Method: {paste.encryption_method}")
     
-    if paste.is_encrypted:
+    if paste.is_encrypted and not is_client_encrypted(paste):
         # If password protected and not already decrypted in this session, redirect to the standard view
         if paste.password_protected and not session.get('decrypted_pastes', {}).get(paste.short_id):
             flash('This paste is password protected. Please enter the password to view.', 'warning')
             return redirect(url_for('paste.view', short_id=paste.short_id))
         
         # For random key encryption, check if we need to get the key from URL
-        if paste.encryption_method == 'fernet-random' and not session.get('decrypted_pastes', {}).get(paste.short_id):
+        if paste.encryption_method in URL_KEY_METHODS and not session.get('decrypted_pastes', {}).get(paste.short_id):
             # Get key from URL for random key encryption
             key = request.args.get('key')
             logging.debug(f"EMBED: Random key from URL: {key}")
@@ -632,7 +670,7 @@ def embed(short_id):
             logging.debug(f"EMBED: Using key from URL for paste {short_id}")
         
         # Try to decrypt with the key or from session
-        decrypted_content = paste.get_content()
+        decrypted_content = get_session_content(paste)
         if decrypted_content:
             content = decrypted_content
             # Store in session for future reference if not already stored
@@ -645,8 +683,11 @@ def embed(short_id):
             flash('Failed to decrypt paste. The encryption key may be invalid.', 'danger')
             return redirect(url_for('paste.view', short_id=paste.short_id))
     
-    # Syntax highlighting for embedding
-    highlighted_code, css = highlight_code(content, paste.syntax)
+    # Syntax highlighting for embedding (in the browser for client-encrypted pastes)
+    if is_client_encrypted(paste):
+        highlighted_code, css = None, ''
+    else:
+        highlighted_code, css = highlight_code(content, paste.syntax)
     
     # If this is a burn after read paste and this is a new view (not the owner viewing it),
     # mark it for deletion after the response is sent
@@ -686,9 +727,12 @@ def embed(short_id):
                     logging.error(f"EMBED: Error deleting burn after read paste: {e}")
                 return response
     
-    return render_template('paste/embed.html', paste=paste, 
+    response = make_response(render_template('paste/embed.html', paste=paste, 
                           highlighted_code=highlighted_code, css=css,
-                          burn_notice=burn_notice)
+                          burn_notice=burn_notice))
+    if is_client_encrypted(paste):
+        cache_ciphertext(response, paste, private=session.modified)
+    return response
 
 @paste_bp.route('/paste/<short_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -705,6 +749,16 @@ def edit(short_id):
         flash('This paste has expired and cannot be edited.', 'warning')
         return redirect(url_for('paste.index'))
     
+    # The server cannot read content encrypted in the browser
+    if is_client_encrypted(paste):
+        flash('Pastes encrypted in the browser cannot be edited. Fork the paste to make a changed copy.', 'warning')
+        return redirect(url_for('paste.view', short_id=paste.short_id))
+    
+    # Editing would replace the content but leave the stored ciphertext behind
+    if is_stream_encrypted(paste):
+        flash('Encrypted pastes cannot be edited. Fork the paste to make a changed copy.', 'warning')
+        return redirect(url_for('paste.view', short_id=paste.short_id))
+    
     # Pass current_user to populate collection choices
     form = PasteForm(current_user=current_user)
     
@@ -847,6 +901,10 @@ def print_view(short_id):
     if paste.visibility == 'private' and (not current_user.is_authenticated or current_user.id != paste.user_id):
         abort(403)
     
+    # Client-encrypted pastes are printed from the view page, which can decrypt them
+    if is_client_encrypted(paste):
+        return redirect(url_for('paste.view', short_id=paste.short_id))
+    
     # Handle encrypted content
     content = paste.content
     
@@ -854,14 +912,14 @@ def print_view(short_id):
     import logging
     logging.debug(f"PRINT: Handling encrypted paste: {paste.short_id}, Encrypted: {paste.is_encrypted}, Method: {paste.encryption_method}")
     
-    if paste.is_encrypted:
+    if paste.is_encrypted and not is_client_encrypted(paste):
         # If password protected and not already decrypted in this session, redirect to the standard view
         if paste.password_protected and not session.get('decrypted_pastes', {}).get(paste.short_id):
             flash('This paste is password protected. Please enter the password to view.', 'warning')
             return redirect(url_for('paste.view', short_id=paste.short_id))
         
         # For random key encryption, check if we need to get the key from URL
-        if paste.encryption_method == 'fernet-random' and not session.get('decrypted_pastes', {}).get(paste.short_id):
+        if paste.encryption_method in URL_KEY_METHODS and not session.get('decrypted_pastes', {}).get(paste.short_id):
             # Get key from URL for random key encryption
             key = request.args.get('key')
             logging.debug(f"PRINT: Random key from URL: {key}")
@@ -876,7 +934,7 @@ def print_view(short_id):
             logging.debug(f"PRINT: Using key from URL for paste {short_id}")
         
         # Try to decrypt with the key or from session
-        decrypted_content = paste.get_content()
+        decrypted_content = get_session_content(paste)
         if decrypted_content:
             content = decrypted_content
             # Store in session for future reference if not already stored
@@ -970,6 +1028,20 @@ def get_template(template_id):
         'syntax': template.syntax
     }
     
+@paste_bp.route('/paste/api/csrf-token')
+@limiter.limit("60 per minute")
+def csrf_token():
+    """
+    A CSRF token for a form rendered without one.
+
+    Pages shown to anonymous readers carry no token, so reading a paste does
+    not start a session; main.js fetches one when such a form is submitted.
+    """
+    from flask_wtf.csrf import generate_csrf
+    response = jsonify({'csrf_token': generate_csrf()})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @paste_bp.route('/api/highlight', methods=['POST'])
 def highlight_preview():
     """API endpoint for syntax highlighting preview"""
@@ -1041,6 +1113,10 @@ def fork(short_id):
     # Create the fork
     user_id = current_user.id if current_user.is_authenticated else None
     fork = original_paste.fork(user_id=user_id, visibility=visibility)
+    if is_stream_encrypted(original_paste):
+        # The fork keeps the original's key, so it shares its ciphertext
+        copy_ciphertext(db.session, original_paste.id, fork.id)
+        db.session.commit()
     
     # Create a notification for the original paste owner if they're a registered user
     if original_paste.user_id and user_id and original_paste.user_id != user_id:
@@ -1049,7 +1125,7 @@ def fork(short_id):
         username = user.username if user else "Anonymous"
         notification_message = f"forked your paste: '{paste_title}'"
         
-        Notification.create_notification(
+        queue_notification(
             user_id=original_paste.user_id,
             type='fork',
             message=notification_message,
@@ -1106,12 +1182,58 @@ def flag_paste(short_id):
 
 # AI Summary Feature API Routes
 
+def queue_summary_job(paste, kind, charge, quota, quota_error, **extra):
+    """
+    Record a summary job and hand it to this worker's pool.
+
+    The quota is charged by the job when it succeeds; here it only has to
+    cover the user's jobs already in flight. A job already running for the
+    same paste is returned instead of starting another.
+    """
+    pool = get_summary_pool(db.engine)
+    with db.engine.begin() as conn:
+        in_flight = active_jobs(conn, current_user.id)
+        for job_id, paste_id, status in in_flight:
+            if paste_id == paste.id:
+                return summary_job_response(job_id, status, extra)
+
+        if quota - len(in_flight) <= 0:
+            return jsonify({'error': quota_error, **extra}), 403
+        if len(in_flight) >= JOBS_PER_USER:
+            return jsonify({'error': 'Please wait for your other summaries to finish.', **extra}), 429
+        if not pool.has_capacity():
+            return jsonify({'error': 'AI summaries are busy. Please try again in a minute.', **extra}), 503
+
+        job_id = new_job_id()
+        conn.execute(SummaryJob.__table__.insert().values(
+            id=job_id, paste_id=paste.id, user_id=current_user.id, kind=kind, charge=charge,
+            status='queued', created_at=datetime.utcnow()
+        ))
+
+    if not pool.submit(job_id):
+        with db.engine.begin() as conn:
+            finish(conn, job_id, 'failed', error='AI summaries are busy. Please try again in a minute.')
+        return jsonify({'error': 'AI summaries are busy. Please try again in a minute.', **extra}), 503
+    return summary_job_response(job_id, 'queued', extra)
+
+
+def summary_job_response(job_id, status, extra):
+    return jsonify({
+        'job_id': job_id,
+        'status': status,
+        'status_url': url_for('paste.summary_job_status', job_id=job_id),
+        **extra
+    }), 202
+
+
 @paste_bp.route('/paste/api/<short_id>/generate-summary', methods=['POST'])
 @login_required
 def generate_summary(short_id):
     """
-    Generate an AI summary for a paste using OpenAI.
+    Start generating an AI summary for a paste using OpenAI.
     This is a premium feature or uses free trials for non-premium users.
+    Responds with a job to poll at status_url; the call or trial is only
+    used up once the summary has been generated.
     """
     # Find the paste
     paste = Paste.query.filter_by(short_id=short_id).first_or_404()
@@ -1120,6 +1242,17 @@ def generate_summary(short_id):
     if paste.visibility == 'private' and paste.user_id != current_user.id:
         return jsonify({'error': 'You do not have permission to access this paste'}), 403
     
+    # Handle encrypted pastes
+    if paste.is_encrypted:
+        # For encrypted pastes, we need the decrypted content
+        # This requires password or session access, which is complex in an API context
+        # For now, we'll just return an error for encrypted pastes
+        return jsonify({
+            'error': 'AI summary is not available for encrypted pastes.',
+            'is_premium': current_user.is_premium,
+            'remaining_trials': None if current_user.is_premium else current_user.get_remaining_free_trials()
+        }), 400
+    
     # Check if the user is premium or has free trials available
     if not current_user.is_premium:
         if not current_user.has_free_ai_trials_available():
@@ -1128,10 +1261,9 @@ def generate_summary(short_id):
                 'remaining_trials': 0,
                 'is_premium': False
             }), 403
-        
-        # User has trials available, use one
-        current_user.use_free_ai_trial()
-        remaining_trials = current_user.get_remaining_free_trials()
+        charge, quota = 'trial', current_user.get_remaining_free_trials()
+        quota_error = 'Please wait for your current summary to finish before using another free trial.'
+        remaining_trials = quota
     else:
         # Premium user - check if they have AI calls remaining
         if current_user.ai_calls_remaining <= 0:
@@ -1139,39 +1271,21 @@ def generate_summary(short_id):
                 'error': 'You have reached your monthly limit of AI calls.',
                 'is_premium': True
             }), 403
-        
-        # Decrement AI calls remaining counter
-        current_user.ai_calls_remaining -= 1
-        db.session.commit()
+        charge, quota = 'call', current_user.ai_calls_remaining
+        quota_error = 'You have reached your monthly limit of AI calls.'
         remaining_trials = None
     
-    # Handle encrypted pastes
-    content = paste.content
-    if paste.is_encrypted:
-        # For encrypted pastes, we need the decrypted content
-        # This requires password or session access, which is complex in an API context
-        # For now, we'll just return an error for encrypted pastes
-        return jsonify({
-            'error': 'AI summary is not available for encrypted pastes.',
-            'is_premium': current_user.is_premium,
-            'remaining_trials': remaining_trials
-        }), 400
-    
-    try:
-        # Generate the AI summary
-        summary = generate_ai_summary(content, language=paste.syntax)
-        
-        if not summary:
-            return jsonify({
-                'error': 'Failed to generate AI summary. Please try again later.',
-                'is_premium': current_user.is_premium,
-                'remaining_trials': remaining_trials
-            }), 500
-        
-        # Save the summary to the paste
+    # Content summarised before (a fork, a repost) is answered from the cache
+    # without a job and without using up the call or trial checked above
+    cache = get_summary_cache(db.engine)
+    summary = cache.lookup(cache.key(paste.content, paste.syntax))
+    if summary:
         paste.ai_summary = summary
+        db.session.add(SummaryJob(
+            id=new_job_id(), paste_id=paste.id, user_id=current_user.id, kind='generate', charge='none',
+            status='done', summary=summary, source='cache', finished_at=datetime.utcnow()
+        ))
         db.session.commit()
-        
         return jsonify({
             'success': True,
             'summary': summary,
@@ -1179,20 +1293,15 @@ def generate_summary(short_id):
             'remaining_trials': remaining_trials
         })
     
-    except Exception as e:
-        app.logger.error(f"Error generating AI summary: {str(e)}")
-        return jsonify({
-            'error': 'An error occurred while generating the summary.',
-            'is_premium': current_user.is_premium,
-            'remaining_trials': remaining_trials
-        }), 500
+    return queue_summary_job(paste, 'generate', charge, quota, quota_error,
+                             is_premium=current_user.is_premium, remaining_trials=remaining_trials)
 
 
 @paste_bp.route('/paste/api/<short_id>/refresh-summary', methods=['POST'])
 @login_required
 def refresh_summary(short_id):
     """
-    Regenerate an AI summary for a paste. Only available to premium users who own the paste.
+    Start regenerating an AI summary for a paste. Only available to premium users who own the paste.
     """
     # Find the paste
     paste = Paste.query.filter_by(short_id=short_id).first_or_404()
@@ -1215,12 +1324,7 @@ def refresh_summary(short_id):
             'is_premium': True
         }), 403
     
-    # Decrement AI calls remaining counter
-    current_user.ai_calls_remaining -= 1
-    db.session.commit()
-    
     # Handle encrypted pastes
-    content = paste.content
     if paste.is_encrypted:
         # For encrypted pastes, we need the decrypted content
         # This requires password or session access, which is complex in an API context
@@ -1230,29 +1334,31 @@ def refresh_summary(short_id):
             'is_premium': True
         }), 400
     
-    try:
-        # Generate the AI summary
-        summary = generate_ai_summary(content, language=paste.syntax)
-        
-        if not summary:
-            return jsonify({
-                'error': 'Failed to generate AI summary. Please try again later.',
-                'is_premium': True
-            }), 500
-        
-        # Save the summary to the paste
-        paste.ai_summary = summary
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'summary': summary,
-            'is_premium': True
-        })
-    
-    except Exception as e:
-        app.logger.error(f"Error refreshing AI summary: {str(e)}")
-        return jsonify({
-            'error': 'An error occurred while refreshing the summary.',
-            'is_premium': True
-        }), 500
+    return queue_summary_job(paste, 'refresh', 'call', current_user.ai_calls_remaining,
+                             'You have reached your monthly limit of AI calls.', is_premium=True)
+
+
+@paste_bp.route('/paste/api/summary-jobs/<job_id>')
+@login_required
+@limiter.limit("120 per minute")
+def summary_job_status(job_id):
+    """
+    State of one of the current user's summary jobs: queued, running, done
+    (with the summary) or failed (with an error).
+    """
+    with db.engine.begin() as conn:
+        job = get_job(conn, job_id)
+    if job is None or job['user_id'] != current_user.id:
+        abort(404)
+
+    response = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'is_premium': current_user.is_premium,
+        'remaining_trials': None if current_user.is_premium else current_user.get_remaining_free_trials()
+    }
+    if job['status'] == 'done':
+        response.update(success=True, summary=job['summary'])
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    return jsonify(response)
@@ -1,8 +1,12 @@
 from flask import Blueprint, render_template, request, flash
 from sqlalchemy import or_, and_
 from datetime import datetime
-from models import Paste, User, Tag
+from models import Paste
 from flask_login import current_user
+from app import db
+from utils.search_backends import search_pastes, get_search_backend
+from utils.search_query import SearchQuery, search_with_query
+from utils.symbol_index import SymbolSearchBackend
 
 search_bp = Blueprint('search', __name__, url_prefix='/search')
 
@@ -16,57 +20,63 @@ def search():
         return render_template('search/results.html', pastes=None, query='', 
                                search_type=search_type, total=0)
     
-    # Base query - only public and unexpired pastes
-    base_query = Paste.query.filter(
-        and_(
-            Paste.visibility == 'public',
-            or_(Paste.expires_at.is_(None), Paste.expires_at > datetime.utcnow())
-        )
-    )
+    parsed = SearchQuery.parse(query)
+    
+    # Plain content and title searches go through the configured search
+    # backend, which ranks, paginates and counts in a single round trip
+    if search_type in ('content', 'title') and not parsed.has_filters:
+        pastes = search_pastes(db.session.connection(), query, field=search_type,
+                               page=page, per_page=20)
+        return render_template('search/results.html', pastes=pastes, query=query,
+                              search_type=search_type, total=pastes.total,
+                              snippets=pastes.snippets)
+    
+    # Code fragment search matches arbitrary substrings of the title or content
+    # through the trigram index, so punctuation-heavy queries work
+    if search_type == 'fragment':
+        conn = db.session.connection()
+        pastes = search_pastes(conn, query, field='any', page=page, per_page=20,
+                               backend=get_search_backend(conn, kind='trigram'))
+        return render_template('search/results.html', pastes=pastes, query=query,
+                              search_type=search_type, total=pastes.total,
+                              snippets=pastes.snippets)
+    
+    # Symbol search looks up function, class and variable definition names
+    if search_type == 'symbol':
+        pastes = search_pastes(db.session.connection(), query, field='symbol', page=page,
+                               per_page=20, backend=SymbolSearchBackend())
+        return render_template('search/results.html', pastes=pastes, query=query,
+                              search_type=search_type, total=pastes.total,
+                              snippets=pastes.snippets)
     
-    # Add search conditions based on search type
-    if search_type == 'content':
-        pastes_query = base_query.filter(Paste.content.ilike(f'%{query}%'))
-    elif search_type == 'title':
-        pastes_query = base_query.filter(Paste.title.ilike(f'%{query}%'))
-    elif search_type == 'syntax':
-        pastes_query = base_query.filter(Paste.syntax == query)
+    # The dedicated search types are shorthands for query-language operators
+    if search_type == 'syntax':
+        parsed = SearchQuery(langs=[query.lower()])
     elif search_type == 'author':
-        # First find users matching the query
-        users = User.query.filter(User.username.ilike(f'%{query}%')).all()
-        user_ids = [user.id for user in users]
-        if not user_ids:
-            # If no users found, return empty results
-            return render_template('search/results.html', pastes=None, query=query, 
-                                  search_type=search_type, total=0)
-        pastes_query = base_query.filter(Paste.user_id.in_(user_ids))
+        parsed = SearchQuery(users=[f'*{query}*'])
     elif search_type == 'tag':
-        # Check if user is premium for tag search
-        if not current_user.is_authenticated or not current_user.is_premium:
-            flash("Tag search is a Premium feature. Please upgrade your account to use it.", "warning")
-            return render_template('search/results.html', pastes=None, query=query, 
-                                  search_type=search_type, total=0, premium_required=True)
-        
-        # Find tags matching the query
-        tag = Tag.query.filter(Tag.name.ilike(f'%{query}%')).first()
-        if not tag:
-            # If no matching tag found, return empty results
-            return render_template('search/results.html', pastes=None, query=query, 
-                                  search_type=search_type, total=0)
-        
-        # Find pastes with this tag through the many-to-many relationship
-        pastes_query = base_query.filter(Paste.tags.any(Tag.id == tag.id))
+        parsed = SearchQuery(tags=[f'*{query}*'])
+    elif search_type == 'title' and parsed.text:
+        # Free text in a title search with filters is a title substring
+        parsed.titles.append(parsed.text)
+        parsed.text = ''
+    elif search_type not in ('content', 'title'):
+        return render_template('search/results.html', pastes=None, query=query, 
+                              search_type=search_type, total=0)
     
-    # Get total count for pagination
-    total = pastes_query.count()
+    # Tag search is a Premium feature, whether by search type or tag: operator
+    if parsed.tags and (not current_user.is_authenticated or not current_user.is_premium):
+        flash("Tag search is a Premium feature. Please upgrade your account to use it.", "warning")
+        return render_template('search/results.html', pastes=None, query=query, 
+                              search_type=search_type, total=0, premium_required=True)
     
-    # Get paginated results
-    pastes = pastes_query.order_by(Paste.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    # Filters, joins, free text, paging and counting compile into one statement
+    pastes = search_with_query(db.session.connection(), query, page=page, per_page=20,
+                               query=parsed)
     
     return render_template('search/results.html', pastes=pastes, query=query, 
-                          search_type=search_type, total=total)
+                          search_type=search_type, total=pastes.total,
+                          snippets=pastes.snippets)
 
 @search_bp.route('/archive/<syntax>')
 def archive_by_syntax(syntax):
@@ -10,6 +10,9 @@ from werkzeug.security import check_password_hash
 from app import db
 from models import User, Paste, Comment, PasteView, PasteCollection
 from forms import ProfileEditForm
+from utils.user_stats import get_daily_stats, sum_recent
+from utils.collection_counts import PASTE_COUNT
+from utils.stream_encryption import URL_KEY_METHODS
 
 user_bp = Blueprint('user', __name__, url_prefix='/u')
 
@@ -30,13 +33,9 @@ def profile(username):
         # Get collections with paste count for each collection
         collections_query = db.session.query(
             PasteCollection,
-            func.count(Paste.id).label('paste_count')
-        ).outerjoin(
-            Paste, Paste.collection_id == PasteCollection.id
+            PASTE_COUNT
         ).filter(
             PasteCollection.user_id == user.id
-        ).group_by(
-            PasteCollection.id
         ).order_by(
             PasteCollection.name
         ).all()
@@ -49,7 +48,7 @@ def profile(username):
             
         # Store encryption keys for random-key encrypted pastes
         for paste in pastes.items:
-            if paste.is_encrypted and paste.encryption_method == 'fernet-random' and paste.encryption_salt:
+            if paste.is_encrypted and paste.encryption_method in URL_KEY_METHODS and paste.encryption_salt:
                 encryption_keys[paste.short_id] = paste.encryption_salt
     else:
         pastes = Paste.query.filter(
@@ -67,75 +66,51 @@ def dashboard():
     """
     Display a detailed dashboard with enhanced user statistics
     """
-    # Time periods for statistics
     now = datetime.utcnow()
-    week_ago = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
-    
-    # Basic stats
-    total_pastes = Paste.query.filter_by(user_id=current_user.id).count()
-    active_pastes = Paste.query.filter(
-        Paste.user_id == current_user.id,
-        or_(Paste.expires_at.is_(None), Paste.expires_at > now)
-    ).count()
-    expired_pastes = Paste.query.filter(
-        Paste.user_id == current_user.id,
-        Paste.expires_at.isnot(None),
-        Paste.expires_at <= now
-    ).count()
-    
-    # Recent activity
-    pastes_last_week = Paste.query.filter(
-        Paste.user_id == current_user.id,
-        Paste.created_at >= week_ago
-    ).count()
-    
-    pastes_last_month = Paste.query.filter(
-        Paste.user_id == current_user.id,
-        Paste.created_at >= month_ago
-    ).count()
-    
-    # Total views stats
-    total_views = db.session.query(func.count(PasteView.id)).join(Paste).filter(
-        Paste.user_id == current_user.id
-    ).scalar() or 0
-    
-    views_last_week = db.session.query(func.count(PasteView.id)).join(Paste).filter(
-        Paste.user_id == current_user.id,
-        PasteView.created_at >= week_ago
-    ).scalar() or 0
-    
-    views_last_month = db.session.query(func.count(PasteView.id)).join(Paste).filter(
-        Paste.user_id == current_user.id,
-        PasteView.created_at >= month_ago
-    ).scalar() or 0
-    
-    # Comments stats
-    total_comments = db.session.query(func.count(Comment.id)).join(Paste).filter(
-        Paste.user_id == current_user.id
-    ).scalar() or 0
-    
-    comments_received_last_week = db.session.query(func.count(Comment.id)).join(Paste).filter(
-        Paste.user_id == current_user.id,
-        Comment.created_at >= week_ago
-    ).scalar() or 0
-    
-    # Get comments made by the user on others' pastes
-    comments_made = Comment.query.filter(
-        Comment.user_id == current_user.id
-    ).count()
-    
-    comments_made_last_week = Comment.query.filter(
-        Comment.user_id == current_user.id,
-        Comment.created_at >= week_ago
-    ).count()
-    
-    # Most viewed pastes
-    most_viewed_pastes = db.session.query(
-        Paste, func.count(PasteView.id).label('view_count')
-    ).join(PasteView).filter(
+    conn = db.session.connection()
+    
+    # Activity counters come from the per-day rollups: one range read on the
+    # (user_id, day) primary key for the last 30 days and one for the totals
+    totals, recent = get_daily_stats(conn, current_user.id, days=30, now=now)
+    
+    pastes_last_week = sum_recent(recent, 'pastes_created', 7, now)
+    pastes_last_month = sum_recent(recent, 'pastes_created', 30, now)
+    total_views = totals['views_received']
+    views_last_week = sum_recent(recent, 'views_received', 7, now)
+    views_last_month = sum_recent(recent, 'views_received', 30, now)
+    total_comments = totals['comments_received']
+    comments_received_last_week = sum_recent(recent, 'comments_received', 7, now)
+    comments_made = totals['comments_made']
+    comments_made_last_week = sum_recent(recent, 'comments_made', 7, now)
+    
+    # Paste counts and both distributions in one pass over the user's pastes,
+    # served by the (user_id, syntax, visibility, expires_at) index
+    paste_breakdown = db.session.query(
+        Paste.syntax, Paste.visibility, func.count(Paste.id),
+        func.sum(case((Paste.expires_at <= now, 1), else_=0))
+    ).filter(
         Paste.user_id == current_user.id
-    ).group_by(Paste.id).order_by(desc('view_count')).limit(5).all()
+    ).group_by(Paste.syntax, Paste.visibility).all()
+    
+    total_pastes = sum(count for _, _, count, _ in paste_breakdown)
+    expired_pastes = sum(expired or 0 for _, _, _, expired in paste_breakdown)
+    active_pastes = total_pastes - expired_pastes
+    
+    syntax_counts = {}
+    visibility_counts = {}
+    for syntax, visibility, count, _ in paste_breakdown:
+        syntax_counts[syntax] = syntax_counts.get(syntax, 0) + count
+        visibility_counts[visibility] = visibility_counts.get(visibility, 0) + count
+    syntax_distribution = sorted(syntax_counts.items(), key=lambda item: item[1], reverse=True)
+    visibility_distribution = list(visibility_counts.items())
+    
+    # Most viewed pastes, from the unique-view counter kept on each paste
+    most_viewed_pastes = [
+        (paste, paste.views) for paste in Paste.query.filter(
+            Paste.user_id == current_user.id,
+            Paste.views > 0
+        ).order_by(Paste.views.desc()).limit(5)
+    ]
     
     # Most commented pastes
     most_commented_pastes = db.session.query(
@@ -144,46 +119,11 @@ def dashboard():
         Paste.user_id == current_user.id
     ).group_by(Paste.id).order_by(desc('comment_count')).limit(5).all()
     
-    # Paste syntax distribution
-    syntax_distribution = db.session.query(
-        Paste.syntax, func.count(Paste.id).label('count')
-    ).filter(
-        Paste.user_id == current_user.id
-    ).group_by(Paste.syntax).order_by(desc('count')).all()
-    
-    # Paste visibility distribution
-    visibility_distribution = db.session.query(
-        Paste.visibility, func.count(Paste.id).label('count')
-    ).filter(
-        Paste.user_id == current_user.id
-    ).group_by(Paste.visibility).all()
-    
-    # Weekly activity (for charts)
-    day_labels = [(now - timedelta(days=i)).strftime('%a') for i in range(6, -1, -1)]
-    
-    # Pastes created by day of week
-    daily_pastes = []
-    for i in range(6, -1, -1):
-        day_start = now - timedelta(days=i)
-        day_end = now - timedelta(days=i-1) if i > 0 else now
-        count = Paste.query.filter(
-            Paste.user_id == current_user.id,
-            Paste.created_at >= day_start,
-            Paste.created_at < day_end
-        ).count()
-        daily_pastes.append(count)
-    
-    # Views received by day of week
-    daily_views = []
-    for i in range(6, -1, -1):
-        day_start = now - timedelta(days=i)
-        day_end = now - timedelta(days=i-1) if i > 0 else now
-        count = db.session.query(func.count(PasteView.id)).join(Paste).filter(
-            Paste.user_id == current_user.id,
-            PasteView.created_at >= day_start,
-            PasteView.created_at < day_end
-        ).scalar() or 0
-        daily_views.append(count)
+    # Weekly activity (for charts), one bar per UTC day
+    days = [(now - timedelta(days=i)).date() for i in range(6, -1, -1)]
+    day_labels = [day.strftime('%a') for day in days]
+    daily_pastes = [recent.get(day, {}).get('pastes_created', 0) for day in days]
+    daily_views = [recent.get(day, {}).get('views_received', 0) for day in days]
     
     # Note: Collections are now displayed on the profile page instead of the dashboard
     
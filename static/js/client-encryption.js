@@ -0,0 +1,159 @@
+// Client-encryption.js - Encrypts pastes in the browser so the server never sees them
+//
+// Envelope format (see utils/client_encryption.py):
+//   fbc1.<base64url 12-byte IV>.<base64url AES-256-GCM ciphertext and tag>
+// The key is kept in the URL fragment, which is never sent to the server.
+
+const FlaskBinCrypto = (function() {
+    const VERSION = 'fbc1';
+
+    function toBase64Url(bytes) {
+        let binary = '';
+        const view = new Uint8Array(bytes);
+        for (let i = 0; i < view.length; i += 0x8000) {
+            binary += String.fromCharCode.apply(null, view.subarray(i, i + 0x8000));
+        }
+        return btoa(binary).replace(/\+/g, '-').replace(/\//g, '_').replace(/=+$/, '');
+    }
+
+    function fromBase64Url(text) {
+        const padded = text.replace(/-/g, '+').replace(/_/g, '/') + '='.repeat((4 - text.length % 4) % 4);
+        const binary = atob(padded);
+        const bytes = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return bytes;
+    }
+
+    function importKey(rawKey, usage) {
+        return crypto.subtle.importKey('raw', fromBase64Url(rawKey), 'AES-GCM', false, [usage]);
+    }
+
+    // Resolves to {envelope, key}
+    async function encrypt(text) {
+        const rawKey = toBase64Url(crypto.getRandomValues(new Uint8Array(32)));
+        const iv = crypto.getRandomValues(new Uint8Array(12));
+        const key = await importKey(rawKey, 'encrypt');
+        const ciphertext = await crypto.subtle.encrypt({name: 'AES-GCM', iv: iv}, key, new TextEncoder().encode(text));
+        return {envelope: `${VERSION}.${toBase64Url(iv)}.${toBase64Url(ciphertext)}`, key: rawKey};
+    }
+
+    // Rejects if the key is wrong or the envelope is malformed
+    async function decrypt(envelope, rawKey) {
+        const parts = envelope.trim().split('.');
+        if (parts.length !== 3 || parts[0] !== VERSION) {
+            throw new Error('Unsupported encrypted paste format');
+        }
+        const key = await importKey(rawKey, 'decrypt');
+        const plaintext = await crypto.subtle.decrypt({name: 'AES-GCM', iv: fromBase64Url(parts[1])}, key, fromBase64Url(parts[2]));
+        return new TextDecoder().decode(plaintext);
+    }
+
+    return {encrypt: encrypt, decrypt: decrypt, available: !!(window.crypto && crypto.subtle)};
+})();
+
+document.addEventListener('DOMContentLoaded', function() {
+    setupPasteForm();
+    document.querySelectorAll('[data-client-envelope]').forEach(decryptPaste);
+
+    // Encrypt the content just before the paste form is submitted
+    function setupPasteForm() {
+        const toggle = document.getElementById('client_encryption');
+        if (!toggle) {
+            return;
+        }
+        const form = toggle.form;
+        const passwordToggle = document.getElementById('enable_encryption');
+        if (!FlaskBinCrypto.available) {
+            toggle.disabled = true;
+            return;
+        }
+
+        // Browser encryption and password protection are alternatives
+        toggle.addEventListener('change', function() {
+            if (toggle.checked && passwordToggle && passwordToggle.checked) {
+                passwordToggle.checked = false;
+                passwordToggle.dispatchEvent(new Event('change'));
+            }
+        });
+        if (passwordToggle) {
+            passwordToggle.addEventListener('change', function() {
+                if (passwordToggle.checked) {
+                    toggle.checked = false;
+                }
+            });
+        }
+
+        form.addEventListener('submit', function(event) {
+            if (!toggle.checked || event.defaultPrevented) {
+                return;
+            }
+            event.preventDefault();
+            const content = document.getElementById('content-area');
+            FlaskBinCrypto.encrypt(content.value)
+                .then(result => {
+                    content.value = result.envelope;
+                    // The redirect after creation keeps this fragment, so the key never reaches the server
+                    form.action = form.action.split('#')[0] + '#' + result.key;
+                    form.submit();
+                })
+                .catch(error => {
+                    console.error('Error encrypting paste:', error);
+                    alert('Your browser could not encrypt this paste.');
+                });
+        });
+    }
+
+    function decryptPaste(container) {
+        const key = window.location.hash.slice(1);
+        const message = container.querySelector('.client-encryption-message');
+        if (!key) {
+            message.textContent = 'This paste is encrypted. Open it with the full link, including the part after #, to read it.';
+            return;
+        }
+
+        FlaskBinCrypto.decrypt(container.dataset.clientEnvelope, key)
+            .then(text => {
+                const pre = document.createElement('pre');
+                const code = document.createElement('code');
+                code.id = 'paste-content';
+                const syntax = container.dataset.syntax;
+                if (syntax && syntax !== 'text' && typeof hljs !== 'undefined' && hljs.getLanguage(syntax)) {
+                    code.className = 'language-' + syntax;
+                }
+                code.textContent = text;
+                pre.appendChild(code);
+                container.replaceChildren(pre);
+                if (typeof hljs !== 'undefined') {
+                    hljs.highlightElement(code);
+                }
+                rewireLinks(text, key);
+            })
+            .catch(error => {
+                console.error('Error decrypting paste:', error);
+                message.textContent = 'This paste could not be decrypted. The key in the link may be incomplete.';
+            });
+    }
+
+    // Raw, download and print work on the decrypted text; embeds need the key
+    function rewireLinks(text, key) {
+        const blobUrl = URL.createObjectURL(new Blob([text], {type: 'text/plain;charset=utf-8'}));
+        document.querySelectorAll('a[href$="/raw"]').forEach(link => {
+            link.href = blobUrl;
+        });
+        document.querySelectorAll('a[href$="/download"]').forEach(link => {
+            link.href = blobUrl;
+            link.download = (document.title.split(' - ')[0] || 'paste').replace(/ /g, '_') + '.txt';
+        });
+        document.querySelectorAll('a[href^="/paste/"][href$="/print"]').forEach(link => {
+            link.addEventListener('click', function(event) {
+                event.preventDefault();
+                window.print();
+            });
+        });
+        document.querySelectorAll('a[href$="/embed"]').forEach(link => {
+            link.href = link.getAttribute('href') + '#' + key;
+        });
+    }
+});
@@ -144,4 +144,22 @@ document.addEventListener('DOMContentLoaded', function() {
       });
     });
   }
+
+  // Forms shown to anonymous readers have no CSRF token yet (rendering one
+  // would start a session); fetch it when the form is submitted
+  document.querySelectorAll('input[data-lazy-csrf]').forEach(input => {
+    input.form.addEventListener('submit', function(event) {
+      if (input.value) {
+        return;
+      }
+      event.preventDefault();
+      fetch('/paste/api/csrf-token', { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(data => {
+          input.value = data.csrf_token;
+          input.form.submit();
+        })
+        .catch(error => console.error('Error fetching CSRF token:', error));
+    });
+  });
 });
@@ -7,9 +7,20 @@ document.addEventListener('DOMContentLoaded', function() {
         return;
     }
 
+    const config = notificationCountElements[0].dataset;
+    const countUrl = config.countUrl || '/notifications/count';
+    const streamUrl = config.streamUrl || '/notifications/stream';
+
+    // Poll this often when the push stream is unavailable
+    const POLL_INTERVAL = 60000;
+    // Give up on the stream after this many failed connection attempts in a row
+    const MAX_STREAM_FAILURES = 3;
+
+    let pollTimer = null;
+
     // Function to fetch the current notification count
     function fetchNotificationCount() {
-        fetch('/notifications/count')
+        fetch(countUrl)
             .then(response => response.json())
             .then(data => {
                 updateNotificationBadges(data.count);
@@ -39,9 +50,59 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    // Initial fetch
-    fetchNotificationCount();
+    // Fall back to periodic polling
+    function startPolling() {
+        if (pollTimer === null) {
+            fetchNotificationCount();
+            pollTimer = setInterval(fetchNotificationCount, POLL_INTERVAL);
+        }
+    }
+
+    // Receive count changes and new notifications as they happen. EventSource
+    // reconnects on its own after network errors and server-side stream
+    // rotation; each new stream starts with the current count.
+    function startStream() {
+        const source = new EventSource(streamUrl);
+        let failures = 0;
+
+        source.addEventListener('open', function() {
+            failures = 0;
+        });
+
+        source.addEventListener('count', function(event) {
+            updateNotificationBadges(JSON.parse(event.data).count);
+        });
+
+        source.addEventListener('notification', function(event) {
+            // Let other scripts (toasts, the inbox page) react to new notifications
+            document.dispatchEvent(new CustomEvent('flaskbin:notification', {
+                detail: JSON.parse(event.data)
+            }));
+        });
+
+        source.addEventListener('summary', function(event) {
+            // A background AI summary job finished (see the paste view)
+            document.dispatchEvent(new CustomEvent('flaskbin:summary', {
+                detail: JSON.parse(event.data)
+            }));
+        });
+
+        source.addEventListener('resync', fetchNotificationCount);
 
-    // Set up periodic refresh every 60 seconds
-    setInterval(fetchNotificationCount, 60000);
+        source.addEventListener('error', function() {
+            failures += 1;
+            // CLOSED means the server turned the stream off (204) or the
+            // browser gave up; repeated failures mean a proxy is in the way
+            if (source.readyState === EventSource.CLOSED || failures >= MAX_STREAM_FAILURES) {
+                source.close();
+                startPolling();
+            }
+        });
+    }
+
+    if (window.EventSource) {
+        startStream();
+    } else {
+        startPolling();
+    }
 });
@@ -84,7 +84,8 @@ document.addEventListener('DOMContentLoaded', function() {
   
   // Helper function to get CSRF token
   function getCsrfToken() {
-    return document.querySelector('meta[name="csrf-token"]')?.getAttribute('content') || '';
+    return document.querySelector('meta[name="csrf-token"]')?.getAttribute('content') ||
+      document.querySelector('input[name="csrf_token"]')?.value || '';
   }
   
   // Line numbers for code blocks
@@ -4,10 +4,12 @@ import string
 import bleach
 import uuid
 import os
+import hmac
 import base64
+import hashlib
 import logging
 from datetime import datetime
-from flask import request, session, abort, current_app, g
+from flask import request, abort, current_app, g
 from flask_login import current_user
 from functools import wraps
 
@@ -33,6 +35,9 @@ try:
 except ImportError:
     HAS_OPENAI = False
 
+# Used where there is no app context, e.g. on the summary job threads
+logger = logging.getLogger(__name__)
+
 def generate_short_id(length=8):
     """Generate a random alphanumeric ID of specified length"""
     chars = string.ascii_letters + string.digits
@@ -113,12 +118,58 @@ def get_client_ip():
         ip = request.remote_addr or '127.0.0.1'
     return ip
 
+def anonymous_viewer_id(secret, ip, user_agent, day):
+    """Keyed hash identifying an anonymous viewer for one day"""
+    message = f"{day.isoformat()}|{ip}|{user_agent}".encode('utf-8')
+    return hmac.new(secret, message, hashlib.sha256).hexdigest()[:32]
+
 def get_viewer_id():
-    """Get a unique identifier for the current viewer"""
-    # Import PasteView inside the function to avoid circular imports
-    from models import PasteView
-    return PasteView.get_or_create_viewer_id(session, get_client_ip())
+    """
+    Get an identifier for the current viewer, for counting unique views.
+
+    Derived from the request alone, so counting a view never starts a
+    session or sets a cookie and public paste pages stay cacheable. Logged-in
+    users are identified by their account; anonymous viewers by a keyed hash
+    of their IP address, user agent and the UTC day, so they count again the
+    next day and the stored IDs reveal no addresses. The key is
+    VIEWER_ID_SECRET, or the app's secret key. request.remote_addr is used
+    rather than get_client_ip() since ProxyFix has already taken the
+    client's address from the proxy, and the rest of X-Forwarded-For is
+    whatever the client sent.
+    """
+    secret = (os.environ.get('VIEWER_ID_SECRET') or current_app.secret_key).encode('utf-8')
+    if current_user.is_authenticated:
+        return hmac.new(secret, f"user|{current_user.id}".encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+    return anonymous_viewer_id(secret, request.remote_addr or '', request.user_agent.string,
+                               datetime.utcnow().date())
     
+# PBKDF2 iterations for password-encrypted pastes (about 100ms of CPU per derivation)
+KDF_ITERATIONS = 100000
+
+# Number of key derivations this process has run, for benchmarks and monitoring
+kdf_calls = 0
+
+def derive_password_key(password, salt):
+    """
+    Derive the Fernet key of a password-encrypted paste
+    
+    Args:
+        password (str): The paste password
+        salt (bytes): The paste's raw salt
+        
+    Returns:
+        bytes: URL-safe base64 encoded key
+    """
+    global kdf_calls
+    kdf_calls += 1
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=KDF_ITERATIONS,
+    )
+    return base64.urlsafe_b64encode(kdf.derive(password.encode('utf-8')))
+
 def encrypt_content(content, password=None):
     """
     Encrypt content using Fernet symmetric encryption
@@ -150,13 +201,7 @@ def encrypt_content(content, password=None):
             salt = os.urandom(16)
             
             # Derive a key from the password and salt
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt,
-                iterations=100000,
-            )
-            key = base64.urlsafe_b64encode(kdf.derive(password.encode('utf-8')))
+            key = derive_password_key(password, salt)
             
             # Create a Fernet cipher with the derived key
             cipher = Fernet(key)
@@ -224,13 +269,7 @@ def decrypt_content(encrypted_content, salt=None, method='fernet-random', passwo
             salt_bytes = base64.urlsafe_b64decode(salt.encode('utf-8'))
             
             # Derive the key from the password and salt
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt_bytes,
-                iterations=100000,
-            )
-            key = base64.urlsafe_b64encode(kdf.derive(password.encode('utf-8')))
+            key = derive_password_key(password, salt_bytes)
             
             # Create a Fernet cipher with the derived key
             cipher = Fernet(key)
@@ -267,6 +306,69 @@ def decrypt_content(encrypted_content, salt=None, method='fernet-random', passwo
             current_app.logger.error(f"Decryption error: {str(e)}")
         return None
 
+def decrypt_with_key(encrypted_content, key):
+    """
+    Decrypt a password-encrypted paste with an already derived key
+    
+    Args:
+        encrypted_content (str): Base64 encoded encrypted content
+        key (bytes): Key from derive_password_key
+        
+    Returns:
+        str: The decrypted content or None if the key is wrong
+    """
+    if not HAS_CRYPTO:
+        return None
+        
+    try:
+        encrypted_bytes = base64.urlsafe_b64decode(encrypted_content.encode('utf-8'))
+        return Fernet(key).decrypt(encrypted_bytes).decode('utf-8')
+    except Exception as e:
+        if current_app:
+            current_app.logger.error(f"Decryption error: {str(e)}")
+        return None
+
+# Model used for code summaries
+SUMMARY_MODEL = os.environ.get('SUMMARY_MODEL', 'gpt-3.5-turbo')
+
+# Bump whenever the summary prompts (here and in utils.chunked_summary)
+# change; cached summaries made with an older prompt are then regenerated
+# (see utils.summary_cache)
+SUMMARY_PROMPT_VERSION = 2
+
+SUMMARY_SYSTEM_PROMPT = "You are an expert programmer who provides concise, accurate summaries of code."
+
+# Pastes longer than this are summarised in chunks (utils.chunked_summary),
+# or truncated when chunking is off
+MAX_CODE_CHARS = 8000
+
+_openai_clients = {}
+
+def _openai_client(api_key):
+    """One client per key, so summary workers share its connection pool"""
+    if api_key not in _openai_clients:
+        _openai_clients[api_key] = openai.OpenAI(api_key=api_key, timeout=60)
+    return _openai_clients[api_key]
+
+def summary_completion(messages, max_tokens, api_key=None):
+    """
+    One chat completion with the summary model.
+
+    Returns:
+        tuple: (text, total tokens used)
+    """
+    # OPENAI_BASE_URL points the client at another server
+    response = _openai_client(api_key or os.environ.get('OPENAI_API_KEY')).chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=0.5,  # Lower temperature for more focused responses
+        n=1,
+        stop=None
+    )
+    tokens = response.usage.total_tokens if response.usage else 0
+    return response.choices[0].message.content.strip(), tokens
+
 def generate_ai_summary(code, language=None, max_tokens=150):
     """
     Generate an AI summary of code using OpenAI's GPT models
@@ -281,62 +383,57 @@ def generate_ai_summary(code, language=None, max_tokens=150):
     """
     if not HAS_OPENAI:
         return None
-        
+
+    log = current_app.logger if current_app else logger
     try:
         # Set up OpenAI API key from environment
         api_key = os.environ.get('OPENAI_API_KEY')
         if not api_key:
-            if current_app:
-                current_app.logger.error("Missing OpenAI API key in environment")
+            log.error("Missing OpenAI API key in environment")
             return None
             
-        openai.api_key = api_key
-        
-        # Truncate code if it's too long to avoid excessive token usage
-        max_code_chars = 8000  # Approximate limit to avoid hitting token limits
-        truncated = False
-        
-        if len(code) > max_code_chars:
-            code = code[:max_code_chars] + "...[truncated]"
-            truncated = True
-        
-        # Language-specific prompt template
-        language_text = f"in {language}" if language else ""
-        prompt_addition = " The code has been truncated." if truncated else ""
-        
-        messages = [
-            {"role": "system", "content": "You are an expert programmer who provides concise, accurate summaries of code."},
-            {"role": "user", "content": f"Please analyze this code {language_text} and provide a brief, clear summary explaining what it does. Focus on the main functionality, key components, and overall purpose. Be objective and technical but easy to understand.{prompt_addition}\n\nCode:\n```\n{code}\n```"}
-        ]
         
         # Start timing for performance monitoring
         start_time = datetime.now()
         
-        # Make the API call to OpenAI
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",  # Use appropriate model based on your needs
-            messages=messages,
-            max_tokens=max_tokens,
-            temperature=0.5,  # Lower temperature for more focused responses
-            n=1,
-            stop=None
-        )
+        from utils.chunked_summary import CHUNKING, summarize_chunked
+        if len(code) > MAX_CODE_CHARS and CHUNKING:
+            # Large pastes are summarised part by part and the parts merged
+            summary, stats = summarize_chunked(
+                code, language, lambda messages, tokens: summary_completion(messages, tokens, api_key),
+                SUMMARY_SYSTEM_PROMPT, max_tokens=max_tokens
+            )
+            if not summary:
+                return None
+            detail = f"{stats['summarized']}/{stats['chunks']} chunks, {stats['tokens']} tokens"
+        else:
+            # Truncate code if it's too long to avoid excessive token usage
+            truncated = False
+            if len(code) > MAX_CODE_CHARS:
+                code = code[:MAX_CODE_CHARS] + "...[truncated]"
+                truncated = True
+            
+            # Language-specific prompt template
+            language_text = f"in {language}" if language else ""
+            prompt_addition = " The code has been truncated." if truncated else ""
+            
+            messages = [
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": f"Please analyze this code {language_text} and provide a brief, clear summary explaining what it does. Focus on the main functionality, key components, and overall purpose. Be objective and technical but easy to understand.{prompt_addition}\n\nCode:\n```\n{code}\n```"}
+            ]
+            summary, tokens = summary_completion(messages, max_tokens, api_key)
+            detail = f"{tokens} tokens"
         
         # End timing
         duration = (datetime.now() - start_time).total_seconds()
         
-        # Extract the summary from the response
-        summary = response.choices[0].message.content.strip()
-        
         # Log metrics for monitoring
-        if current_app:
-            current_app.logger.info(f"AI summary generated in {duration:.2f}s, input: {len(code)} chars, output: {len(summary)} chars")
+        log.info(f"AI summary generated in {duration:.2f}s, input: {len(code)} chars, output: {len(summary)} chars, {detail}")
         
         return summary
     
     except Exception as e:
-        if current_app:
-            current_app.logger.error(f"Error generating AI summary: {str(e)}")
+        log.error(f"Error generating AI summary: {str(e)}")
         return None
 
 def check_shadowban(func):
@@ -380,6 +477,7 @@ __all__ = [
     'format_size',
     'get_client_ip',
     'get_viewer_id',
+    'anonymous_viewer_id',
     'encrypt_content',
     'decrypt_content',
     'generate_ai_summary',
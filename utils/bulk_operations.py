@@ -143,51 +143,25 @@ def bulk_update_view_counts(paste_ids):
 
 def generate_paste_stats_report():
     """
-    Generate statistics report directly with SQL for efficiency.
+    Paste statistics report from the stored site stats snapshot.
+    
+    The distributions are recomputed on a schedule by refresh_site_stats.py
+    rather than on every call; the snapshot is computed here only if it has
+    never been refreshed.
     
     Returns:
-        Dictionary containing various statistics
+        Dictionary containing various statistics plus the snapshot's
+        'computed_at' time
     """
-    stats = {}
-    
-    # Get total counts
-    counts = execute_raw_sql("""
-        SELECT 
-            COUNT(*) as total_pastes,
-            COUNT(DISTINCT user_id) as total_users_with_pastes,
-            SUM(views) as total_views
-        FROM pastes
-    """)[0]
-    
-    stats['total_pastes'] = counts[0]
-    stats['total_users_with_pastes'] = counts[1]
-    stats['total_views'] = counts[2] or 0
-    
-    # Get language distribution
-    languages = execute_raw_sql("""
-        SELECT language, COUNT(*) as count
-        FROM pastes
-        WHERE language IS NOT NULL AND language != ''
-        GROUP BY language
-        ORDER BY count DESC
-        LIMIT 10
-    """)
-    
-    stats['top_languages'] = [
-        {'language': lang, 'count': count}
-        for lang, count in languages
-    ]
-    
-    # Get visibility distribution
-    visibility = execute_raw_sql("""
-        SELECT visibility, COUNT(*) as count
-        FROM pastes
-        GROUP BY visibility
-        ORDER BY count DESC
-    """)
-    
-    stats['visibility_distribution'] = {
-        vis: count for vis, count in visibility
-    }
-    
-    return stats
\ No newline at end of file
+    from db import db
+    from utils.site_stats import get_snapshot, refresh_site_stats
+    
+    conn = db.session.connection()
+    stats, computed_at = get_snapshot(conn, 'pastes')
+    if stats is None:
+        refresh_site_stats(conn, names=['pastes'])
+        db.session.commit()
+        stats, computed_at = get_snapshot(db.session.connection(), 'pastes')
+    
+    stats['computed_at'] = computed_at
+    return stats
@@ -0,0 +1,221 @@
+"""
+Map-reduce summaries of large pastes.
+
+generate_ai_summary() sends a paste of up to MAX_CODE_CHARS in one request.
+Longer pastes used to be cut off there, so their summaries described only the
+first screen. With SUMMARY_CHUNKING on (the default) they are instead:
+
+1. split into chunks of at most SUMMARY_CHUNK_CHARS at structural boundaries
+   (top-level definitions and blank-line separated blocks, falling back to
+   line breaks), so a function is rarely cut in half;
+2. summarised chunk by chunk (map) on a process-wide pool of
+   SUMMARY_CHUNK_WORKERS threads, shared by every summary job;
+3. merged into one summary by a final call (reduce).
+
+SUMMARY_TOKEN_BUDGET caps the estimated tokens (prompts and completions)
+spent on one paste. When not every chunk fits, an evenly spaced selection is
+summarised and the merge prompt says how much of the file was skipped.
+"""
+
+import os
+import re
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+CHUNKING = os.environ.get('SUMMARY_CHUNKING', 'on') == 'on'
+CHUNK_CHARS = int(os.environ.get('SUMMARY_CHUNK_CHARS', 6000))
+CHUNK_WORKERS = int(os.environ.get('SUMMARY_CHUNK_WORKERS', 4))
+TOKEN_BUDGET = int(os.environ.get('SUMMARY_TOKEN_BUDGET', 24000))
+
+# Completion tokens allowed for each chunk's summary
+CHUNK_SUMMARY_TOKENS = 120
+
+# Tokens of instructions around each prompt's code or summaries
+PROMPT_OVERHEAD_TOKENS = 100
+
+# Unindented lines that open a definition or section in common languages
+DEFINITION = re.compile(
+    r'(?:(?:export|public|private|protected|static|async|pub|abstract|final)\s+)*'
+    r'(?:def|class|function|func|fn|struct|enum|interface|impl|trait|module|package|type|'
+    r'CREATE|SELECT|#+\s|@)'
+)
+
+# Unindented lines that close a block rather than start one
+CLOSER = re.compile(r'[\]\)}]|end\b|fi\b|done\b|esac\b')
+
+
+def estimate_tokens(text):
+    # Close enough to the tokenizer for English and code
+    return len(text) // 4 + 1
+
+
+def _is_boundary(line, previous):
+    if not line.strip() or line[0].isspace() or CLOSER.match(line):
+        return False
+    return not previous.strip() or bool(DEFINITION.match(line))
+
+
+def split_segments(code):
+    """
+    Split ``code`` into top-level segments.
+
+    A segment starts at an unindented line that follows a blank line or
+    opens a definition. Joining the segments gives back ``code``.
+    """
+    lines = code.splitlines(keepends=True)
+    segments, current = [], []
+    previous = ''
+    for line in lines:
+        if current and _is_boundary(line, previous):
+            segments.append(''.join(current))
+            current = []
+        current.append(line)
+        previous = line
+    if current:
+        segments.append(''.join(current))
+    return segments
+
+
+def _split_lines(segment, max_chars):
+    """Break an oversized segment at line breaks (and overlong lines anywhere)"""
+    pieces, current = [], ''
+    for line in segment.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if len(current) + len(line) > max_chars:
+            pieces.append(current)
+            current = ''
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_chunks(code, max_chars=None):
+    """
+    Pack the segments of ``code`` into chunks of at most ``max_chars``.
+
+    Returns:
+        list: (first_line, last_line, text) tuples, lines counted from 1
+    """
+    max_chars = max_chars or CHUNK_CHARS
+    texts, current = [], ''
+    for segment in split_segments(code):
+        if len(segment) > max_chars:
+            if current:
+                texts.append(current)
+                current = ''
+            texts.extend(_split_lines(segment, max_chars))
+        elif len(current) + len(segment) > max_chars:
+            texts.append(current)
+            current = segment
+        else:
+            current += segment
+    if current:
+        texts.append(current)
+
+    chunks, line = [], 1
+    for text in texts:
+        lines = text.count('\n') + (0 if text.endswith('\n') else 1)
+        chunks.append((line, line + lines - 1, text))
+        line += text.count('\n')
+    return chunks
+
+
+def select_chunks(chunks, budget, max_tokens):
+    """
+    The largest evenly spaced selection of ``chunks`` whose map and reduce
+    calls fit in ``budget`` estimated tokens.
+    """
+    costs = [estimate_tokens(text) + PROMPT_OVERHEAD_TOKENS + CHUNK_SUMMARY_TOKENS for _, _, text in chunks]
+    for count in range(len(chunks), 0, -1):
+        picked = sorted({index * len(chunks) // count for index in range(count)})
+        reduce_cost = PROMPT_OVERHEAD_TOKENS + len(picked) * (CHUNK_SUMMARY_TOKENS + 10) + max_tokens
+        if sum(costs[index] for index in picked) + reduce_cost <= budget:
+            return [chunks[index] for index in picked]
+    return []
+
+
+def _map_messages(system_prompt, chunk, number, total, language):
+    first, last, text = chunk
+    language_text = f" {language}" if language else ""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"This is part {number} of {total} (lines {first}-{last}) of a larger{language_text} file. In two or three sentences, summarize what this part does, naming its key functions, classes or sections.\n\nCode:\n```\n{text}\n```"},
+    ]
+
+
+def _reduce_messages(system_prompt, partials, language, total_lines, skipped):
+    language_text = f" in {language}" if language else ""
+    skipped_text = (f" Only part of the file was analyzed; about {skipped}% of its lines were skipped."
+                    if skipped else "")
+    parts = "\n".join(f"- Lines {first}-{last}: {summary}" for (first, last, _), summary in partials)
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"These are summaries of consecutive parts of one {total_lines}-line file{language_text}.{skipped_text} Combine them into a brief, clear summary explaining what the whole file does. Focus on the main functionality, key components, and overall purpose. Be objective and technical but easy to understand.\n\n{parts}"},
+    ]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=CHUNK_WORKERS, thread_name_prefix='summary-chunk')
+    return _executor
+
+
+def summarize_chunked(code, language, complete, system_prompt, max_tokens=150, budget=None, executor=None):
+    """
+    Summarise a large paste by summarising its chunks and merging the results.
+
+    Args:
+        complete: ``complete(messages, max_tokens)`` returning (text, tokens used)
+        budget: Estimated token cap for the paste (default SUMMARY_TOKEN_BUDGET)
+        executor: Pool for the chunk calls (default the process-wide pool)
+
+    Returns:
+        tuple: (summary or None, stats) where stats has 'chunks', 'summarized'
+        and 'tokens' (as reported by ``complete``)
+    """
+    chunks = split_chunks(code)
+    picked = select_chunks(chunks, budget or TOKEN_BUDGET, max_tokens)
+    stats = {'chunks': len(chunks), 'summarized': len(picked), 'tokens': 0}
+    if not picked:
+        return None, stats
+
+    def summarize_chunk(number, chunk):
+        try:
+            return complete(_map_messages(system_prompt, chunk, number, len(picked), language), CHUNK_SUMMARY_TOKENS)
+        except Exception as e:
+            logger.warning(f"Summary of lines {chunk[0]}-{chunk[1]} failed: {e}")
+            return None, 0
+
+    pool = executor or _get_executor()
+    futures = [pool.submit(summarize_chunk, number, chunk) for number, chunk in enumerate(picked, 1)]
+    partials = []
+    for chunk, future in zip(picked, futures):
+        summary, tokens = future.result()
+        stats['tokens'] += tokens
+        if summary:
+            partials.append((chunk, summary))
+    if not partials:
+        return None, stats
+
+    total_lines = code.count('\n') + 1
+    covered = sum(chunk[1] - chunk[0] + 1 for chunk, _ in partials)
+    skipped = max(0, round(100 * (1 - covered / total_lines)))
+    summary, tokens = complete(_reduce_messages(system_prompt, partials, language, total_lines, skipped), max_tokens)
+    stats['tokens'] += tokens
+    return summary, stats
@@ -0,0 +1,100 @@
+"""
+Browser-side (zero-knowledge) paste encryption.
+
+With the 'client-aes-gcm' method the paste form encrypts the content in the
+browser with WebCrypto AES-256-GCM before it is submitted
+(static/js/client-encryption.js). The key goes into the URL fragment
+(``/paste/<short_id>#<key>``), which browsers never send to the server, so
+the server only ever stores and serves an envelope::
+
+    fbc1.<base64url 12-byte IV>.<base64url ciphertext and 16-byte tag>
+
+The view, raw and embed pages hand that envelope to the browser unchanged,
+which decrypts it with the key from the fragment. No key derivation or
+decryption runs on the server, and raw and embed responses can be cached.
+
+encrypt_envelope() and decrypt_envelope() implement the same format in
+Python for scripts and benchmarks; the app itself never calls them.
+"""
+
+import os
+import re
+import base64
+from datetime import datetime
+
+CLIENT_METHOD = 'client-aes-gcm'
+
+ENVELOPE_VERSION = 'fbc1'
+
+ENVELOPE = re.compile(r'fbc1\.[A-Za-z0-9_-]{16}\.[A-Za-z0-9_-]{22,}')
+
+# Seconds shared caches may keep the ciphertext of raw and embed pages
+CACHE_SECONDS = int(os.environ.get('CLIENT_ENCRYPTED_CACHE_SECONDS', 3600))
+
+
+def is_client_encrypted(paste):
+    return bool(paste.is_encrypted) and paste.encryption_method == CLIENT_METHOD
+
+
+def is_envelope(content):
+    """Whether ``content`` is a well-formed envelope (it cannot be checked further without the key)"""
+    return bool(content) and ENVELOPE.fullmatch(content.strip()) is not None
+
+
+def cache_ciphertext(response, paste, private=False):
+    """
+    Let caches keep a response that holds only a paste's ciphertext.
+
+    Private and burn-after-read pastes, and responses that set a cookie, are
+    never stored by shared caches.
+    """
+    max_age = CACHE_SECONDS
+    if paste.expires_at:
+        max_age = min(max_age, int((paste.expires_at - datetime.utcnow()).total_seconds()))
+    if paste.burn_after_read or max_age <= 0:
+        response.cache_control.no_store = True
+        return response
+    if private or paste.visibility == 'private':
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def generate_key():
+    """A random key in the form the browser puts in the URL fragment"""
+    return _b64encode(os.urandom(32))
+
+
+def encrypt_envelope(content, key):
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    iv = os.urandom(12)
+    ciphertext = AESGCM(_b64decode(key)).encrypt(iv, content.encode('utf-8'), None)
+    return f"{ENVELOPE_VERSION}.{_b64encode(iv)}.{_b64encode(ciphertext)}"
+
+
+def decrypt_envelope(envelope, key):
+    """
+    Decrypt an envelope with the key from a paste URL's fragment.
+
+    Returns:
+        str: The content, or None if the key is wrong or the envelope malformed
+    """
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    if not is_envelope(envelope):
+        return None
+    _, iv, ciphertext = envelope.strip().split('.')
+    try:
+        return AESGCM(_b64decode(key)).decrypt(_b64decode(iv), _b64decode(ciphertext), None).decode('utf-8')
+    except (InvalidTag, ValueError):
+        return None
@@ -0,0 +1,154 @@
+"""
+Denormalised paste counts for collections.
+
+paste_collections.paste_count is kept in step with pastes.collection_id so
+collection listings can show counts without touching the pastes table. ORM
+flushes that add, delete or move pastes are turned into +/- deltas applied on
+the flushing connection; the set-based helpers below adjust the counter in
+the same statement batch as the UPDATE they run. Anything else that changes
+collection_id in bulk should finish with reconcile_collection_counts().
+"""
+
+from sqlalchemy import Integer, bindparam, literal_column, text
+
+# Select alongside PasteCollection, e.g.
+# db.session.query(PasteCollection, PASTE_COUNT)
+PASTE_COUNT = literal_column('paste_collections.paste_count', Integer).label('paste_count')
+
+COUNT_UPDATE = """
+    UPDATE paste_collections SET paste_count = paste_count + :delta WHERE id = :collection_id
+"""
+
+
+def collect_count_deltas(session):
+    """
+    Net paste count change per collection for the pending flush.
+
+    Must run in before_flush, while the previous collection_id of moved and
+    deleted pastes can still be read.
+
+    Returns:
+        dict: {collection_id: delta}
+    """
+    from sqlalchemy import inspect
+
+    deltas = {}
+
+    def add(collection_id, amount):
+        if collection_id:
+            deltas[collection_id] = deltas.get(collection_id, 0) + amount
+
+    for obj in session.new:
+        if getattr(obj, '__tablename__', None) == 'pastes':
+            add(obj.collection_id, 1)
+    for obj in session.deleted:
+        if getattr(obj, '__tablename__', None) == 'pastes':
+            history = inspect(obj).attrs.collection_id.history
+            add(history.deleted[0] if history.deleted else obj.collection_id, -1)
+    unknown_old = []
+    for obj in session.dirty:
+        if getattr(obj, '__tablename__', None) != 'pastes':
+            continue
+        history = inspect(obj).attrs.collection_id.history
+        if history.has_changes():
+            for new in history.added:
+                add(new, 1)
+            if history.deleted:
+                add(history.deleted[0], -1)
+            else:
+                # Assigned without the old value ever being loaded (e.g.
+                # after a commit expired it); read it from the row
+                unknown_old.append(obj.id)
+    if unknown_old:
+        rows = session.connection().execute(
+            text("SELECT collection_id FROM pastes WHERE id IN :ids").bindparams(
+                bindparam('ids', expanding=True)
+            ), {'ids': unknown_old}
+        )
+        for (old,) in rows:
+            add(old, -1)
+    return {collection_id: delta for collection_id, delta in deltas.items() if delta}
+
+
+def apply_count_deltas(conn, deltas):
+    """Apply collected deltas on ``conn``"""
+    if deltas:
+        conn.execute(text(COUNT_UPDATE), [
+            {'collection_id': collection_id, 'delta': delta}
+            for collection_id, delta in deltas.items()
+        ])
+
+
+def _before_flush(session, flush_context, instances):
+    deltas = collect_count_deltas(session)
+    if deltas:
+        session.info['collection_count_deltas'] = deltas
+
+
+def _after_flush(session, flush_context):
+    deltas = session.info.pop('collection_count_deltas', None)
+    if deltas:
+        apply_count_deltas(session.connection(), deltas)
+
+
+def register_collection_count_hooks():
+    """Maintain paste_collections.paste_count from every ORM flush (once per process)"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    if event.contains(Session, 'after_flush', _after_flush):
+        return
+    event.listen(Session, 'before_flush', _before_flush)
+    event.listen(Session, 'after_flush', _after_flush)
+
+
+def detach_collection_pastes(conn, collection_id):
+    """
+    Unset collection_id on every paste in a collection with one UPDATE.
+
+    Returns:
+        int: Number of pastes detached
+    """
+    result = conn.execute(text(
+        "UPDATE pastes SET collection_id = NULL WHERE collection_id = :collection_id"
+    ), {'collection_id': collection_id})
+    conn.execute(text(
+        "UPDATE paste_collections SET paste_count = 0 WHERE id = :collection_id"
+    ), {'collection_id': collection_id})
+    return result.rowcount
+
+
+def remove_paste_from_collection(conn, collection_id, paste_id):
+    """
+    Take one paste out of a collection.
+
+    Returns:
+        bool: False if the paste was not in the collection
+    """
+    result = conn.execute(text("""
+        UPDATE pastes SET collection_id = NULL
+        WHERE id = :paste_id AND collection_id = :collection_id
+    """), {'paste_id': paste_id, 'collection_id': collection_id})
+    if result.rowcount:
+        conn.execute(text(COUNT_UPDATE), {'collection_id': collection_id, 'delta': -1})
+    return bool(result.rowcount)
+
+
+def reconcile_collection_counts(conn, user_id=None):
+    """
+    Recompute paste_count from pastes, optionally for one user's collections.
+
+    Returns:
+        int: Number of collections whose count was wrong
+    """
+    params = {}
+    owner = ""
+    if user_id is not None:
+        params['user_id'] = user_id
+        owner = "AND user_id = :user_id"
+    counted = "(SELECT COUNT(*) FROM pastes WHERE pastes.collection_id = paste_collections.id)"
+    result = conn.execute(text(f"""
+        UPDATE paste_collections SET paste_count = {counted}
+        WHERE paste_count != {counted} {owner}
+    """), params)
+    return result.rowcount
@@ -0,0 +1,153 @@
+"""
+Per-session cache of derived keys for password-encrypted pastes.
+
+Unlocking a password-encrypted paste ('fernet-password' or 'aead-password')
+derives its key with PBKDF2 at KDF_ITERATIONS, about 100ms of CPU. The key is
+then kept in memory for ENCRYPTION_KEY_CACHE_TTL seconds (5 minutes by
+default), keyed by an opaque random ID stored in the visitor's session plus
+the paste and its salt, so re-views, raw, download, embed and print views of
+an unlocked paste decrypt with the cached key instead of deriving it again.
+The password itself is never stored, and neither is the key outside this
+process: a restart, another worker or an expired entry simply asks for the
+password again.
+
+Derivations run on a small pool of ENCRYPTION_KDF_WORKERS threads, so a burst
+of unlock attempts cannot occupy every request worker at once.
+"""
+
+import os
+import base64
+import logging
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import session
+
+from utils import decrypt_with_key, derive_password_key
+from utils.stream_encryption import PASSWORD_METHODS, STREAM_METHODS, read_paste_text
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+KEY_CACHE_TTL = int(os.environ.get('ENCRYPTION_KEY_CACHE_TTL', 300))
+KEY_CACHE_SIZE = int(os.environ.get('ENCRYPTION_KEY_CACHE_SIZE', 2000))
+KDF_WORKERS = int(os.environ.get('ENCRYPTION_KDF_WORKERS', 2))
+
+# Session entry holding this visitor's key cache ID
+SESSION_KEY = 'key_cache_id'
+
+key_cache = TTLCache(maxsize=KEY_CACHE_SIZE, ttl=KEY_CACHE_TTL)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=KDF_WORKERS, thread_name_prefix='paste-kdf')
+    return _executor
+
+
+def derive_key(password, salt):
+    """
+    Derive a paste key on the KDF pool.
+
+    Args:
+        password (str): The password entered by the visitor
+        salt (str): The paste's base64 encoded encryption_salt
+
+    Returns:
+        bytes: The key, or None if the salt is malformed
+    """
+    try:
+        salt_bytes = base64.urlsafe_b64decode(salt.encode('utf-8'))
+    except (AttributeError, ValueError):
+        return None
+    return _get_executor().submit(derive_password_key, password, salt_bytes).result()
+
+
+def _cache_key(paste, create=False):
+    session_id = session.get(SESSION_KEY)
+    if session_id is None:
+        if not create:
+            return None
+        session_id = session[SESSION_KEY] = secrets.token_urlsafe(16)
+    return (session_id, paste.id, paste.encryption_salt)
+
+
+def _decrypt(paste, key):
+    if paste.encryption_method in STREAM_METHODS:
+        return read_paste_text(paste, key)
+    return decrypt_with_key(paste.content, key)
+
+
+def unlock(paste, password):
+    """
+    Decrypt a password-encrypted paste and remember its key for this session.
+
+    Returns:
+        str: The decrypted content, or None if the password is wrong
+    """
+    if not password or not paste.encryption_salt:
+        return None
+    key = derive_key(password, paste.encryption_salt)
+    content = _decrypt(paste, key) if key else None
+    if content is not None:
+        key_cache.set(_cache_key(paste, create=True), key)
+    return content
+
+
+def unlocked_content(paste):
+    """
+    Decrypt a paste unlocked earlier in this session without deriving its key.
+
+    Returns:
+        str: The decrypted content, or None if the key is no longer cached
+    """
+    cache_key = _cache_key(paste)
+    key = key_cache.get(cache_key) if cache_key else None
+    if key is None:
+        return None
+    content = _decrypt(paste, key)
+    if content is None:
+        key_cache.pop(cache_key)
+    return content
+
+
+def forget(paste):
+    """Drop this session's cached key for ``paste``"""
+    cache_key = _cache_key(paste)
+    if cache_key:
+        key_cache.pop(cache_key)
+
+
+def session_key(paste):
+    """
+    The key that decrypts a stream-encrypted paste for this request: the
+    cached key of an unlocked password paste, or the random key from the
+    link (which the routes put in encryption_salt).
+    """
+    if paste.encryption_method in PASSWORD_METHODS:
+        cache_key = _cache_key(paste)
+        return key_cache.get(cache_key) if cache_key else None
+    return paste.encryption_salt
+
+
+def get_session_content(paste):
+    """
+    Content of an encrypted paste the session has unlocked.
+
+    Password-encrypted pastes use the cached key, stream-encrypted pastes
+    with a random key the key from the link; Fernet random-key pastes
+    decrypt as before with paste.get_content().
+    """
+    if paste.encryption_method in PASSWORD_METHODS:
+        return unlocked_content(paste)
+    if paste.encryption_method in STREAM_METHODS:
+        key = session_key(paste)
+        return read_paste_text(paste, key) if key else None
+    return paste.get_content()
@@ -0,0 +1,295 @@
+"""
+In-process scheduler that deletes pastes as they expire.
+
+One process in the deployment is elected leader through a database advisory
+lock (a lock file next to the database on SQLite). The leader keeps a
+min-heap of (expires_at, paste_id) covering only the next EXPIRY_WINDOW
+seconds, refilled from the pastes.expires_at index every EXPIRY_REFRESH
+seconds, and sleeps until the earliest entry is due. It then deletes every
+expired paste in small chunks through utils.paste_pruning, so pastes are
+gone within a second or two of their expiry rather than up to a cron
+interval later.
+
+Pastes created in the leader's process are pushed onto the heap when their
+transaction commits; those created on other nodes are picked up by the next
+refresh. prune_expired.py stays useful as a backstop.
+"""
+
+import os
+import heapq
+import zlib
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, Integer, text
+
+from utils.paste_pruning import PastePruner
+
+logger = logging.getLogger(__name__)
+
+# Seconds of upcoming expirations held in memory
+WINDOW = int(os.environ.get('EXPIRY_WINDOW', 3600))
+# Seconds between reloads of the window from the database
+REFRESH = int(os.environ.get('EXPIRY_REFRESH', 60))
+# Pastes deleted per transaction
+BATCH_SIZE = int(os.environ.get('EXPIRY_BATCH_SIZE', 100))
+# Upper bound on heap entries; a crowded window is shortened to fit
+WINDOW_LIMIT = int(os.environ.get('EXPIRY_WINDOW_LIMIT', 10000))
+# Seconds a follower waits before trying to become leader again
+LEADER_RETRY = 30
+
+ADVISORY_LOCK_KEY = zlib.crc32(b'flaskbin.expiry_scheduler')
+
+
+class PostgresLeaderLock:
+    """Session-level pg_try_advisory_lock held on a dedicated connection"""
+
+    def __init__(self, engine, key=ADVISORY_LOCK_KEY):
+        self.engine = engine
+        self.key = key
+        self.conn = None
+
+    def acquire(self):
+        """True if this process holds the lock; checks the connection is alive"""
+        if self.conn is not None:
+            try:
+                self.conn.execute(text("SELECT 1"))
+                return True
+            except Exception as e:
+                logger.warning(f"Lost the expiry scheduler lock: {e}")
+                self.release()
+        conn = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            if conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': self.key}).scalar():
+                self.conn = conn
+                return True
+        except Exception as e:
+            logger.warning(f"Could not try the expiry scheduler lock: {e}")
+        conn.close()
+        return False
+
+    def release(self):
+        if self.conn is not None:
+            try:
+                self.conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': self.key})
+            except Exception:
+                pass
+            self.conn.close()
+            self.conn = None
+
+
+class FileLeaderLock:
+    """
+    Exclusive flock on a file beside the SQLite database.
+
+    SQLite has no advisory locks, but every worker sharing the database file
+    is on the same host. Without fcntl (Windows) the process is always leader.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def acquire(self):
+        if self.handle is not None:
+            return True
+        try:
+            import fcntl
+        except ImportError:
+            return True
+        handle = open(self.path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self.handle = handle
+        return True
+
+    def release(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+
+def leader_lock_for(engine):
+    if engine.dialect.name == 'postgresql':
+        return PostgresLeaderLock(engine)
+    database = engine.url.database
+    if not database or database == ':memory:':
+        database = 'flaskbin'
+    return FileLeaderLock(f"{database}.expiry.lock")
+
+
+class ExpiryScheduler:
+    """
+    Min-heap of upcoming expirations driving a chunked pruner.
+
+    Args:
+        engine: SQLAlchemy engine
+        lock: Leader lock (default: chosen for the engine's dialect)
+        window: Seconds of upcoming expirations to hold
+        refresh: Seconds between window reloads
+        batch_size: Pastes deleted per transaction
+        limit: Maximum heap entries per window
+    """
+
+    def __init__(self, engine, lock=None, window=WINDOW, refresh=REFRESH,
+                 batch_size=BATCH_SIZE, limit=WINDOW_LIMIT):
+        self.engine = engine
+        self.lock = lock or leader_lock_for(engine)
+        self.window = timedelta(seconds=window)
+        self.refresh = timedelta(seconds=refresh)
+        self.limit = limit
+        self.batch_size = batch_size
+        self.pruner = None
+
+        self._heap = []
+        self._heap_lock = threading.Lock()
+        self._loaded_until = None
+        self._next_refresh = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.is_leader = False
+        self.deleted = 0
+
+    def load_window(self, now):
+        """Replace the heap with the expirations due before now + window"""
+        end = now + self.window
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT expires_at, id FROM pastes
+                WHERE expires_at IS NOT NULL AND expires_at < :end
+                ORDER BY expires_at
+                LIMIT :limit
+            """).columns(expires_at=DateTime, id=Integer), {'end': end, 'limit': self.limit}).fetchall()
+        heap = [(expires_at, paste_id) for expires_at, paste_id in rows]
+        if len(heap) == self.limit:
+            # Only the first `limit` entries fit; the rest wait for a later load
+            end = heap[-1][0]
+        with self._heap_lock:
+            self._heap = heap  # already in heap order
+            self._loaded_until = end
+        self._next_refresh = now + self.refresh
+
+    def schedule(self, paste_id, expires_at):
+        """Track a paste committed in this process if it expires inside the window"""
+        with self._heap_lock:
+            if not self.is_leader or self._loaded_until is None or expires_at >= self._loaded_until:
+                return
+            heapq.heappush(self._heap, (expires_at, paste_id))
+            earliest = self._heap[0][0] == expires_at
+        if earliest:
+            self._wakeup.set()
+
+    def pop_due(self, now):
+        """Remove and return the heap entries due at ``now``"""
+        due = []
+        with self._heap_lock:
+            while self._heap and self._heap[0][0] < now:
+                due.append(heapq.heappop(self._heap))
+        return due
+
+    def seconds_until_next(self, now):
+        with self._heap_lock:
+            next_due = self._heap[0][0] if self._heap else self._next_refresh
+        next_event = min(next_due, self._next_refresh)
+        return max((next_event - now).total_seconds(), 0)
+
+    def tick(self, now=None):
+        """
+        One scheduler step: refresh the window if due, prune if anything expired.
+
+        Returns:
+            float: Seconds to sleep before the next step
+        """
+        now = now or datetime.utcnow()
+        if self._next_refresh is None or now >= self._next_refresh:
+            self.load_window(now)
+        due = self.pop_due(now)
+        if due:
+            if self.pruner is None:
+                self.pruner = PastePruner(self.engine, batch_size=self.batch_size)
+            deleted = self.pruner.run(now=now)
+            self.deleted += deleted
+            lag = (now - due[0][0]).total_seconds()
+            logger.info(f"Expired {deleted} pastes ({len(due)} scheduled, oldest {lag:.1f}s overdue)")
+        return self.seconds_until_next(datetime.utcnow())
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                if not self.lock.acquire():
+                    if self.is_leader:
+                        logger.info("Expiry scheduler lost leadership")
+                    self.is_leader = False
+                    self._stopped.wait(LEADER_RETRY)
+                    continue
+                if not self.is_leader:
+                    logger.info("Expiry scheduler elected leader")
+                    self.is_leader = True
+                    self._next_refresh = None
+                delay = self.tick()
+            except Exception as e:
+                logger.error(f"Expiry scheduler step failed: {e}")
+                delay = LEADER_RETRY
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+        self.lock.release()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='expiry-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_scheduler = None
+_start_lock = threading.Lock()
+
+
+def register_expiry_scheduler(app, engine):
+    """
+    Run the scheduler in this process once it serves its first request.
+
+    Starting on the first request (after any pre-fork) keeps scripts that
+    import the app from running it. New pastes committed here are pushed to
+    the heap directly.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    global _scheduler
+    if _scheduler is not None:
+        return
+    _scheduler = ExpiryScheduler(engine)
+
+    @app.before_request
+    def start_expiry_scheduler():
+        if _scheduler._thread is None:
+            with _start_lock:
+                _scheduler.start()
+
+    def collect(session, flush_context):
+        pending = session.info.setdefault('expiry_pending', [])
+        for paste in session.new:
+            if getattr(paste, '__tablename__', None) == 'pastes' and paste.expires_at:
+                pending.append((paste.id, paste.expires_at))
+
+    def apply(session):
+        for paste_id, expires_at in session.info.pop('expiry_pending', ()):
+            _scheduler.schedule(paste_id, expires_at)
+
+    def discard(session, previous_transaction):
+        session.info.pop('expiry_pending', None)
+
+    event.listen(Session, 'after_flush', collect)
+    event.listen(Session, 'after_commit', apply)
+    event.listen(Session, 'after_soft_rollback', discard)
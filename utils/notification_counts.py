@@ -0,0 +1,67 @@
+"""
+Cached per-user unread notification counts.
+
+Reads are served from an in-process cache and fall back to an indexed COUNT
+on a miss. The cache is written through: every committed change to a user's
+notifications (create, mark read, mark all read, delete) publishes the new
+count through the notification broker (utils.notification_events), and each
+worker's broker listener stores it. With the postgres transport that keeps
+every worker's copy current, and entries are trusted for 10 minutes by
+default. The local transport only reaches the worker that made the change,
+so there the default is 5 seconds, bounding how long another worker's badge
+can be stale. NOTIFICATION_COUNT_TTL overrides either; any drift is
+reconciled from the database on the next read after expiry.
+"""
+
+import os
+
+from sqlalchemy import text
+
+from utils.ttl_cache import TTLCache
+
+# Seconds a cached count is trusted before it is recounted: long only when
+# changes reach every worker through a shared transport
+SHARED_TRANSPORT = os.environ.get('NOTIFICATION_TRANSPORT', 'local') == 'postgres'
+COUNT_TTL = int(os.environ.get('NOTIFICATION_COUNT_TTL', 600 if SHARED_TRANSPORT else 5))
+
+_counts = TTLCache(maxsize=int(os.environ.get('NOTIFICATION_COUNT_CACHE_SIZE', 50000)), ttl=COUNT_TTL)
+
+
+def count_unread(conn, user_id):
+    """Count a user's unread notifications in the database"""
+    return conn.execute(text(
+        "SELECT COUNT(*) FROM notifications WHERE user_id = :user_id AND read = :read"
+    ), {'user_id': user_id, 'read': False}).scalar()
+
+
+def get_unread_count(user_id, conn=None):
+    """
+    A user's unread notification count, from the cache when possible.
+
+    Args:
+        user_id: The user
+        conn: Connection for the fallback count (default: the db session's)
+    """
+    cached = _counts.get(user_id)
+    if cached is not None:
+        return cached
+    if conn is None:
+        from app import db
+        conn = db.session.connection()
+    unread = count_unread(conn, user_id)
+    _counts.set(user_id, unread)
+    return unread
+
+
+def store_unread_count(user_id, unread):
+    _counts.set(user_id, unread)
+
+
+def forget_unread_count(user_id):
+    _counts.pop(user_id)
+
+
+def cache_listener(message):
+    """Broker listener that keeps the cache in step with published counts"""
+    if message['event'] == 'count':
+        store_unread_count(message['user_id'], message['data']['count'])
@@ -0,0 +1,371 @@
+"""
+Push channel for notification events.
+
+Committed notification writes are published to a NotificationBroker, which
+fans them out to the server-sent event streams open in this worker. Workers
+are joined by a pluggable transport:
+
+* ``local``: no cross-worker delivery. Right for a single worker process.
+* ``postgres``: LISTEN/NOTIFY on the application database. Every worker
+  listens on one channel, and publishing is a pg_notify() call, so events
+  reach streams held by any worker on any node.
+
+Further transports can be registered in TRANSPORTS. The transport is picked
+with the NOTIFICATION_TRANSPORT environment variable (default ``local``).
+
+Two event types are published per user:
+
+* ``count``: {"count": unread}, whenever the unread count may have changed
+* ``notification``: a new notification's id, type, message and paste_id
+
+A stream always starts with the current count, so a client that reconnects
+after missing events is back in sync immediately. Published counts also keep
+every worker's unread count cache current (utils.notification_counts).
+"""
+
+import os
+import json
+import time
+import queue
+import select
+import logging
+import threading
+from itertools import count as sequence
+
+from utils.notification_counts import cache_listener, count_unread, store_unread_count
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'flaskbin_notifications'
+
+# Seconds between heartbeat comments on an idle stream
+HEARTBEAT_INTERVAL = int(os.environ.get('NOTIFICATION_HEARTBEAT', 25))
+
+# Seconds a stream is held open before the client is asked to reconnect,
+# which bounds how long a worker keeps serving a client after a deploy
+STREAM_MAX_AGE = int(os.environ.get('NOTIFICATION_STREAM_MAX_AGE', 300))
+
+# Milliseconds the browser waits before reconnecting
+RETRY_MS = 5000
+
+# Events buffered per stream; a stream that falls further behind is told to
+# resync instead of growing without bound
+QUEUE_SIZE = 32
+
+
+class Subscription:
+    """One open stream's queue of pending events"""
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Next event, or None after ``timeout`` seconds without one"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class NotificationBroker:
+    """In-process pub/sub from user id to that user's open streams"""
+
+    def __init__(self, transport=None):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._ids = sequence(1)
+        self._listeners = []
+        self.transport = transport or LocalTransport()
+        self.transport.start(self.deliver)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def add_listener(self, listener):
+        """Call ``listener(message)`` for every message, subscribed or not"""
+        self._listeners.append(listener)
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id, event, data):
+        """Send an event to every stream of ``user_id`` on every worker"""
+        self.transport.publish({'user_id': user_id, 'event': event, 'data': data})
+
+    def deliver(self, message):
+        """Hand a message from the transport to this worker's listeners and streams"""
+        for listener in self._listeners:
+            listener(message)
+        with self._lock:
+            subscribers = list(self._subscribers.get(message['user_id'], ()))
+        if not subscribers:
+            return
+        event = (next(self._ids), message['event'], message['data'])
+        for subscription in subscribers:
+            subscription.put(event)
+
+
+class LocalTransport:
+    """Delivers straight to this worker's broker"""
+
+    name = 'local'
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, message):
+        self._deliver(message)
+
+
+class PostgresTransport:
+    """
+    Cross-worker delivery over PostgreSQL LISTEN/NOTIFY.
+
+    A daemon thread holds one LISTEN connection per worker and reconnects
+    after errors; messages published by this worker come back through it
+    like any other.
+    """
+
+    name = 'postgres'
+
+    def __init__(self, database_url=None):
+        self.database_url = database_url or os.environ.get('DATABASE_URL', '')
+        if self.database_url.startswith('postgres://'):
+            self.database_url = self.database_url.replace('postgres://', 'postgresql://', 1)
+        self._publish_lock = threading.Lock()
+        self._publish_conn = None
+
+    def start(self, deliver):
+        self._deliver = deliver
+        thread = threading.Thread(target=self._listen, name='notification-listener', daemon=True)
+        thread.start()
+
+    def _connect(self):
+        import psycopg2
+        conn = psycopg2.connect(self.database_url)
+        conn.set_session(autocommit=True)
+        return conn
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = self._connect()
+                conn.cursor().execute(f"LISTEN {CHANNEL}")
+                while True:
+                    if select.select([conn], [], [], HEARTBEAT_INTERVAL) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            self._deliver(json.loads(notify.payload))
+                        except Exception as e:
+                            logger.warning(f"Dropping malformed notification event: {e}")
+            except Exception as e:
+                logger.error(f"Notification listener failed, reconnecting: {e}")
+                if conn is not None:
+                    conn.close()
+                time.sleep(RETRY_MS / 1000)
+
+    def publish(self, message):
+        payload = json.dumps(message)
+        with self._publish_lock:
+            try:
+                if self._publish_conn is None or self._publish_conn.closed:
+                    self._publish_conn = self._connect()
+                self._publish_conn.cursor().execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+            except Exception as e:
+                # Clients resync on their next reconnect or poll
+                logger.error(f"Failed to publish notification event: {e}")
+                self._publish_conn = None
+
+
+TRANSPORTS = {
+    LocalTransport.name: LocalTransport,
+    PostgresTransport.name: PostgresTransport,
+}
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The worker's broker, created with the configured transport on first use"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                name = os.environ.get('NOTIFICATION_TRANSPORT', 'local')
+                if name not in TRANSPORTS:
+                    logger.warning(f"Unknown NOTIFICATION_TRANSPORT '{name}', using local")
+                    name = 'local'
+                _broker = NotificationBroker(TRANSPORTS[name]())
+                _broker.add_listener(cache_listener)
+    return _broker
+
+
+def format_event(event_id, event, data):
+    """Serialise one server-sent event"""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream(subscription, initial_count, heartbeat=None, max_age=None):
+    """
+    Generate a user's SSE stream.
+
+    Starts with the current unread count, then relays published events and
+    sends a heartbeat comment whenever the stream has been idle for
+    ``heartbeat`` seconds. Ends after ``max_age`` seconds so the browser
+    reconnects (possibly to another worker); EventSource does that on its own
+    after the advertised retry delay.
+    """
+    heartbeat = heartbeat or HEARTBEAT_INTERVAL
+    deadline = time.monotonic() + (max_age or STREAM_MAX_AGE)
+    try:
+        yield f"retry: {RETRY_MS}\n"
+        yield format_event(0, 'count', {'count': initial_count})
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            item = subscription.get(timeout=min(heartbeat, remaining))
+            if subscription.overflowed:
+                # Events were dropped; tell the client to refetch the count
+                subscription.overflowed = False
+                yield format_event(0, 'resync', {})
+            if item is None:
+                yield ": heartbeat\n\n"
+            else:
+                yield format_event(*item)
+    finally:
+        subscription.close()
+
+
+def collect_notification_changes(session):
+    """
+    Users whose unread count an updated or deleted notification may change.
+
+    Must run in before_flush, while deleted rows can still be loaded.
+    """
+    from sqlalchemy import inspect
+
+    touched = set()
+    for obj in session.dirty:
+        if getattr(obj, '__tablename__', None) == 'notifications':
+            if inspect(obj).attrs.read.history.has_changes():
+                touched.add(obj.user_id)
+    for obj in session.deleted:
+        if getattr(obj, '__tablename__', None) == 'notifications':
+            touched.add(obj.user_id)
+    return touched
+
+
+def collect_new_notifications(session):
+    """
+    Payloads of the notifications inserted by the current flush.
+
+    Must run in after_flush, once ids have been assigned.
+
+    Returns:
+        list: (user_id, payload) pairs
+    """
+    return [
+        (obj.user_id, {
+            'id': obj.id,
+            'type': obj.type,
+            'message': obj.message,
+            'paste_id': obj.paste_id,
+        })
+        for obj in session.new
+        if getattr(obj, '__tablename__', None) == 'notifications'
+    ]
+
+
+def publish_unread_count(conn, user_id):
+    """Recount ``user_id``'s unread notifications and publish the result"""
+    unread = count_unread(conn, user_id)
+    store_unread_count(user_id, unread)
+    get_broker().publish(user_id, 'count', {'count': unread})
+
+
+def _before_flush(session, flush_context, instances):
+    touched = collect_notification_changes(session)
+    if touched:
+        session.info.setdefault('notification_users', set()).update(touched)
+
+
+def _after_flush(session, flush_context):
+    created = collect_new_notifications(session)
+    touched = session.info.pop('notification_users', set())
+    touched.update(user_id for user_id, _ in created)
+    if not touched:
+        return
+    pending = session.info.setdefault('notification_events', {})
+    conn = session.connection()
+    for user_id in touched:
+        pending[(user_id, 'count')] = {'count': count_unread(conn, user_id)}
+    for user_id, payload in created:
+        pending[(user_id, 'notification', payload['id'])] = payload
+
+
+def _after_commit(session):
+    pending = session.info.pop('notification_events', None)
+    if not pending:
+        return
+    broker = get_broker()
+    # New notifications first, so clients see them before the count
+    for key, data in sorted(pending.items(), key=lambda item: item[0][1] == 'count'):
+        if key[1] == 'count':
+            store_unread_count(key[0], data['count'])
+        broker.publish(key[0], key[1], data)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('notification_users', None)
+    session.info.pop('notification_events', None)
+
+
+def register_notification_event_hooks():
+    """
+    Publish notification events once the writes behind them are committed.
+
+    Counts are read on the flushing connection in after_flush so they include
+    the flush's own writes, stored in this worker's count cache and published
+    after the commit; everything is dropped if the transaction rolls back.
+    The listeners are module-level functions, so they are added only once
+    however many apps the process creates.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    if event.contains(Session, 'after_flush', _after_flush):
+        return
+    event.listen(Session, 'before_flush', _before_flush)
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
@@ -0,0 +1,80 @@
+"""
+Retention policy for read notifications.
+
+Read notifications older than NOTIFICATION_RETENTION_DAYS are deleted, or
+moved to notifications_archive first, in small batches that each commit on
+their own, so the inbox tables are never locked for long. Unread
+notifications are never touched, so unread counts do not change.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, text
+
+RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90))
+
+COLUMNS = 'id, user_id, sender_id, paste_id, comment_id, type, message, read, created_at'
+
+
+def _ids(statement):
+    return text(statement).bindparams(bindparam('ids', expanding=True))
+
+
+def prune_read_notifications(engine, days=None, batch_size=1000, archive=False,
+                             dry_run=False, pause=0, progress=None):
+    """
+    Delete (or archive) read notifications older than ``days`` days.
+
+    Batches are picked oldest first through the (read, created_at) index. On
+    PostgreSQL rows locked by a concurrent run are skipped, so several nodes
+    can prune at once without deleting or archiving a row twice.
+
+    Args:
+        engine: SQLAlchemy engine
+        days: Age cutoff (default: NOTIFICATION_RETENTION_DAYS)
+        batch_size: Rows per batch and transaction
+        archive: Copy rows into notifications_archive before deleting them
+        dry_run: Only count what would be removed
+        pause: Seconds to sleep between batches
+        progress: Optional callable(total_so_far) called after each batch
+
+    Returns:
+        int: Number of notifications removed (or that would be removed)
+    """
+    cutoff = datetime.utcnow() - timedelta(days=RETENTION_DAYS if days is None else days)
+    params = {'read': True, 'cutoff': cutoff}
+
+    if dry_run:
+        with engine.connect() as conn:
+            return conn.execute(text(
+                "SELECT COUNT(*) FROM notifications WHERE read = :read AND created_at < :cutoff"
+            ), params).scalar()
+
+    skip_locked = " FOR UPDATE SKIP LOCKED" if engine.dialect.name == 'postgresql' else ""
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            ids = conn.execute(text(f"""
+                SELECT id FROM notifications
+                WHERE read = :read AND created_at < :cutoff
+                ORDER BY created_at
+                LIMIT :batch_size{skip_locked}
+            """), dict(params, batch_size=batch_size)).scalars().all()
+            if not ids:
+                break
+            if archive:
+                conn.execute(_ids(f"""
+                    INSERT INTO notifications_archive ({COLUMNS}, archived_at)
+                    SELECT {COLUMNS}, :now FROM notifications WHERE id IN :ids
+                """), {'ids': ids, 'now': datetime.utcnow()})
+            conn.execute(_ids("DELETE FROM notifications WHERE id IN :ids"), {'ids': ids})
+        total += len(ids)
+        if progress:
+            progress(total)
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return total
@@ -0,0 +1,159 @@
+"""
+Batched notification writer.
+
+Routes queue the notifications they produce with queue_notification() or
+queue_fan_out() instead of committing one row per recipient. The queue lives
+on flask.g; when the request ends without an error it is handed to a
+background thread, which inserts every row in one multi-row INSERT, then
+publishes the new notifications and the recipients' unread counts. The
+response is never held up by notification I/O.
+
+Queue notifications only after the request's own transaction has committed,
+since the batch is written on a separate connection. Jobs outside a request
+build a NotificationBatch and call write() themselves.
+"""
+
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, Text, bindparam, text
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement, well under SQLite's bound parameter limit
+CHUNK_SIZE = 1000
+
+notifications = Table(
+    'notifications', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, nullable=False),
+    Column('sender_id', Integer),
+    Column('paste_id', Integer),
+    Column('comment_id', Integer),
+    Column('type', String(50), nullable=False),
+    Column('message', Text, nullable=False),
+    Column('read', Boolean, default=False),
+    Column('created_at', DateTime),
+)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notification-writer')
+
+
+class NotificationBatch:
+    """Notifications waiting to be inserted together"""
+
+    def __init__(self):
+        self.rows = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, user_id, type, message, sender_id=None, paste_id=None, comment_id=None):
+        """Queue one notification"""
+        self.rows.append({
+            'user_id': user_id,
+            'sender_id': sender_id,
+            'paste_id': paste_id,
+            'comment_id': comment_id,
+            'type': type,
+            'message': message,
+            'read': False,
+            'created_at': datetime.utcnow(),
+        })
+
+    def fan_out(self, user_ids, type, message, sender_id=None, paste_id=None, comment_id=None):
+        """Queue the same notification for every user in ``user_ids`` (sender excluded)"""
+        for user_id in dict.fromkeys(user_ids):
+            if user_id and user_id != sender_id:
+                self.add(user_id, type, message, sender_id, paste_id, comment_id)
+
+    def write(self, conn):
+        """
+        Insert the queued rows on ``conn`` and empty the batch.
+
+        Returns:
+            list: (user_id, payload) pairs for the inserted notifications
+        """
+        rows, self.rows = self.rows, []
+        created = []
+        returning = conn.dialect.insert_returning
+        for start in range(0, len(rows), CHUNK_SIZE):
+            chunk = rows[start:start + CHUNK_SIZE]
+            statement = notifications.insert().values(chunk)
+            if not returning:
+                conn.execute(statement)
+                continue
+            result = conn.execute(statement.returning(
+                notifications.c.id, notifications.c.user_id, notifications.c.type,
+                notifications.c.message, notifications.c.paste_id,
+            ))
+            created.extend(
+                (row.user_id, {'id': row.id, 'type': row.type, 'message': row.message, 'paste_id': row.paste_id})
+                for row in result
+            )
+        return created
+
+
+def count_unread_many(conn, user_ids):
+    """Unread counts for several users in one grouped query"""
+    rows = conn.execute(text("""
+        SELECT user_id, COUNT(*) FROM notifications
+        WHERE user_id IN :user_ids AND read = :read
+        GROUP BY user_id
+    """).bindparams(bindparam('user_ids', expanding=True)), {'user_ids': list(user_ids), 'read': False})
+    counts = dict.fromkeys(user_ids, 0)
+    counts.update(rows.fetchall())
+    return counts
+
+
+def write_batch(engine, batch):
+    """Insert a batch in its own transaction and publish the results"""
+    from utils.notification_events import get_broker
+    from utils.notification_counts import store_unread_count
+
+    recipients = {row['user_id'] for row in batch.rows}
+    try:
+        with engine.begin() as conn:
+            created = batch.write(conn)
+        with engine.connect() as conn:
+            counts = count_unread_many(conn, recipients)
+    except Exception as e:
+        logger.error(f"Failed to write {len(recipients)} recipients' notifications: {e}")
+        return
+
+    broker = get_broker()
+    for user_id, payload in created:
+        broker.publish(user_id, 'notification', payload)
+    for user_id, unread in counts.items():
+        store_unread_count(user_id, unread)
+        broker.publish(user_id, 'count', {'count': unread})
+
+
+def current_batch():
+    """The current request's batch, created on first use"""
+    from flask import g
+    if 'notification_batch' not in g:
+        g.notification_batch = NotificationBatch()
+    return g.notification_batch
+
+
+def queue_notification(user_id, type, message, sender_id=None, paste_id=None, comment_id=None):
+    """Queue a notification to be written after the request"""
+    current_batch().add(user_id, type, message, sender_id, paste_id, comment_id)
+
+
+def queue_fan_out(user_ids, type, message, sender_id=None, paste_id=None, comment_id=None):
+    """Queue one notification per recipient to be written after the request"""
+    current_batch().fan_out(user_ids, type, message, sender_id, paste_id, comment_id)
+
+
+def register_notification_writer(app, engine):
+    """Hand each request's queued notifications to the writer thread"""
+    from flask import g
+
+    @app.teardown_request
+    def submit_notification_batch(error):
+        batch = g.pop('notification_batch', None)
+        if batch and error is None:
+            _executor.submit(write_batch, engine, batch)
@@ -0,0 +1,58 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor names the last row of the previous page by its (created_at, id)
+sort key, so fetching the next page is an index range scan from that key
+instead of an OFFSET that reads and discards every earlier row. Cursors are
+opaque, URL-safe strings; malformed ones are treated as "first page".
+"""
+
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Returns:
+        tuple: (created_at, id), or None for a missing or malformed cursor
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        created_at, row_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def keyset_page(query, created_column, id_column, cursor, per_page):
+    """
+    One page of ``query`` in (created_at DESC, id DESC) order.
+
+    Returns:
+        tuple: (rows, cursor for the next page or None)
+    """
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, row_id = position
+        # The redundant upper bound lets the planner seek into the index
+        # rather than scanning it to evaluate the OR
+        query = query.filter(created_column <= created_at, or_(
+            created_column < created_at,
+            and_(created_column == created_at, id_column < row_id),
+        ))
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
@@ -0,0 +1,221 @@
+"""
+Set-based removal of expired pastes.
+
+Expired pastes are deleted in chunks, oldest expiry first. Each chunk is one
+short transaction that corrects the authors' total_pastes/total_views and the
+collections' paste_count in SQL, deletes the rows that reference the chunk's
+pastes, then the pastes themselves, and commits. Nothing is loaded into
+Python beyond the chunk's ids.
+
+Every transaction runs under a lock timeout and a statement timeout, so a
+chunk that cannot get its locks gives up quickly instead of queueing behind
+(and in front of) live traffic. On PostgreSQL chunks are claimed with
+FOR UPDATE SKIP LOCKED, so several nodes can prune at once and never touch
+the same paste; on SQLite the database-wide write lock serialises them.
+"""
+
+import time
+import logging
+from datetime import datetime
+
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# (table, column) pairs that reference pastes.id, in delete order. Tables
+# that do not exist in this deployment are skipped.
+PASTE_DEPENDENTS = [
+    ('notifications', 'paste_id'),
+    ('flagged_pastes', 'paste_id'),
+    ('paste_views', 'paste_id'),
+    ('paste_view_daily', 'paste_id'),
+    ('paste_tags', 'paste_id'),
+    ('paste_symbols', 'paste_id'),
+    ('paste_revisions', 'paste_id'),
+    ('summary_jobs', 'paste_id'),
+    ('paste_cipher_segments', 'paste_id'),
+]
+
+# (table, column) pairs that reference comments.id; cleared before the
+# comments on the chunk's pastes are deleted
+COMMENT_DEPENDENTS = [
+    ('notifications', 'comment_id'),
+    ('flagged_comments', 'comment_id'),
+]
+
+EXPIRED = "expires_at IS NOT NULL AND expires_at < :now"
+
+# Author corrections, clamped at zero like the per-paste code they replace
+AUTHOR_STATS_UPDATE = f"""
+    UPDATE users SET
+        total_pastes = CASE WHEN users.total_pastes > expired.pastes
+                            THEN users.total_pastes - expired.pastes ELSE 0 END,
+        total_views = CASE WHEN users.total_views > expired.views
+                           THEN users.total_views - expired.views ELSE 0 END
+    FROM (
+        SELECT user_id, COUNT(*) AS pastes, COALESCE(SUM(views), 0) AS views
+        FROM pastes
+        WHERE id IN :ids AND user_id IS NOT NULL AND {EXPIRED}
+        GROUP BY user_id
+    ) AS expired
+    WHERE users.id = expired.user_id
+"""
+
+COLLECTION_COUNT_UPDATE = f"""
+    UPDATE paste_collections SET paste_count = CASE
+        WHEN paste_collections.paste_count > expired.pastes
+        THEN paste_collections.paste_count - expired.pastes ELSE 0 END
+    FROM (
+        SELECT collection_id, COUNT(*) AS pastes
+        FROM pastes
+        WHERE id IN :ids AND collection_id IS NOT NULL AND {EXPIRED}
+        GROUP BY collection_id
+    ) AS expired
+    WHERE paste_collections.id = expired.collection_id
+"""
+
+
+def _ids(statement):
+    return text(statement).bindparams(bindparam('ids', expanding=True))
+
+
+def _existing(engine, pairs):
+    """The (table, column) pairs present in this database"""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    columns = {}
+    found = []
+    for table, column in pairs:
+        if table not in tables:
+            continue
+        if table not in columns:
+            columns[table] = {c['name'] for c in inspector.get_columns(table)}
+        if column in columns[table]:
+            found.append((table, column))
+    return found
+
+
+def set_timeouts(conn, lock_timeout, statement_timeout):
+    """
+    Bound how long the current transaction waits for locks and runs a statement.
+
+    PostgreSQL takes both as SET LOCAL, so they end with the transaction.
+    SQLite has no statement timeout; its busy timeout bounds the wait for the
+    write lock.
+    """
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout * 1000)}"))
+        conn.execute(text(f"SET LOCAL statement_timeout = {int(statement_timeout * 1000)}"))
+    elif conn.dialect.name == 'sqlite':
+        conn.execute(text(f"PRAGMA busy_timeout = {int(lock_timeout * 1000)}"))
+
+
+def count_expired(conn, now):
+    return conn.execute(text(f"SELECT COUNT(*) FROM pastes WHERE {EXPIRED}"), {'now': now}).scalar()
+
+
+class PastePruner:
+    """
+    Deletes expired pastes one chunk per transaction.
+
+    Args:
+        engine: SQLAlchemy engine
+        batch_size: Pastes per chunk and transaction
+        lock_timeout: Seconds a chunk waits for a lock before it is retried
+        statement_timeout: Seconds any single statement may run
+        max_retries: Consecutive timed out chunks before the run gives up
+    """
+
+    def __init__(self, engine, batch_size=500, lock_timeout=5, statement_timeout=60, max_retries=5):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.lock_timeout = lock_timeout
+        self.statement_timeout = statement_timeout
+        self.max_retries = max_retries
+        self.is_postgres = engine.dialect.name == 'postgresql'
+
+        self.paste_dependents = _existing(engine, PASTE_DEPENDENTS)
+        self.comment_dependents = _existing(engine, COMMENT_DEPENDENTS)
+        self.has_comments = bool(_existing(engine, [('comments', 'paste_id')]))
+        self.has_forks = bool(_existing(engine, [('pastes', 'forked_from_id')]))
+        self.has_collection_counts = bool(_existing(engine, [('paste_collections', 'paste_count')]))
+
+    def claim(self, conn, now):
+        """Ids of the next chunk; on PostgreSQL the rows stay locked until commit"""
+        skip_locked = " FOR UPDATE SKIP LOCKED" if self.is_postgres else ""
+        return conn.execute(text(f"""
+            SELECT id FROM pastes WHERE {EXPIRED}
+            ORDER BY expires_at
+            LIMIT :batch_size{skip_locked}
+        """), {'now': now, 'batch_size': self.batch_size}).scalars().all()
+
+    def delete_chunk(self, conn, ids, now):
+        """
+        Remove the pastes in ``ids`` that are still expired, with their dependents.
+
+        Returns:
+            int: Number of pastes deleted
+        """
+        params = {'ids': ids, 'now': now}
+        conn.execute(_ids(AUTHOR_STATS_UPDATE), params)
+        if self.has_collection_counts:
+            conn.execute(_ids(COLLECTION_COUNT_UPDATE), params)
+
+        # Re-checking the expiry keeps a paste whose expiry was extended after
+        # the claim (possible on SQLite, where the claim takes no row locks)
+        expired = f"SELECT id FROM pastes WHERE id IN :ids AND {EXPIRED}"
+        if self.has_comments:
+            comments = f"SELECT id FROM comments WHERE paste_id IN ({expired})"
+            for table, column in self.comment_dependents:
+                conn.execute(_ids(f"DELETE FROM {table} WHERE {column} IN ({comments})"), params)
+            conn.execute(_ids(f"DELETE FROM comments WHERE paste_id IN ({expired})"), params)
+        for table, column in self.paste_dependents:
+            conn.execute(_ids(f"DELETE FROM {table} WHERE {column} IN ({expired})"), params)
+        if self.has_forks:
+            conn.execute(_ids(f"UPDATE pastes SET forked_from_id = NULL WHERE forked_from_id IN ({expired})"), params)
+
+        return conn.execute(_ids(f"DELETE FROM pastes WHERE id IN :ids AND {EXPIRED}"), params).rowcount
+
+    def run(self, now=None, pause=0, progress=None):
+        """
+        Prune until no expired paste is left.
+
+        Args:
+            now: Expiry cutoff (default: the current UTC time, fixed for the run)
+            pause: Seconds to sleep between chunks
+            progress: Optional callable(deleted_so_far, chunk_seconds)
+
+        Returns:
+            int: Number of pastes deleted by this run
+        """
+        now = now or datetime.utcnow()
+        total = 0
+        retries = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                with self.engine.begin() as conn:
+                    set_timeouts(conn, self.lock_timeout, self.statement_timeout)
+                    ids = self.claim(conn, now)
+                    deleted = self.delete_chunk(conn, ids, now) if ids else 0
+            except OperationalError as e:
+                # Lock or statement timeout: the chunk rolled back as a whole
+                retries += 1
+                if retries > self.max_retries:
+                    logger.error(f"Giving up after {retries} timed out chunks: {e.orig}")
+                    raise
+                logger.warning(f"Chunk timed out ({e.orig}); retrying ({retries}/{self.max_retries})")
+                time.sleep(min(2 ** retries, 30))
+                continue
+            retries = 0
+            if not ids:
+                break
+            total += deleted
+            if progress:
+                progress(total, time.perf_counter() - started)
+            if len(ids) < self.batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+        return total
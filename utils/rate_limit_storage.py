@@ -0,0 +1,368 @@
+"""
+Rate limit storage shared by every worker on a node.
+
+MmapStorage is a ``limits`` storage backend (``mmap://<path>``) backed by a
+fixed-size table of counter slots in a memory-mapped file. All gunicorn
+workers on the node map the same file, so a limit is enforced once per node
+instead of once per worker, and counters survive restarts and deploys. It
+supports the fixed-window and sliding-window-counter strategies.
+
+Slots are found by open addressing on a 64-bit hash of the key. A check
+locks only that key's probe range, with a thread lock inside the process and
+an fcntl byte-range lock across processes, reads and writes the packed slot
+in place, and never allocates. When every slot in a range is live, the one
+closest to expiry is evicted.
+
+With ``?aggregator=host:port`` one process per node also reports its live
+counters to a RateLimitAggregator (rate_limit_aggregator.py) every second
+and stores the other nodes' counts for the same keys in the slots. Checks
+add those remote counts but never wait on the network, so limits hold
+across nodes to within one sync interval.
+
+Examples:
+    mmap:///var/run/flaskbin/ratelimit.bin
+    mmap:///var/run/flaskbin/ratelimit.bin?slots=262144&aggregator=10.0.0.5:7010
+"""
+
+import os
+import json
+import time
+import mmap
+import socket
+import struct
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from math import floor
+from urllib.parse import parse_qs, urlsplit
+
+from limits.storage import SlidingWindowCounterSupport, Storage
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process per file
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'flaskbin-ratelimit.bin')
+DEFAULT_SLOTS = 65536
+
+# Slots examined per key before the least useful one is evicted
+PROBE = 8
+
+HEADER = struct.Struct('<8sQ')
+MAGIC = b'FBRLIM01'
+HEADER_SIZE = 64
+
+# key hash, expires at, window number, count, previous window's count,
+# other nodes' count, other nodes' previous count
+SLOT = struct.Struct('<QdQIIII')
+EMPTY = (0, 0.0, 0, 0, 0, 0, 0)
+
+
+def key_hash(key):
+    # Never 0, which marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+
+@contextmanager
+def _range_lock(fd, offset, length):
+    if fcntl is None:
+        yield
+        return
+    fcntl.lockf(fd, fcntl.LOCK_EX, length, offset)
+    try:
+        yield
+    finally:
+        fcntl.lockf(fd, fcntl.LOCK_UN, length, offset)
+
+
+class SlotTable:
+    """Fixed-size table of counter slots in a shared file"""
+
+    def __init__(self, path, slots=DEFAULT_SLOTS):
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = HEADER_SIZE + slots * SLOT.size
+        with _range_lock(self.fd, 0, HEADER_SIZE):
+            if os.fstat(self.fd).st_size == 0:
+                os.ftruncate(self.fd, size)
+                os.pwrite(self.fd, HEADER.pack(MAGIC, slots), 0)
+            magic, slots = HEADER.unpack(os.pread(self.fd, HEADER.size, 0))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a rate limit table")
+        self.slots = slots
+        self.map = mmap.mmap(self.fd, HEADER_SIZE + slots * SLOT.size)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def probe(self, key_hash):
+        """Lock the key's probe range and yield its first slot offset"""
+        start = key_hash % (self.slots - PROBE + 1)
+        offset = HEADER_SIZE + start * SLOT.size
+        with self._lock, _range_lock(self.fd, offset, PROBE * SLOT.size):
+            yield offset
+
+    def find(self, offset, key_hash, now, claim):
+        """
+        Offset and contents of the key's slot within a locked probe range.
+
+        Returns:
+            tuple: (offset, slot) for an existing live slot, (offset, None) for
+            a slot to claim, or (None, None) if the key has no slot and
+            ``claim`` is False
+        """
+        unpack_from = SLOT.unpack_from
+        victim = victim_expiry = None
+        for position in range(offset, offset + PROBE * SLOT.size, SLOT.size):
+            slot = unpack_from(self.map, position)
+            if slot[0] == key_hash:
+                if slot[1] > now:
+                    return position, slot
+                return position, None
+            if claim and (victim is None or slot[1] < victim_expiry):
+                victim, victim_expiry = position, slot[1]
+        return (victim, None) if claim else (None, None)
+
+    def write(self, offset, slot):
+        SLOT.pack_into(self.map, offset, *slot)
+
+    def live_slots(self, now):
+        """(hash, expires, window, count, previous) of every live slot; unlocked"""
+        return [
+            slot[:5] for slot in SLOT.iter_unpack(self.map[HEADER_SIZE:])
+            if slot[0] and slot[1] > now and (slot[3] or slot[4])
+        ]
+
+    def clear_all(self):
+        with self._lock, _range_lock(self.fd, HEADER_SIZE, self.slots * SLOT.size):
+            used = sum(1 for slot in SLOT.iter_unpack(self.map[HEADER_SIZE:]) if slot[0])
+            self.map[HEADER_SIZE:] = bytes(self.slots * SLOT.size)
+        return used
+
+
+def _roll(slot, window):
+    """(count, previous, remote count, remote previous) as seen from ``window``"""
+    if slot is None:
+        return 0, 0, 0, 0
+    if slot[2] == window:
+        return slot[3], slot[4], slot[5], slot[6]
+    if slot[2] == window - 1:
+        return 0, slot[3], 0, slot[5]
+    return 0, 0, 0, 0
+
+
+class MmapStorage(Storage, SlidingWindowCounterSupport):
+    """
+    ``limits`` storage over a SlotTable.
+
+    URI options: ``slots`` (table size, fixed when the file is created),
+    ``aggregator`` (host:port), ``node`` (name reported to the aggregator,
+    default the host name) and ``sync`` (seconds between syncs).
+    """
+
+    STORAGE_SCHEME = ['mmap']
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        parts = urlsplit(uri or 'mmap://')
+        query = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+        path = (parts.netloc + parts.path) or DEFAULT_PATH
+        self.table = SlotTable(path, int(query.get('slots', DEFAULT_SLOTS)))
+        self.sync = None
+        if query.get('aggregator'):
+            host, port = query['aggregator'].rsplit(':', 1)
+            self.sync = AggregatorSync(self.table, path, (host, int(port)),
+                                       query.get('node') or socket.gethostname(),
+                                       float(query.get('sync', 1)))
+            self.sync.start()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return (OSError, ValueError)
+
+    # Fixed window
+
+    def incr(self, key, expiry, amount=1):
+        h, now = key_hash(key), time.time()
+        with self.table.probe(h) as offset:
+            position, slot = self.table.find(offset, h, now, claim=True)
+            if slot is None:
+                slot = (h, now + expiry, 0, amount, 0, 0, 0)
+            else:
+                slot = slot[:3] + (slot[3] + amount,) + slot[4:]
+            self.table.write(position, slot)
+        return slot[3] + slot[5]
+
+    def get(self, key):
+        h, now = key_hash(key), time.time()
+        with self.table.probe(h) as offset:
+            _, slot = self.table.find(offset, h, now, claim=False)
+        return slot[3] + slot[5] if slot else 0
+
+    def get_expiry(self, key):
+        h, now = key_hash(key), time.time()
+        with self.table.probe(h) as offset:
+            _, slot = self.table.find(offset, h, now, claim=False)
+        return slot[1] if slot else now
+
+    def clear(self, key):
+        h = key_hash(key)
+        with self.table.probe(h) as offset:
+            position, _ = self.table.find(offset, h, float('-inf'), claim=False)
+            if position is not None:
+                self.table.write(position, EMPTY)
+
+    # Sliding window counter
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        h, now = key_hash(key), time.time()
+        window = int(now // expiry)
+        weight = 1 - (now % expiry) / expiry
+        with self.table.probe(h) as offset:
+            position, slot = self.table.find(offset, h, now, claim=True)
+            count, previous, remote, remote_previous = _roll(slot, window)
+            if floor((previous + remote_previous) * weight + count + remote) + amount > limit:
+                return False
+            self.table.write(position, (h, (window + 2) * expiry, window,
+                                        count + amount, previous, remote, remote_previous))
+        return True
+
+    def get_sliding_window(self, key, expiry):
+        h, now = key_hash(key), time.time()
+        window = int(now // expiry)
+        with self.table.probe(h) as offset:
+            _, slot = self.table.find(offset, h, now, claim=False)
+        count, previous, remote, remote_previous = _roll(slot, window)
+        previous += remote_previous
+        elapsed = (now % expiry) / expiry
+        previous_ttl = (1 - elapsed) * expiry if previous else 0.0
+        return previous, previous_ttl, count + remote, (1 - elapsed) * expiry + expiry
+
+    def clear_sliding_window(self, key, expiry):
+        self.clear(key)
+
+    def check(self):
+        return True
+
+    def reset(self):
+        return self.table.clear_all()
+
+
+class AggregatorSync(threading.Thread):
+    """
+    Exchanges this node's live counters with the aggregator.
+
+    Only one process per node syncs (it holds ``<path>.sync``), since every
+    worker already sees the node's counters in the shared table.
+    """
+
+    def __init__(self, table, path, address, node, interval):
+        super().__init__(name='rate-limit-sync', daemon=True)
+        self.table = table
+        self.lock_path = f"{path}.sync"
+        self.address = address
+        self.node = node
+        self.interval = interval
+        self._lock_file = None
+        self._conn = None
+
+    def _is_syncer(self):
+        if self._lock_file is not None or fcntl is None:
+            return True
+        handle = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._lock_file = handle
+        return True
+
+    def exchange(self, entries):
+        if self._conn is None:
+            self._conn = socket.create_connection(self.address, timeout=self.interval * 2)
+            self._reader = self._conn.makefile('rb')
+        self._conn.sendall(json.dumps({'node': self.node, 'entries': entries}).encode() + b'\n')
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError('aggregator closed the connection')
+        return json.loads(line)['entries']
+
+    def sync_once(self):
+        now = time.time()
+        entries = [[h, window, count, previous, expires]
+                   for h, expires, window, count, previous in self.table.live_slots(now)]
+        for h, window, remote, remote_previous in self.exchange(entries):
+            with self.table.probe(h) as offset:
+                position, slot = self.table.find(offset, h, now, claim=False)
+                if slot is not None and slot[2] == window:
+                    self.table.write(position, slot[:5] + (remote, remote_previous))
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._is_syncer():
+                continue
+            try:
+                self.sync_once()
+            except (OSError, ValueError) as e:
+                logger.warning(f"Rate limit sync with {self.address[0]}:{self.address[1]} failed: {e}")
+                if self._conn is not None:
+                    self._conn.close()
+                self._conn = None
+
+
+class RateLimitAggregator:
+    """
+    Cross-node counter exchange.
+
+    Each node reports its live counters as a full snapshot; the reply gives,
+    for each of its keys, the sum of every other node's counts in the same
+    window. Nodes that stop reporting are forgotten after ``node_ttl``.
+    """
+
+    def __init__(self, node_ttl=30):
+        self.node_ttl = node_ttl
+        self.nodes = {}
+
+    def exchange(self, node, entries, now=None):
+        now = now or time.time()
+        self.nodes[node] = (now, {(h, window): (count, previous) for h, window, count, previous, _ in entries})
+        for other in [name for name, (seen, _) in self.nodes.items() if seen < now - self.node_ttl]:
+            del self.nodes[other]
+
+        reply = []
+        for h, window, *_ in entries:
+            remote = remote_previous = 0
+            for other, (_, counters) in self.nodes.items():
+                if other != node and (h, window) in counters:
+                    count, previous = counters[(h, window)]
+                    remote += count
+                    remote_previous += previous
+            if remote or remote_previous:
+                reply.append([h, window, remote, remote_previous])
+        return reply
+
+    async def handle(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        try:
+            while line := await reader.readline():
+                request = json.loads(line)
+                reply = self.exchange(request['node'], request['entries'])
+                writer.write(json.dumps({'entries': reply}).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError, KeyError) as e:
+            logger.warning(f"Dropped rate limit sync connection from {peer}: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
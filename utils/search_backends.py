@@ -0,0 +1,804 @@
+"""
+Pluggable search backends for paste content and title search.
+
+Every backend answers the same two questions for ``search.search``: which
+public, unexpired pastes match a query (ranked, one page at a time, with the
+total in the same round trip) and what highlighted snippet to show for each
+hit on that page.
+
+Backends:
+    like         - the original ILIKE '%q%' scan, kept as the portable fallback
+    postgres     - tsvector generated column with a GIN index
+    fts5         - SQLite FTS5 external-content table kept in sync by triggers
+    pg_trgm      - ILIKE substring search served by pg_trgm GIN indexes
+    fts5_trigram - SQLite FTS5 trigram side table for substring search
+    engine       - the in-process BM25 index in utils/search_engine.py
+
+Index maintenance for the database-backed indexes happens inside the database
+(generated column / triggers / GIN indexes), so creates, edits, deletes and
+expiry pruning keep the index current without any application hooks. Run
+add_fulltext_search.py and add_trigram_search.py once to install the index
+structures. The 'engine' backend lives outside the database: it is kept
+current by the session hooks in register_search_index_hooks and built with
+rebuild_search_index.py.
+"""
+
+import os
+import re
+import logging
+from datetime import datetime, timezone
+
+from markupsafe import Markup, escape
+from sqlalchemy import text, bindparam
+
+logger = logging.getLogger(__name__)
+
+# Control characters used to mark highlighted terms in raw snippets. They never
+# occur in HTML-escaped text, so the snippet can be escaped first and the
+# markers swapped for <mark> tags afterwards.
+SNIPPET_START = '\x02'
+SNIPPET_STOP = '\x03'
+
+# Shared WHERE clause for "public and not expired", matching the base query
+# that search.search has always applied.
+PUBLIC_FILTER = "p.visibility = :visibility AND (p.expires_at IS NULL OR p.expires_at > :now)"
+
+
+def render_snippet(raw):
+    """Escape a raw snippet and turn the highlight markers into <mark> tags"""
+    if not raw:
+        return None
+    escaped = str(escape(raw))
+    escaped = escaped.replace(SNIPPET_START, '<mark>').replace(SNIPPET_STOP, '</mark>')
+    return Markup(escaped)
+
+
+class SearchPage:
+    """
+    A page of search results.
+
+    Exposes the same attributes as Flask-SQLAlchemy's Pagination object so
+    templates/search/results.html can render either one.
+    """
+
+    def __init__(self, items, page, per_page, total, snippets=None, total_is_estimate=False):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.snippets = snippets or {}
+        # True when total is a lower bound or planner estimate, not an exact count
+        self.total_is_estimate = total_is_estimate
+
+    @property
+    def pages(self):
+        if not self.total or not self.per_page:
+            return 0
+        return (self.total + self.per_page - 1) // self.per_page
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+    def iter_pages(self, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        """Yield page numbers for a pagination widget, with None for gaps"""
+        pages_end = self.pages + 1
+        if pages_end == 1:
+            return
+
+        left_end = min(1 + left_edge, pages_end)
+        yield from range(1, left_end)
+        if left_end == pages_end:
+            return
+
+        mid_start = max(left_end, self.page - left_current)
+        mid_end = min(self.page + right_current + 1, pages_end)
+        if mid_start - left_end > 0:
+            yield None
+        yield from range(mid_start, mid_end)
+        if mid_end == pages_end:
+            return
+
+        right_start = max(mid_end, pages_end - right_edge)
+        if right_start - mid_end > 0:
+            yield None
+        yield from range(right_start, pages_end)
+
+
+class SearchBackend:
+    """
+    Base class for search backends.
+
+    Subclasses implement ``search`` and ``snippets``. ``install`` and
+    ``rebuild`` create and repopulate whatever index structures the backend
+    needs; backends without an index leave them as no-ops.
+    """
+
+    name = None
+    fields = ('content', 'title')
+
+    def is_available(self, conn):
+        """Return True if the backend's index structures exist on this database"""
+        return True
+
+    def install(self, conn):
+        """Create the backend's index structures"""
+
+    def rebuild(self, conn):
+        """Repopulate the backend's index from the pastes table"""
+
+    def search(self, conn, query, field='content', now=None, offset=0, limit=20):
+        """
+        Find public, unexpired pastes matching a query.
+
+        Returns:
+            tuple: (list of (paste_id, rank) in result order, total match count)
+        """
+        raise NotImplementedError
+
+    def snippets(self, conn, query, field, paste_ids):
+        """
+        Build highlighted snippets for a page of hits.
+
+        Returns:
+            dict: paste_id -> raw snippet using SNIPPET_START/SNIPPET_STOP markers
+        """
+        return {}
+
+
+class LikeSearchBackend(SearchBackend):
+    """Substring search with (I)LIKE. Scans every row, but needs no index."""
+
+    name = 'like'
+    fields = ('content', 'title', 'any')
+    # Extra SQL ANDed into the WHERE clause by subclasses
+    extra_filter = ""
+
+    @staticmethod
+    def _pattern(query):
+        escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return f'%{escaped}%'
+
+    @staticmethod
+    def _columns(field):
+        if field == 'title':
+            return ['title']
+        if field == 'any':
+            return ['title', 'content']
+        return ['content']
+
+    def search(self, conn, query, field='content', now=None, offset=0, limit=20):
+        operator = 'ILIKE' if conn.dialect.name == 'postgresql' else 'LIKE'
+        match = ' OR '.join(
+            f"p.{column} {operator} :pattern ESCAPE '\\'" for column in self._columns(field)
+        )
+        rows = conn.execute(text(f"""
+            SELECT p.id, COUNT(*) OVER () AS total
+            FROM pastes p
+            WHERE ({match}) {self.extra_filter} AND {PUBLIC_FILTER}
+            ORDER BY p.created_at DESC
+            LIMIT :limit OFFSET :offset
+        """), {
+            'pattern': self._pattern(query),
+            'visibility': 'public',
+            'now': now or datetime.utcnow(),
+            'limit': limit,
+            'offset': offset,
+        }).fetchall()
+
+        total = rows[0][1] if rows else 0
+        return [(row[0], None) for row in rows], total
+
+    def snippets(self, conn, query, field, paste_ids, width=80):
+        if not paste_ids:
+            return {}
+        columns = self._columns(field)
+        rows = conn.execute(
+            text(f"SELECT id, {', '.join(columns)} FROM pastes WHERE id IN :ids").bindparams(
+                bindparam('ids', expanding=True)
+            ),
+            {'ids': list(paste_ids)},
+        ).fetchall()
+
+        needle = query.lower()
+        result = {}
+        for paste_id, *values in rows:
+            # Prefer the content snippet when both columns match
+            for value in reversed(values):
+                value = value or ''
+                position = value.lower().find(needle)
+                if position < 0:
+                    continue
+                start = max(0, position - width // 2)
+                end = min(len(value), position + len(query) + width // 2)
+                result[paste_id] = (
+                    ('…' if start > 0 else '')
+                    + value[start:position]
+                    + SNIPPET_START + value[position:position + len(query)] + SNIPPET_STOP
+                    + value[position + len(query):end]
+                    + ('…' if end < len(value) else '')
+                )
+                break
+        return result
+
+
+class PostgresFullTextBackend(SearchBackend):
+    """
+    PostgreSQL full-text search.
+
+    A STORED generated ``search_vector`` column weights the title (A) above the
+    content (B) and is indexed with GIN. Encrypted pastes contribute only their
+    title, since their content column holds ciphertext.
+    """
+
+    name = 'postgres'
+    config = 'simple'
+    headline_options = (
+        f"StartSel={SNIPPET_START}, StopSel={SNIPPET_STOP}, "
+        "MaxWords=30, MinWords=10, MaxFragments=2"
+    )
+
+    def is_available(self, conn):
+        if conn.dialect.name != 'postgresql':
+            return False
+        return conn.execute(text("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'pastes' AND column_name = 'search_vector'
+        """)).first() is not None
+
+    def install(self, conn):
+        """
+        Add the generated column and its GIN index.
+
+        Adding a STORED generated column rewrites the table, so run this during
+        a maintenance window. ``conn`` must be in autocommit mode because the
+        index is built CONCURRENTLY.
+        """
+        conn.execute(text(f"""
+            ALTER TABLE pastes ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('{self.config}', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('{self.config}',
+                    CASE WHEN coalesce(is_encrypted, false) THEN '' ELSE coalesce(content, '') END), 'B')
+            ) STORED
+        """))
+        conn.execute(text(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pastes_search_vector "
+            "ON pastes USING GIN (search_vector)"
+        ))
+
+    def rebuild(self, conn):
+        # The generated column is maintained by PostgreSQL itself; refreshing
+        # the statistics is all that is useful after a bulk load.
+        conn.execute(text("ANALYZE pastes"))
+
+    def search(self, conn, query, field='content', now=None, offset=0, limit=20):
+        title_filter = ""
+        if field == 'title':
+            # The GIN index narrows the candidates; the title recheck then runs
+            # only on rows that already matched somewhere.
+            title_filter = f"AND to_tsvector('{self.config}', coalesce(p.title, '')) @@ q.tsq"
+
+        rows = conn.execute(text(f"""
+            SELECT p.id, ts_rank_cd(p.search_vector, q.tsq) AS rank, COUNT(*) OVER () AS total
+            FROM pastes p, websearch_to_tsquery('{self.config}', :query) AS q(tsq)
+            WHERE p.search_vector @@ q.tsq {title_filter} AND {PUBLIC_FILTER}
+            ORDER BY rank DESC, p.created_at DESC
+            LIMIT :limit OFFSET :offset
+        """), {
+            'query': query,
+            'visibility': 'public',
+            'now': now or datetime.utcnow(),
+            'limit': limit,
+            'offset': offset,
+        }).fetchall()
+
+        total = rows[0][2] if rows else 0
+        return [(row[0], row[1]) for row in rows], total
+
+    def snippets(self, conn, query, field, paste_ids):
+        if not paste_ids:
+            return {}
+        if field == 'title':
+            document = "coalesce(p.title, '')"
+        else:
+            document = "CASE WHEN coalesce(p.is_encrypted, false) THEN '' ELSE coalesce(p.content, '') END"
+
+        # ts_headline is expensive, so it only ever runs over one page of ids
+        rows = conn.execute(
+            text(f"""
+                SELECT p.id, ts_headline('{self.config}', {document},
+                                         websearch_to_tsquery('{self.config}', :query), :options)
+                FROM pastes p
+                WHERE p.id IN :ids
+            """).bindparams(bindparam('ids', expanding=True)),
+            {'query': query, 'options': self.headline_options, 'ids': list(paste_ids)},
+        ).fetchall()
+        return {paste_id: snippet for paste_id, snippet in rows}
+
+
+class SQLiteFullTextBackend(SearchBackend):
+    """
+    SQLite FTS5 full-text search for local development.
+
+    ``pastes_fts`` is an external-content FTS5 table over pastes(title,
+    content); insert, update and delete triggers keep it in step with the
+    pastes table. Encrypted pastes are indexed with empty content.
+    """
+
+    name = 'fts5'
+    table = 'pastes_fts'
+    tokenize = None
+    # bm25 column weights: a title hit counts ten times a content hit
+    title_weight = 10.0
+    content_weight = 1.0
+
+    INDEXED_CONTENT = "CASE WHEN coalesce({row}.is_encrypted, 0) THEN '' ELSE {row}.content END"
+
+    def is_available(self, conn):
+        if conn.dialect.name != 'sqlite':
+            return False
+        return conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': self.table},
+        ).first() is not None
+
+    def install(self, conn):
+        new_content = self.INDEXED_CONTENT.format(row='new')
+        old_content = self.INDEXED_CONTENT.format(row='old')
+        tokenize = f", tokenize='{self.tokenize}'" if self.tokenize else ""
+        statements = [
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {self.table}
+            USING fts5(title, content, content='pastes', content_rowid='id'{tokenize})
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {self.table}_ai AFTER INSERT ON pastes BEGIN
+                INSERT INTO {self.table}(rowid, title, content)
+                VALUES (new.id, new.title, {new_content});
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {self.table}_ad AFTER DELETE ON pastes BEGIN
+                INSERT INTO {self.table}({self.table}, rowid, title, content)
+                VALUES ('delete', old.id, old.title, {old_content});
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {self.table}_au
+            AFTER UPDATE OF title, content, is_encrypted ON pastes BEGIN
+                INSERT INTO {self.table}({self.table}, rowid, title, content)
+                VALUES ('delete', old.id, old.title, {old_content});
+                INSERT INTO {self.table}(rowid, title, content)
+                VALUES (new.id, new.title, {new_content});
+            END
+            """,
+        ]
+        for statement in statements:
+            conn.execute(text(statement))
+        self.rebuild(conn)
+
+    def rebuild(self, conn):
+        # FTS5's own 'rebuild' command would read raw content from pastes and
+        # index ciphertext, so repopulate explicitly with the same expression
+        # the triggers use.
+        conn.execute(text(f"INSERT INTO {self.table}({self.table}) VALUES ('delete-all')"))
+        conn.execute(text(f"""
+            INSERT INTO {self.table}(rowid, title, content)
+            SELECT id, title, {self.INDEXED_CONTENT.format(row='pastes')} FROM pastes
+        """))
+
+    @staticmethod
+    def build_match(query, field):
+        """
+        Turn free text into a safe FTS5 MATCH expression.
+
+        Each whitespace-separated term becomes a quoted phrase, so punctuation in
+        code fragments cannot be parsed as FTS5 syntax. Terms are ANDed and
+        restricted to the requested column.
+        """
+        terms = [term for term in query.split() if re.search(r'\w', term)]
+        if not terms:
+            return None
+        phrases = ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+        column = 'title' if field == 'title' else 'content'
+        return f'{column} : ({phrases})'
+
+    def verify_filter(self, query, field):
+        """
+        Extra (SQL, params) applied to candidate rows after the index lookup.
+
+        Tokenised full-text matches need no verification; subclasses whose
+        index only yields candidates override this.
+        """
+        return "", {}
+
+    def search(self, conn, query, field='content', now=None, offset=0, limit=20):
+        match = self.build_match(query, field)
+        if not match:
+            return [], 0
+        verify_sql, verify_params = self.verify_filter(query, field)
+
+        # bm25() is only usable in a query directly against the FTS table, so
+        # rank in a subquery and apply the visibility filter outside it.
+        rows = conn.execute(text(f"""
+            SELECT p.id, m.rank, COUNT(*) OVER () AS total
+            FROM (
+                SELECT rowid, bm25({self.table}, {self.title_weight}, {self.content_weight}) AS rank
+                FROM {self.table}
+                WHERE {self.table} MATCH :match
+            ) AS m
+            JOIN pastes p ON p.id = m.rowid
+            WHERE {PUBLIC_FILTER} {verify_sql}
+            ORDER BY m.rank, p.created_at DESC
+            LIMIT :limit OFFSET :offset
+        """), {
+            'match': match,
+            'visibility': 'public',
+            'now': now or datetime.utcnow(),
+            'limit': limit,
+            'offset': offset,
+            **verify_params,
+        }).fetchall()
+
+        total = rows[0][2] if rows else 0
+        # bm25 is "lower is better"; flip the sign so higher is better everywhere
+        return [(row[0], -row[1]) for row in rows], total
+
+    def snippets(self, conn, query, field, paste_ids):
+        match = self.build_match(query, field)
+        if not match or not paste_ids:
+            return {}
+        # -1 lets FTS5 pick whichever column matched best
+        column_index = {'title': 0, 'content': 1}.get(field, -1)
+        rows = conn.execute(
+            text(f"""
+                SELECT rowid, snippet({self.table}, {column_index}, :start, :stop, '…', 16)
+                FROM {self.table}
+                WHERE {self.table} MATCH :match AND rowid IN :ids
+            """).bindparams(bindparam('ids', expanding=True)),
+            {'match': match, 'start': SNIPPET_START, 'stop': SNIPPET_STOP, 'ids': list(paste_ids)},
+        ).fetchall()
+        return {paste_id: snippet for paste_id, snippet in rows}
+
+
+class PostgresTrigramBackend(LikeSearchBackend):
+    """
+    Substring search backed by pg_trgm GIN indexes.
+
+    The query is still a plain ILIKE '%q%', so results match the 'like'
+    backend exactly. The trigram indexes turn it into a bitmap index scan over
+    candidate rows that share every trigram of the pattern, and PostgreSQL
+    rechecks the ILIKE only on those candidates. Encrypted pastes are left out
+    of the content index, as their content is ciphertext.
+    """
+
+    name = 'pg_trgm'
+    extra_filter = "AND p.is_encrypted IS NOT TRUE"
+
+    def is_available(self, conn):
+        if conn.dialect.name != 'postgresql':
+            return False
+        return conn.execute(text(
+            "SELECT 1 FROM pg_indexes WHERE tablename = 'pastes' AND indexname = 'ix_pastes_content_trgm'"
+        )).first() is not None
+
+    def install(self, conn):
+        """
+        Enable pg_trgm and build the trigram indexes.
+
+        ``conn`` must be in autocommit mode because the indexes are built
+        CONCURRENTLY.
+        """
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pastes_title_trgm "
+            "ON pastes USING GIN (title gin_trgm_ops)"
+        ))
+        # The partial predicate matches extra_filter, so the planner can use it
+        conn.execute(text(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pastes_content_trgm "
+            "ON pastes USING GIN (content gin_trgm_ops) WHERE is_encrypted IS NOT TRUE"
+        ))
+
+    def rebuild(self, conn):
+        conn.execute(text("ANALYZE pastes"))
+
+
+class SQLiteTrigramBackend(SQLiteFullTextBackend):
+    """
+    Substring search backed by an FTS5 trigram side table (SQLite 3.34+).
+
+    ``pastes_trigram`` indexes every three-character sequence of title and
+    content and is kept in sync by the same style of triggers as pastes_fts.
+    The whole query is matched as one phrase, which yields the rows containing
+    all of its trigrams in sequence; a LIKE check then verifies just those
+    candidate rows. Queries shorter than three characters have no trigrams and
+    fall back to the 'like' backend.
+    """
+
+    name = 'fts5_trigram'
+    table = 'pastes_trigram'
+    tokenize = 'trigram'
+    fields = ('content', 'title', 'any')
+    min_length = 3
+
+    @staticmethod
+    def build_match(query, field):
+        if len(query) < SQLiteTrigramBackend.min_length:
+            return None
+        columns = {'title': 'title', 'content': 'content'}.get(field, '{title content}')
+        return f'{columns} : "' + query.replace('"', '""') + '"'
+
+    def verify_filter(self, query, field):
+        columns = LikeSearchBackend._columns(field)
+        sql = ' OR '.join(f"p.{column} LIKE :pattern ESCAPE '\\'" for column in columns)
+        return f"AND ({sql})", {'pattern': LikeSearchBackend._pattern(query)}
+
+    def search(self, conn, query, field='content', now=None, offset=0, limit=20):
+        if len(query) < self.min_length:
+            return BACKENDS[LikeSearchBackend.name].search(
+                conn, query, field=field, now=now, offset=offset, limit=limit
+            )
+        return super().search(conn, query, field=field, now=now, offset=offset, limit=limit)
+
+    def snippets(self, conn, query, field, paste_ids):
+        if len(query) < self.min_length:
+            return BACKENDS[LikeSearchBackend.name].snippets(conn, query, field, paste_ids)
+        return super().snippets(conn, query, field, paste_ids)
+
+
+class EngineSearchBackend(SearchBackend):
+    """
+    BM25 search over the on-disk inverted index in utils/search_engine.py.
+
+    The index only holds public, unencrypted pastes together with their expiry
+    time, so visibility and expiry are answered without touching the database;
+    only snippets read the pastes table.
+    """
+
+    name = 'engine'
+
+    def is_available(self, conn):
+        return get_search_index().exists()
+
+    def install(self, conn):
+        self.rebuild(conn)
+
+    def rebuild(self, conn):
+        """Rebuild serially on ``conn``; rebuild_search_index.py does it in parallel"""
+        from utils.search_engine import make_document, write_segment
+
+        index = get_search_index()
+        generation = index.reserve_generation()
+        rows = conn.execute(text(f"""
+            SELECT p.id, p.title, p.content, p.expires_at
+            FROM pastes p
+            WHERE p.is_encrypted IS NOT TRUE AND {PUBLIC_FILTER}
+        """), {'visibility': 'public', 'now': datetime.utcnow()})
+
+        segments = []
+        while True:
+            batch = rows.fetchmany(10000)
+            if not batch:
+                break
+            documents = [make_document(*row) for row in batch]
+            segments.append((write_segment(index.directory, documents), len(documents)))
+        index.replace_segments(generation, segments)
+        index.merge(force=True)
+
+    def search(self, conn, query, field='content', now=None, offset=0, limit=20):
+        now = (now or datetime.utcnow()).replace(tzinfo=timezone.utc).timestamp()
+        return get_search_index().search(query, field=field, offset=offset, limit=limit, now=now)
+
+    def snippets(self, conn, query, field, paste_ids, width=80):
+        from utils.search_engine import IDENTIFIER_RE, tokenize
+
+        if not paste_ids:
+            return {}
+        column = 'title' if field == 'title' else 'content'
+        rows = conn.execute(
+            text(f"SELECT id, {column} FROM pastes WHERE id IN :ids").bindparams(
+                bindparam('ids', expanding=True)
+            ),
+            {'ids': list(paste_ids)},
+        ).fetchall()
+
+        terms = set(tokenize(query))
+        result = {}
+        for paste_id, value in rows:
+            value = value or ''
+            hits = [
+                match for match in IDENTIFIER_RE.finditer(value)
+                if terms.intersection(tokenize(match.group(0)))
+            ]
+            if not hits:
+                continue
+            start = max(0, hits[0].start() - width // 2)
+            end = min(len(value), hits[0].end() + width // 2)
+            parts = ['…' if start > 0 else '']
+            position = start
+            for match in hits:
+                if match.end() > end:
+                    break
+                parts.append(value[position:match.start()])
+                parts.append(SNIPPET_START + match.group(0) + SNIPPET_STOP)
+                position = match.end()
+            parts.append(value[position:end])
+            parts.append('…' if end < len(value) else '')
+            result[paste_id] = ''.join(parts)
+        return result
+
+
+BACKENDS = {
+    LikeSearchBackend.name: LikeSearchBackend(),
+    PostgresFullTextBackend.name: PostgresFullTextBackend(),
+    SQLiteFullTextBackend.name: SQLiteFullTextBackend(),
+    PostgresTrigramBackend.name: PostgresTrigramBackend(),
+    SQLiteTrigramBackend.name: SQLiteTrigramBackend(),
+    EngineSearchBackend.name: EngineSearchBackend(),
+}
+
+# Index-backed backend for each kind of search, per database dialect
+NATIVE_BACKENDS = {
+    'fulltext': {
+        'postgresql': PostgresFullTextBackend.name,
+        'sqlite': SQLiteFullTextBackend.name,
+    },
+    'trigram': {
+        'postgresql': PostgresTrigramBackend.name,
+        'sqlite': SQLiteTrigramBackend.name,
+    },
+}
+
+
+def get_search_backend(conn, name=None, kind='fulltext'):
+    """
+    Pick the search backend for a connection.
+
+    ``kind`` is 'fulltext' for word search or 'trigram' for substring (code
+    fragment) search. For full-text search, ``name`` (or the SEARCH_BACKEND
+    environment variable) selects a backend explicitly. The default 'auto'
+    uses the database's native index for the kind when it has been installed
+    and falls back to 'like' otherwise.
+    """
+    if kind == 'fulltext':
+        name = name or os.environ.get('SEARCH_BACKEND', 'auto')
+    name = name or 'auto'
+
+    if name != 'auto':
+        backend = BACKENDS.get(name)
+        if backend and backend.is_available(conn):
+            return backend
+        logger.warning(f"Search backend '{name}' is not available, falling back to auto selection")
+
+    native = NATIVE_BACKENDS[kind].get(conn.dialect.name)
+    if native and BACKENDS[native].is_available(conn):
+        return BACKENDS[native]
+    return BACKENDS[LikeSearchBackend.name]
+
+
+def search_pastes(conn, query, field='content', page=1, per_page=20, backend=None):
+    """
+    Run a ranked search and load one page of Paste objects with snippets.
+
+    Returns:
+        SearchPage: Paginated results; ``snippets`` maps paste id to Markup
+    """
+    # Import Paste inside the function to avoid circular imports
+    from models import Paste
+
+    backend = backend or get_search_backend(conn)
+    page = max(page, 1)
+
+    hits, total = backend.search(conn, query, field=field,
+                                 offset=(page - 1) * per_page, limit=per_page)
+    paste_ids = [paste_id for paste_id, _ in hits]
+
+    items = []
+    if paste_ids:
+        pastes_by_id = {paste.id: paste for paste in Paste.query.filter(Paste.id.in_(paste_ids))}
+        items = [pastes_by_id[paste_id] for paste_id in paste_ids if paste_id in pastes_by_id]
+
+    snippets = {
+        paste_id: render_snippet(raw)
+        for paste_id, raw in backend.snippets(conn, query, field, paste_ids).items()
+    }
+
+    return SearchPage(items, page, per_page, total, snippets=snippets)
+
+
+_search_index = None
+
+
+def get_search_index():
+    """Return this process's handle on the engine index (SEARCH_INDEX_DIR)"""
+    global _search_index
+    if _search_index is None:
+        from utils.search_engine import SearchIndex
+        _search_index = SearchIndex(os.environ.get('SEARCH_INDEX_DIR', 'search_index'))
+    return _search_index
+
+
+def _paste_document(paste):
+    """The engine document for a paste, or None if it should not be searchable"""
+    from utils.search_engine import make_document
+
+    if paste.visibility != 'public' or getattr(paste, 'is_encrypted', False):
+        return None
+    return make_document(paste.id, paste.title, paste.content, paste.expires_at)
+
+
+def register_search_index_hooks():
+    """
+    Keep the engine index in step with the pastes table.
+
+    Paste inserts, updates and deletes are collected on every flush and
+    applied to the index once the transaction commits, so rolled back changes
+    never reach it. Bulk query.delete() calls bypass these hooks; expired rows
+    removed by prune_expired.py are already hidden by their stored expiry and
+    are dropped at the next merge.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from utils.search_engine import start_background_merger
+
+    if event.contains(Session, 'after_flush', _collect_paste_changes):
+        return
+    event.listen(Session, 'after_flush', _collect_paste_changes)
+    event.listen(Session, 'after_commit', _apply_paste_changes)
+    event.listen(Session, 'after_soft_rollback', _discard_paste_changes)
+    start_background_merger(get_search_index())
+
+
+# Paste columns the engine document is built from; other updates (view
+# counters and the like) do not touch the index
+INDEXED_ATTRIBUTES = ('title', 'content', 'visibility', 'is_encrypted', 'expires_at')
+
+
+def _collect_paste_changes(session, flush_context):
+    from sqlalchemy import inspect
+
+    pending = session.info.setdefault('search_index_pending', {})
+    for paste in session.new:
+        if getattr(paste, '__tablename__', None) == 'pastes':
+            pending[paste.id] = _paste_document(paste)
+    for paste in session.dirty:
+        if getattr(paste, '__tablename__', None) != 'pastes':
+            continue
+        # Attribute history still holds the pre-flush changes here
+        attrs = inspect(paste).attrs
+        if any(name in attrs and attrs[name].history.has_changes() for name in INDEXED_ATTRIBUTES):
+            pending[paste.id] = _paste_document(paste)
+    for paste in session.deleted:
+        if getattr(paste, '__tablename__', None) == 'pastes':
+            pending[paste.id] = None
+
+
+def _apply_paste_changes(session):
+    pending = session.info.pop('search_index_pending', None)
+    if not pending:
+        return
+    try:
+        index = get_search_index()
+        index.add_documents(document for document in pending.values() if document)
+        index.delete_documents(paste_id for paste_id, document in pending.items() if not document)
+    except Exception as e:
+        # The index is rebuildable; never fail a request because of it
+        logger.error(f"Failed to update the search index: {e}")
+
+
+def _discard_paste_changes(session, previous_transaction):
+    session.info.pop('search_index_pending', None)
@@ -0,0 +1,616 @@
+"""
+Self-contained inverted index search engine for paste content.
+
+For deployments that cannot install PostgreSQL extensions (or run on SQLite
+without FTS5), this module keeps its own on-disk index next to the
+application and ranks results with BM25.
+
+Layout of an index directory:
+
+    MANIFEST            JSON list of live segments plus delete tombstones
+    LOCK                fcntl lock file serialising manifest updates
+    <segment>.postings  posting lists, delta + varint encoded
+    <segment>.terms     zlib-compressed JSON: term dictionary, doc stats and
+                        the segment's document count and total field lengths
+
+Segments are immutable. Every write (add, update or delete) produces a new
+small segment and/or tombstones and atomically replaces MANIFEST, so any
+number of processes can read the index while gunicorn workers write to it.
+A background merger folds small segments together and drops deleted and
+expired documents.
+
+Only public, unencrypted pastes are indexed. Each document carries its
+expiry time, so expired pastes drop out of results without any write.
+"""
+
+import os
+import re
+import json
+import math
+import mmap
+import time
+import zlib
+import uuid
+import fcntl
+import logging
+import calendar
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'MANIFEST'
+LOCK = 'LOCK'
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Merge once there are more live segments than this
+MAX_SEGMENTS = 8
+
+# Title terms are stored with this prefix so title-only search has its own
+# posting lists and length statistics
+TITLE_PREFIX = 't:'
+
+IDENTIFIER_RE = re.compile(r'[A-Za-z0-9_]+')
+# Splits camelCase / PascalCase / HTTPServer / utf8 style identifiers
+CAMEL_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+MAX_TOKEN_LENGTH = 64
+
+
+# Tokenisation
+
+def split_identifier(identifier):
+    """
+    Split an identifier into its snake_case and camelCase parts.
+
+    split_identifier('parseHTTPResponse_v2') -> ['parse', 'http', 'response', 'v', '2']
+    """
+    parts = []
+    for chunk in identifier.split('_'):
+        parts.extend(match.group(0).lower() for match in CAMEL_RE.finditer(chunk))
+    return parts
+
+
+def query_words(text):
+    """
+    Tokenise query text into words.
+
+    Returns:
+        list: (full identifier token, [part tokens]) for each identifier
+    """
+    words = []
+    for match in IDENTIFIER_RE.finditer(text or ''):
+        identifier = match.group(0)
+        if len(identifier) > MAX_TOKEN_LENGTH:
+            continue
+        parts = [part for part in split_identifier(identifier) if len(part) > 1]
+        words.append((identifier.lower(), parts or [identifier.lower()]))
+    return words
+
+
+def tokenize(text):
+    """
+    Identifier-aware tokeniser.
+
+    Emits each identifier in full (lowercased) followed by its snake_case and
+    camelCase parts, so 'getUserName' is findable as getusername, get, user
+    and name.
+    """
+    for full, parts in query_words(text):
+        yield full
+        for part in parts:
+            if part != full:
+                yield part
+
+
+# Posting list encoding
+
+def _encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_postings(postings):
+    """Encode sorted (doc_id, tf) pairs as delta-coded varints"""
+    out = bytearray()
+    previous = 0
+    for doc_id, tf in postings:
+        _encode_varint(doc_id - previous, out)
+        _encode_varint(tf, out)
+        previous = doc_id
+    return bytes(out)
+
+
+def decode_postings(data):
+    """Decode the output of encode_postings back into (doc_id, tf) pairs"""
+    postings = []
+    doc_id = 0
+    value = shift = 0
+    expecting_doc = True
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        if expecting_doc:
+            doc_id += value
+        else:
+            postings.append((doc_id, value))
+        expecting_doc = not expecting_doc
+        value = shift = 0
+    return postings
+
+
+def _to_epoch(value):
+    """Convert a naive UTC datetime (or its ISO string form) to epoch seconds"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return calendar.timegm(value.utctimetuple())
+
+
+def make_document(paste_id, title, content, expires_at=None):
+    """Build the document dict the engine indexes for one paste"""
+    return {
+        'id': int(paste_id),
+        'title': title or '',
+        'content': content or '',
+        'expires': _to_epoch(expires_at),
+    }
+
+
+# Segments
+
+def _totals(lengths):
+    """[documents, total content length, total title length] of doc stats"""
+    totals = [0, 0, 0]
+    for content_length, title_length, _ in lengths:
+        totals[0] += 1
+        totals[1] += content_length
+        totals[2] += title_length
+    return totals
+
+
+def _write_segment_files(directory, name, inverted, docs):
+    """Write the postings and terms files of a segment"""
+    postings_blob = bytearray()
+    terms = {}
+    for term in sorted(inverted):
+        entries = sorted(inverted[term])
+        encoded = encode_postings(entries)
+        terms[term] = [len(postings_blob), len(encoded), len(entries)]
+        postings_blob.extend(encoded)
+
+    meta = {'terms': terms, 'docs': docs, 'totals': _totals(docs.values())}
+    with open(os.path.join(directory, f'{name}.postings'), 'wb') as handle:
+        handle.write(postings_blob)
+    with open(os.path.join(directory, f'{name}.terms'), 'wb') as handle:
+        handle.write(zlib.compress(json.dumps(meta).encode('utf-8')))
+
+
+class Segment:
+    """An immutable, memory-mapped on-disk segment"""
+
+    def __init__(self, directory, name, generation):
+        self.name = name
+        self.generation = generation
+        with open(os.path.join(directory, f'{name}.terms'), 'rb') as handle:
+            meta = json.loads(zlib.decompress(handle.read()))
+        # term -> [offset, length, document frequency]
+        self.terms = meta['terms']
+        # doc id -> [content length, title length, expiry epoch or None]
+        self.docs = {int(doc_id): stats for doc_id, stats in meta['docs'].items()}
+        # [documents, total content length, total title length]; segments
+        # written before these were stored compute them once here
+        self.totals = meta.get('totals') or _totals(self.docs.values())
+
+        self._file = open(os.path.join(directory, f'{name}.postings'), 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._postings = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def postings(self, term):
+        entry = self.terms.get(term)
+        if not entry:
+            return []
+        offset, length, _ = entry
+        return decode_postings(self._postings[offset:offset + length])
+
+    def document_frequency(self, term):
+        entry = self.terms.get(term)
+        return entry[2] if entry else 0
+
+    def close(self):
+        if isinstance(self._postings, mmap.mmap):
+            self._postings.close()
+        self._file.close()
+
+
+def write_segment(directory, documents):
+    """
+    Write a new segment for ``documents`` and return its name.
+
+    The segment is not visible to readers until it is added to the manifest.
+    """
+    name = f'seg-{uuid.uuid4().hex[:12]}'
+    inverted = {}
+    docs = {}
+    for document in documents:
+        content_tokens = list(tokenize(document['content']))
+        title_tokens = [TITLE_PREFIX + token for token in tokenize(document['title'])]
+        docs[document['id']] = [len(content_tokens), len(title_tokens), document.get('expires')]
+
+        counts = {}
+        for token in content_tokens + title_tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            inverted.setdefault(token, []).append((document['id'], tf))
+
+    _write_segment_files(directory, name, inverted, docs)
+    return name
+
+
+# Index
+
+class SearchIndex:
+    """
+    An on-disk inverted index shared by every process pointing at ``directory``.
+
+    Readers pick up new manifests automatically; writers serialise on an
+    fcntl lock, so this is safe across gunicorn workers on one host.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._segments = {}
+        self._manifest = None
+        self._manifest_mtime = None
+        self._reader_lock = threading.Lock()
+
+    # Manifest handling
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def exists(self):
+        return os.path.exists(self._manifest_path())
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path()) as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return {'generation': 0, 'segments': [], 'deleted': {}}
+
+    def _write_manifest(self, manifest):
+        temp_path = f'{self._manifest_path()}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as handle:
+            json.dump(manifest, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_path, self._manifest_path())
+
+    def _locked(self):
+        """Context manager holding the cross-process write lock"""
+        index = self
+
+        class _Lock:
+            def __enter__(self):
+                self.handle = open(os.path.join(index.directory, LOCK), 'a')
+                fcntl.flock(self.handle, fcntl.LOCK_EX)
+                return self
+
+            def __exit__(self, *exc):
+                fcntl.flock(self.handle, fcntl.LOCK_UN)
+                self.handle.close()
+
+        return _Lock()
+
+    def _refresh(self):
+        """Reload the manifest and open any new segments if it changed on disk"""
+        try:
+            mtime = os.stat(self._manifest_path()).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self._manifest is not None and mtime == self._manifest_mtime:
+            return
+
+        manifest = self._read_manifest()
+        live = {entry['name']: entry['gen'] for entry in manifest['segments']}
+        for name in list(self._segments):
+            if name not in live:
+                self._segments.pop(name).close()
+        for name, generation in live.items():
+            if name not in self._segments:
+                self._segments[name] = Segment(self.directory, name, generation)
+
+        deleted = {int(doc_id): gen for doc_id, gen in manifest['deleted'].items()}
+        self._deleted = deleted
+        self._totals = self._live_totals(list(self._segments.values()), deleted)
+        self._manifest = manifest
+        self._manifest_mtime = mtime
+
+    @staticmethod
+    def _live_totals(segments, deleted):
+        """
+        Live documents and total field lengths, for BM25.
+
+        The segments' stored totals, less the copies their tombstones kill:
+        work proportional to the tombstones (which merges keep few), done
+        once per manifest change rather than per query.
+        """
+        totals = [0, 0, 0]
+        for segment in segments:
+            for position, value in enumerate(segment.totals):
+                totals[position] += value
+        for doc_id, generation in deleted.items():
+            for segment in segments:
+                stats = segment.docs.get(doc_id) if segment.generation < generation else None
+                if stats:
+                    totals[0] -= 1
+                    totals[1] -= stats[0]
+                    totals[2] -= stats[1]
+        return totals
+
+    def _snapshot(self):
+        """Return (segments, tombstones, live totals) for a consistent read"""
+        with self._reader_lock:
+            for attempt in range(2):
+                try:
+                    self._refresh()
+                    break
+                except FileNotFoundError:
+                    # A merge removed a segment between reading the manifest
+                    # and opening it; the next manifest will not list it.
+                    self._manifest = None
+                    if attempt:
+                        raise
+            return list(self._segments.values()), self._deleted, self._totals
+
+    # Writes
+
+    def add_documents(self, documents):
+        """Add or replace documents (see make_document)"""
+        documents = list(documents)
+        if not documents:
+            return
+        name = write_segment(self.directory, documents)
+        with self._locked():
+            manifest = self._read_manifest()
+            manifest['generation'] += 1
+            generation = manifest['generation']
+            manifest['segments'].append({'name': name, 'gen': generation, 'docs': len(documents)})
+            # Older copies of these documents die; the new segment's copy lives
+            for document in documents:
+                manifest['deleted'][str(document['id'])] = generation
+            self._write_manifest(manifest)
+
+    def delete_documents(self, doc_ids):
+        """Remove documents from the index"""
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return
+        with self._locked():
+            manifest = self._read_manifest()
+            manifest['generation'] += 1
+            for doc_id in doc_ids:
+                manifest['deleted'][str(doc_id)] = manifest['generation']
+            self._write_manifest(manifest)
+
+    def reserve_generation(self):
+        """Reserve a generation number for an online rebuild"""
+        with self._locked():
+            manifest = self._read_manifest()
+            manifest['generation'] += 1
+            self._write_manifest(manifest)
+            return manifest['generation']
+
+    def replace_segments(self, generation, segments):
+        """
+        Install segments written by a rebuild that reserved ``generation``.
+
+        Segments older than the rebuild are dropped. Segments and tombstones
+        written by live updates while the rebuild ran are newer and survive.
+        """
+        with self._locked():
+            manifest = self._read_manifest()
+            dropped = [entry for entry in manifest['segments'] if entry['gen'] < generation]
+            manifest['segments'] = [
+                {'name': name, 'gen': generation, 'docs': docs} for name, docs in segments
+            ] + [entry for entry in manifest['segments'] if entry['gen'] >= generation]
+            manifest['deleted'] = {
+                doc_id: gen for doc_id, gen in manifest['deleted'].items() if gen > generation
+            }
+            self._write_manifest(manifest)
+        self._remove_segment_files(entry['name'] for entry in dropped)
+
+    def _remove_segment_files(self, names):
+        # Unlinking is safe for readers that still have the files mapped
+        for name in names:
+            for suffix in ('.postings', '.terms'):
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except FileNotFoundError:
+                    pass
+
+    # Merging
+
+    def merge(self, max_segments=MAX_SEGMENTS, force=False):
+        """
+        Merge the smallest segments together when there are too many.
+
+        Deleted and expired documents are dropped from the merged segment. The
+        merge itself runs without the write lock; only the manifest swap is
+        locked, and it is abandoned if another process merged the same
+        segments first.
+
+        Returns:
+            bool: True if a merge happened
+        """
+        manifest = self._read_manifest()
+        entries = sorted(manifest['segments'], key=lambda entry: entry['docs'])
+        if len(entries) <= 1 or (not force and len(entries) <= max_segments):
+            return False
+
+        chosen = entries if force else entries[:len(entries) - max_segments // 2 + 1]
+        deleted = {int(doc_id): gen for doc_id, gen in manifest['deleted'].items()}
+        now = time.time()
+
+        documents = {}
+        for entry in chosen:
+            segment = Segment(self.directory, entry['name'], entry['gen'])
+            try:
+                for doc_id, (content_len, title_len, expires) in segment.docs.items():
+                    if deleted.get(doc_id, 0) > segment.generation:
+                        continue
+                    if expires is not None and expires <= now:
+                        continue
+                    documents[doc_id] = {'gen': segment.generation, 'lengths': [content_len, title_len, expires], 'terms': {}}
+                for term in segment.terms:
+                    for doc_id, tf in segment.postings(term):
+                        document = documents.get(doc_id)
+                        if document and document['gen'] == segment.generation:
+                            document['terms'][term] = tf
+            finally:
+                segment.close()
+
+        name = self._write_merged_segment(documents)
+        generation = max(entry['gen'] for entry in chosen)
+        chosen_names = {entry['name'] for entry in chosen}
+
+        with self._locked():
+            current = self._read_manifest()
+            if not chosen_names <= {entry['name'] for entry in current['segments']}:
+                self._remove_segment_files([name])
+                return False
+            current['segments'] = [
+                entry for entry in current['segments'] if entry['name'] not in chosen_names
+            ] + [{'name': name, 'gen': generation, 'docs': len(documents)}]
+            # A tombstone is only needed while an older segment could hold the doc
+            oldest = min(entry['gen'] for entry in current['segments'])
+            current['deleted'] = {
+                doc_id: gen for doc_id, gen in current['deleted'].items() if gen > oldest
+            }
+            self._write_manifest(current)
+
+        self._remove_segment_files(chosen_names)
+        logger.info(f"Merged {len(chosen)} search segments into {name} ({len(documents)} docs)")
+        return True
+
+    def _write_merged_segment(self, documents):
+        name = f'seg-{uuid.uuid4().hex[:12]}'
+        inverted = {}
+        for doc_id, document in documents.items():
+            for term, tf in document['terms'].items():
+                inverted.setdefault(term, []).append((doc_id, tf))
+
+        docs = {doc_id: document['lengths'] for doc_id, document in documents.items()}
+        _write_segment_files(self.directory, name, inverted, docs)
+        return name
+
+    # Search
+
+    def search(self, query, field='content', offset=0, limit=20, now=None):
+        """
+        Rank live, unexpired documents for a query with BM25.
+
+        Every query word must match: all of its identifier parts have to occur
+        in the searched field. Whole-identifier matches add to the score.
+
+        Returns:
+            tuple: (list of (doc_id, score), total matching documents)
+        """
+        words = query_words(query)
+        if not words:
+            return [], 0
+
+        prefix = TITLE_PREFIX if field == 'title' else ''
+        length_index = 1 if field == 'title' else 0
+        now = now if now is not None else time.time()
+        segments, deleted, totals = self._snapshot()
+
+        total_docs = totals[0]
+        if total_docs <= 0:
+            return [], 0
+        average_length = (totals[1 + length_index] / total_docs) or 1.0
+
+        # Only the query terms' posting lists are read: doc id -> (tf, stats)
+        # for the live copy of each document
+        def live_postings(term):
+            result = {}
+            for segment in segments:
+                for doc_id, tf in segment.postings(prefix + term):
+                    if deleted.get(doc_id, 0) <= segment.generation:
+                        result[doc_id] = (tf, segment.docs[doc_id])
+            return result
+
+        postings_cache = {}
+
+        def postings_for(term):
+            if term not in postings_cache:
+                postings_cache[term] = live_postings(term)
+            return postings_cache[term]
+
+        # Candidates: documents containing every part of every query word
+        candidates = None
+        for _, parts in words:
+            for part in parts:
+                docs = set(postings_for(part))
+                candidates = docs if candidates is None else candidates & docs
+                if not candidates:
+                    return [], 0
+
+        # Every candidate is in the first part's postings, with its stats
+        first = postings_for(words[0][1][0])
+        candidates = {
+            doc_id for doc_id in candidates
+            if first[doc_id][1][2] is None or first[doc_id][1][2] > now
+        }
+
+        scores = dict.fromkeys(candidates, 0.0)
+        scored_terms = {term for full, parts in words for term in [full, *parts]}
+        for term in scored_terms:
+            postings = postings_for(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id in candidates:
+                entry = postings.get(doc_id)
+                if not entry:
+                    continue
+                tf, stats = entry
+                length = stats[length_index]
+                scores[doc_id] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average_length))
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return ranked[offset:offset + limit], len(ranked)
+
+
+# Background merging
+
+_mergers = {}
+
+
+def start_background_merger(index, interval=60):
+    """Start (once per process and index) a daemon thread that merges segments"""
+    if index.directory in _mergers:
+        return _mergers[index.directory]
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                while index.merge():
+                    pass
+            except Exception as e:
+                logger.error(f"Search index merge failed: {e}")
+
+    thread = threading.Thread(target=run, name='search-index-merger', daemon=True)
+    thread.start()
+    _mergers[index.directory] = thread
+    return thread
@@ -0,0 +1,291 @@
+"""
+Search query language for search.search.
+
+A query mixes free text with field operators:
+
+    lang:python user:alice tag:flask title:"rate limit" after:2024-01-01 session cookie
+
+    lang:     paste syntax (repeat for any of several)
+    user:     author username, case-insensitive; * is a wildcard
+    tag:      tag name, case-insensitive; * is a wildcard; repeat to require all
+    title:    substring of the title; repeat to require all
+    before:   created before a YYYY-MM-DD date (exclusive)
+    after:    created on or after a YYYY-MM-DD date (inclusive)
+
+Anything else is free text, matched through the database's full-text index
+when one is installed. The whole query compiles into a single SQL statement
+that joins users and semi-joins tags, pages the results and counts them.
+"""
+
+import os
+import re
+import json
+import logging
+from datetime import datetime
+
+from sqlalchemy import or_, text
+
+from utils.search_backends import (
+    PUBLIC_FILTER, LikeSearchBackend, PostgresFullTextBackend, SQLiteFullTextBackend,
+    get_search_backend,
+)
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = ('lang', 'user', 'tag', 'title', 'before', 'after')
+TOKEN_RE = re.compile(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))')
+
+# Counting stops at this many matches; beyond it the total is an estimate
+COUNT_CAP = int(os.environ.get('SEARCH_COUNT_CAP', 1000))
+
+# Page of ids, total and estimate flag per normalised query and page
+_result_cache = TTLCache(maxsize=2048, ttl=int(os.environ.get('SEARCH_CACHE_TTL', 30)))
+
+
+def _quote(value):
+    return f'"{value}"' if re.search(r'\s', value) else value
+
+
+def _like_pattern(value):
+    """LIKE pattern for an operator value, turning * into a wildcard"""
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped.replace('*', '%').lower()
+
+
+class SearchQuery:
+    """A parsed search query"""
+
+    def __init__(self, text='', langs=(), users=(), tags=(), titles=(), before=None, after=None):
+        self.text = text
+        self.langs = list(langs)
+        self.users = list(users)
+        self.tags = list(tags)
+        self.titles = list(titles)
+        self.before = before
+        self.after = after
+
+    @classmethod
+    def parse(cls, raw):
+        """Parse query text; unknown operators and bad dates stay free text"""
+        query = cls()
+        words = []
+        for match in TOKEN_RE.finditer(raw or ''):
+            operator = (match.group(1) or '').lower()
+            value = match.group(2) if match.group(2) is not None else match.group(3)
+
+            if operator in ('before', 'after'):
+                try:
+                    setattr(query, operator, datetime.strptime(value, '%Y-%m-%d'))
+                    continue
+                except ValueError:
+                    pass
+            elif operator in OPERATORS and value:
+                target = {'lang': query.langs, 'user': query.users,
+                          'tag': query.tags, 'title': query.titles}[operator]
+                target.append(value.lower() if operator == 'lang' else value)
+                continue
+            words.append(match.group(0))
+
+        query.text = ' '.join(words)
+        return query
+
+    @property
+    def has_filters(self):
+        return bool(self.langs or self.users or self.tags or self.titles
+                    or self.before or self.after)
+
+    def normalized(self):
+        """Canonical form of the query, used as its cache key"""
+        parts = [' '.join(self.text.lower().split())]
+        parts += [f'lang:{_quote(value)}' for value in sorted(set(self.langs))]
+        parts += [f'user:{_quote(value.lower())}' for value in sorted(set(self.users))]
+        parts += [f'tag:{_quote(value.lower())}' for value in sorted(set(self.tags))]
+        parts += [f'title:{_quote(value.lower())}' for value in sorted(set(self.titles))]
+        if self.before:
+            parts.append(f'before:{self.before:%Y-%m-%d}')
+        if self.after:
+            parts.append(f'after:{self.after:%Y-%m-%d}')
+        return ' '.join(part for part in parts if part)
+
+    def __bool__(self):
+        return bool(self.text.strip()) or self.has_filters
+
+
+def compile_search_query(query, conn, now=None, backend=None):
+    """
+    Compile a SearchQuery into SQL fragments.
+
+    Returns:
+        tuple: (FROM/WHERE sql, params, rank expression or None)
+    """
+    dialect = conn.dialect.name
+    like = 'ILIKE' if dialect == 'postgresql' else 'LIKE'
+    sources = ["pastes p"]
+    where = [PUBLIC_FILTER]
+    params = {'visibility': 'public', 'now': now or datetime.utcnow()}
+    rank = None
+
+    if query.langs:
+        names = []
+        for number, lang in enumerate(query.langs):
+            params[f'lang{number}'] = lang
+            names.append(f':lang{number}')
+        where.append(f"p.syntax IN ({', '.join(names)})")
+
+    if query.users:
+        sources.append("JOIN users u ON u.id = p.user_id")
+        matches = []
+        for number, user in enumerate(query.users):
+            params[f'user{number}'] = _like_pattern(user)
+            matches.append(f"lower(u.username) LIKE :user{number} ESCAPE '\\'")
+        where.append(f"({' OR '.join(matches)})")
+
+    for number, tag in enumerate(query.tags):
+        params[f'tag{number}'] = _like_pattern(tag)
+        where.append(f"""EXISTS (
+            SELECT 1 FROM paste_tags pt JOIN tags t ON t.id = pt.tag_id
+            WHERE pt.paste_id = p.id AND lower(t.name) LIKE :tag{number} ESCAPE '\\'
+        )""")
+
+    for number, title in enumerate(query.titles):
+        params[f'title{number}'] = LikeSearchBackend._pattern(title)
+        where.append(f"p.title {like} :title{number} ESCAPE '\\'")
+
+    if query.before:
+        params['before'] = query.before
+        where.append("p.created_at < :before")
+    if query.after:
+        params['after'] = query.after
+        where.append("p.created_at >= :after")
+
+    if query.text.strip():
+        # Encrypted content is not searchable; the filters still match those pastes
+        where.append("p.is_encrypted IS NOT TRUE")
+        backend = backend or get_search_backend(conn)
+        if isinstance(backend, PostgresFullTextBackend):
+            config = backend.config
+            sources.append(f"CROSS JOIN websearch_to_tsquery('{config}', :text) AS q(tsq)")
+            where.append("p.search_vector @@ q.tsq")
+            params['text'] = query.text
+            rank = "ts_rank_cd(p.search_vector, q.tsq)"
+        elif isinstance(backend, SQLiteFullTextBackend) and backend.name == SQLiteFullTextBackend.name:
+            match = backend.build_match(query.text, 'content')
+            if match:
+                sources.append(f"""JOIN (
+                    SELECT rowid, bm25({backend.table}, {backend.title_weight}, {backend.content_weight}) AS rank
+                    FROM {backend.table} WHERE {backend.table} MATCH :match
+                ) AS m ON m.rowid = p.id""")
+                params['match'] = match
+                rank = "-m.rank"
+        else:
+            for number, word in enumerate(query.text.split()):
+                params[f'text{number}'] = LikeSearchBackend._pattern(word)
+                where.append(f"p.content {like} :text{number} ESCAPE '\\'")
+
+    sql = f"FROM {' '.join(sources)} WHERE {' AND '.join(where)}"
+    return sql, params, rank
+
+
+def _estimate_rows(conn, sql, params):
+    """Planner row estimate for a query on PostgreSQL"""
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) SELECT 1 {sql}"), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def run_search_query(conn, query, page=1, per_page=20, count_mode='estimate', now=None, backend=None):
+    """
+    Execute a SearchQuery for one page.
+
+    In 'estimate' mode counting stops at COUNT_CAP matches, and past the cap
+    the total comes from the PostgreSQL planner (or is reported as the cap on
+    other databases). 'exact' mode counts every match.
+
+    Returns:
+        tuple: (list of paste ids, total, whether the total is an estimate)
+    """
+    page = max(page, 1)
+    cache_key = (query.normalized(), page, per_page, count_mode)
+    cached = _result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    sql, params, rank = compile_search_query(query, conn, now=now, backend=backend)
+    order = f"{rank} DESC, p.created_at DESC" if rank else "p.created_at DESC"
+    params.update({'limit': per_page, 'offset': (page - 1) * per_page, 'cap': COUNT_CAP})
+
+    if count_mode == 'exact':
+        total_sql = "COUNT(*) OVER ()"
+        count_sql = f"SELECT COUNT(*) {sql}"
+    else:
+        count_sql = f"SELECT COUNT(*) FROM (SELECT 1 {sql} LIMIT :cap) AS capped"
+        total_sql = f"({count_sql})"
+
+    rows = conn.execute(text(f"""
+        SELECT p.id, {total_sql} AS total
+        {sql}
+        ORDER BY {order}
+        LIMIT :limit OFFSET :offset
+    """), params).fetchall()
+
+    paste_ids = [row[0] for row in rows]
+    total = rows[0][1] if rows else 0
+    estimated = False
+    if not rows and page > 1:
+        # Past the last page there is no row to carry the total
+        total = conn.execute(text(count_sql), params).scalar()
+    if count_mode != 'exact' and total >= COUNT_CAP:
+        estimated = True
+        if conn.dialect.name == 'postgresql':
+            total = max(total, _estimate_rows(conn, sql, params))
+
+    result = (paste_ids, total, estimated)
+    _result_cache.set(cache_key, result)
+    return result
+
+
+def search_with_query(conn, raw_query, page=1, per_page=20, count_mode='estimate', query=None):
+    """
+    Parse and run a query-language search and load one page of Paste objects.
+
+    Returns:
+        SearchPage: Paginated results with snippets for free-text matches
+    """
+    # Import Paste inside the function to avoid circular imports
+    from models import Paste
+    from utils.search_backends import SearchPage, render_snippet
+
+    query = query or SearchQuery.parse(raw_query)
+    if not query:
+        return SearchPage([], page, per_page, 0)
+
+    backend = get_search_backend(conn)
+    paste_ids, total, estimated = run_search_query(conn, query, page=page, per_page=per_page,
+                                                   count_mode=count_mode, backend=backend)
+
+    items = []
+    if paste_ids:
+        # The ids may be up to SEARCH_CACHE_TTL seconds old: drop pastes made
+        # private, deleted or expired since (or encrypted, for a text match)
+        now = datetime.utcnow()
+        visible = Paste.query.filter(
+            Paste.id.in_(paste_ids),
+            Paste.visibility == 'public',
+            or_(Paste.expires_at.is_(None), Paste.expires_at > now),
+        )
+        if query.text.strip():
+            visible = visible.filter(Paste.is_encrypted.isnot(True))
+        pastes_by_id = {paste.id: paste for paste in visible}
+        items = [pastes_by_id[paste_id] for paste_id in paste_ids if paste_id in pastes_by_id]
+        paste_ids = [paste.id for paste in items]
+
+    snippets = {}
+    if query.text.strip() and paste_ids:
+        snippets = {
+            paste_id: render_snippet(raw)
+            for paste_id, raw in backend.snippets(conn, query.text, 'content', paste_ids).items()
+        }
+
+    return SearchPage(items, page, per_page, total, snippets=snippets, total_is_estimate=estimated)
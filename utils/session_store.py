@@ -0,0 +1,342 @@
+"""
+Server-side sessions with an opaque session ID in the cookie.
+
+Flask's default session keeps everything (the login, flashed messages, CSRF
+token, unlocked pastes, the viewer ID) in a signed cookie that is sent and
+verified with every request, static files included. With SESSION_STORE set
+to 'database' (the default) or 'sqlite', the cookie holds only a random
+session ID and the data lives in a flask_sessions table:
+
+- 'database': the application database, shared by every host.
+- 'sqlite': a local SQLite file (SESSION_STORE_PATH) shared by every worker
+  on the host. Use it with a single host, or sticky load balancing.
+- 'cookie': Flask's signed cookie sessions, as before.
+
+Each worker keeps the most recently used SESSION_CACHE_SIZE sessions in
+memory. Every save stores a new random version token, and a cached session
+is used only if its token still matches the stored row, checked by a primary
+key lookup that skips the data when it is unchanged. A worker whose
+concurrent write was overwritten therefore holds a token that no longer
+matches and reloads, so a change made by another worker is always seen.
+
+A session is loaded on first use, so requests that never touch it (static
+files, most anonymous page views) do no lookup, and it is stored and a cookie
+set only once it holds something. Visitors who never log in, flash a message
+or submit a form get no session at all. Logging in or out issues a new
+session ID.
+"""
+
+import os
+import re
+import copy
+import secrets
+import tempfile
+import threading
+from datetime import datetime
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import Column, DateTime, MetaData, String, Table, Text, create_engine, event, text
+
+from utils.ttl_cache import TTLCache
+
+STORE = os.environ.get('SESSION_STORE', 'database')
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'flaskbin-sessions.db')
+STORE_PATH = os.environ.get('SESSION_STORE_PATH', DEFAULT_PATH)
+CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 10000))
+
+SESSION_ID = re.compile(r'[A-Za-z0-9_-]{43}')
+
+metadata = MetaData()
+
+sessions_table = Table(
+    'flask_sessions', metadata,
+    Column('id', String(64), primary_key=True),
+    Column('data', Text, nullable=False),
+    Column('version', String(32), nullable=False),
+    Column('expires_at', DateTime, nullable=False, index=True),
+)
+
+serializer = TaggedJSONSerializer()
+
+
+class SessionStore:
+    """Session rows in ``engine`` behind an in-memory LRU tier"""
+
+    def __init__(self, engine, cache_size=None):
+        self.engine = engine
+        self.cache = TTLCache(maxsize=CACHE_SIZE if cache_size is None else cache_size, ttl=365 * 86400)
+        sessions_table.create(engine, checkfirst=True)
+
+    def load(self, sid, now=None):
+        """
+        Returns:
+            tuple: (data, version, expires_at), or None if there is no such
+            session or it has expired
+        """
+        cached = self.cache.get(sid)
+        with self.engine.connect() as conn:
+            row = conn.execute(text("""
+                SELECT version, expires_at, CASE WHEN version = :cached THEN NULL ELSE data END AS data
+                FROM flask_sessions WHERE id = :id
+            """).columns(expires_at=DateTime), {'id': sid, 'cached': cached[0] if cached else ''}).fetchone()
+        if row is None or row.expires_at < (now or datetime.utcnow()):
+            self.cache.pop(sid)
+            return None
+        if row.data is None:
+            # Copied, so changes to nested values do not leak into the cache
+            return copy.deepcopy(cached[1]), row.version, row.expires_at
+        data = serializer.loads(row.data)
+        self.cache.set(sid, (row.version, copy.deepcopy(data)))
+        return data, row.version, row.expires_at
+
+    def save(self, sid, data, version, expires_at):
+        data = copy.deepcopy(dict(data))
+        with self.engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO flask_sessions (id, data, version, expires_at)
+                VALUES (:id, :data, :version, :expires_at)
+                ON CONFLICT (id) DO UPDATE
+                SET data = excluded.data, version = excluded.version, expires_at = excluded.expires_at
+            """), {'id': sid, 'data': serializer.dumps(data), 'version': version, 'expires_at': expires_at})
+        self.cache.set(sid, (version, data))
+
+    def touch(self, sid, expires_at):
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE flask_sessions SET expires_at = :expires_at WHERE id = :id"),
+                         {'id': sid, 'expires_at': expires_at})
+
+    def delete(self, sid):
+        self.cache.pop(sid)
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM flask_sessions WHERE id = :id"), {'id': sid})
+
+    def purge(self, now=None):
+        """Delete expired sessions; returns how many"""
+        with self.engine.begin() as conn:
+            return conn.execute(text("DELETE FROM flask_sessions WHERE expires_at < :now"),
+                                {'now': now or datetime.utcnow()}).rowcount
+
+
+def sqlite_engine(path):
+    """An engine for a local session file shared by the workers of a host"""
+    engine = create_engine(f"sqlite:///{path}", connect_args={'timeout': 10, 'check_same_thread': False})
+
+    @event.listens_for(engine, 'connect')
+    def configure(connection, record):
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+    return engine
+
+
+class ServerSideSession(dict, SessionMixin):
+    """
+    A session loaded from the store the first time it is used.
+
+    Reading marks it accessed (so responses vary on the cookie) and changing
+    it marks it modified, like Flask's cookie session.
+    """
+
+    def __init__(self, loader=None, sid=None):
+        super().__init__()
+        self._loader = loader
+        self.sid = sid
+        self.version = None
+        self.expires_at = None
+        self.user_id = None
+        self.modified = False
+        self.accessed = False
+
+    @property
+    def new(self):
+        return self.sid is None
+
+    def _load(self):
+        self.accessed = True
+        if self._loader is not None:
+            loader, self._loader = self._loader, None
+            loaded = loader()
+            if loaded is None:
+                self.sid = None
+            else:
+                data, self.version, self.expires_at = loaded
+                dict.update(self, data)
+                self.user_id = data.get('_user_id')
+
+    def _change(self):
+        self._load()
+        self.modified = True
+
+    def __getitem__(self, key):
+        self._load()
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self._load()
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        self._load()
+        return dict.__contains__(self, key)
+
+    def __iter__(self):
+        self._load()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._load()
+        return dict.__len__(self)
+
+    def keys(self):
+        self._load()
+        return dict.keys(self)
+
+    def values(self):
+        self._load()
+        return dict.values(self)
+
+    def items(self):
+        self._load()
+        return dict.items(self)
+
+    def copy(self):
+        self._load()
+        return dict(self)
+
+    def __repr__(self):
+        self._load()
+        return f'<ServerSideSession {dict.__repr__(self)}>'
+
+    def __setitem__(self, key, value):
+        self._change()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._change()
+        dict.__delitem__(self, key)
+
+    def setdefault(self, key, default=None):
+        self._load()
+        if not dict.__contains__(self, key):
+            self.modified = True
+        return dict.setdefault(self, key, default)
+
+    def pop(self, key, *default):
+        self._load()
+        if dict.__contains__(self, key):
+            self.modified = True
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        self._change()
+        return dict.popitem(self)
+
+    def update(self, *args, **kwargs):
+        self._change()
+        dict.update(self, *args, **kwargs)
+
+    def clear(self):
+        self._change()
+        dict.clear(self)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface storing sessions in a SessionStore"""
+
+    def __init__(self, store_factory):
+        self._store_factory = store_factory
+        self._store = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = self._store_factory()
+        return self._store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or not SESSION_ID.fullmatch(sid):
+            return ServerSideSession()
+        return ServerSideSession(loader=lambda: self.store.load(sid), sid=sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+        if session._loader is not None:
+            # Never used during the request
+            return
+
+        if not session:
+            if session.sid is not None and session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app), httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        lifetime = app.permanent_session_lifetime
+        expires_at = datetime.utcnow() + lifetime
+        if not session.modified:
+            # Extend an idle session at most twice per lifetime
+            if session.expires_at is not None and session.expires_at - datetime.utcnow() < lifetime / 2:
+                self.store.touch(session.sid, expires_at)
+                if session.permanent:
+                    self._set_cookie(app, session, response, session.sid)
+            return
+
+        sid = session.sid
+        if sid is None or dict.get(session, '_user_id') != session.user_id:
+            # A new login (or logout) gets a new ID, so an old one cannot be reused
+            if sid is not None:
+                self.store.delete(sid)
+            sid = secrets.token_urlsafe(32)
+        # A random token rather than a counter: two workers saving the same
+        # session at once never end up with the same version
+        self.store.save(sid, session, secrets.token_hex(16), expires_at)
+        self._set_cookie(app, session, response, sid)
+
+    def _set_cookie(self, app, session, response, sid):
+        response.set_cookie(
+            self.get_cookie_name(app), sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def init_session_store(app, db=None):
+    """Install server-side sessions on ``app`` unless SESSION_STORE is 'cookie'"""
+    if STORE == 'cookie':
+        return None
+    if STORE == 'database':
+        def factory():
+            with app.app_context():
+                return SessionStore(db.engine)
+    elif STORE == 'sqlite':
+        def factory():
+            return SessionStore(sqlite_engine(STORE_PATH))
+    else:
+        raise ValueError(f"Unknown SESSION_STORE {STORE!r}: use sqlite, database or cookie")
+    app.session_interface = ServerSideSessionInterface(factory)
+    return app.session_interface
+
+
+def purge_expired_sessions(app):
+    """Delete expired server-side sessions; returns how many (0 with cookie sessions)"""
+    interface = app.session_interface
+    if not isinstance(interface, ServerSideSessionInterface):
+        return 0
+    return interface.store.purge()
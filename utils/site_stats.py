@@ -0,0 +1,222 @@
+"""
+Site-wide statistics for the admin dashboard and reports.
+
+Numbers come from four tiers, picked by how much they cost to compute:
+
+* Exact counters: activity in the last 24 hours, a range scan on the
+  single-column created_at indexes of users, pastes and comments (created
+  by add_query_indexes.py) that stays cheap however large the tables get.
+* Catalog estimates: table totals. On PostgreSQL these are read from
+  pg_stat_user_tables (n_live_tup), which is free but approximate; SQLite has
+  no row estimates so it counts, which is fine at the sizes it is used for.
+* AI summary cache use over the last week, counted from summary_jobs (a
+  small table kept to 30 days by prune_expired.py).
+* Scheduled snapshots: distributions that need a full scan (top syntaxes,
+  visibility split, total views, distinct authors). refresh_site_stats.py
+  recomputes them from cron and stores the result in site_stats_snapshots,
+  and readers only ever see the stored copy.
+
+Every section carries the time it was computed so the dashboard can show how
+fresh it is.
+"""
+
+import os
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, text
+
+from utils.summary_cache import summary_cache_stats
+from utils.ttl_cache import TTLCache
+from utils.view_partitions import rolled_up_views, view_source
+
+# Seconds between scheduled snapshot refreshes; snapshots older than twice
+# this are flagged as stale
+SNAPSHOT_INTERVAL = int(os.environ.get('SITE_STATS_SNAPSHOT_INTERVAL', 900))
+
+# Seconds the combined live/estimate reads are reused across requests
+CACHE_TTL = int(os.environ.get('SITE_STATS_CACHE_TTL', 60))
+
+TOTAL_TABLES = {
+    'users': 'users',
+    'pastes': 'pastes',
+    'comments': 'comments',
+    'views': 'paste_views',
+}
+
+_cache = TTLCache(maxsize=4, ttl=CACHE_TTL)
+
+
+def estimate_totals(conn):
+    """
+    Row totals for the main tables.
+
+    Returns:
+        tuple: ({name: count}, is_estimate)
+    """
+    if conn.dialect.name == 'postgresql':
+        # A partitioned parent has no rows of its own; its partitions are
+        # summed under the parent's name
+        rows = conn.execute(text("""
+            SELECT COALESCE(parent.relname, s.relname), SUM(s.n_live_tup)
+            FROM pg_stat_user_tables s
+            LEFT JOIN pg_inherits i ON i.inhrelid = s.relid
+            LEFT JOIN pg_class parent ON parent.oid = i.inhparent
+            WHERE s.schemaname = current_schema()
+              AND COALESCE(parent.relname, s.relname) IN :tables
+            GROUP BY 1
+        """).bindparams(bindparam('tables', expanding=True)),
+            {'tables': list(TOTAL_TABLES.values())}).fetchall()
+        by_table = {name: int(count) for name, count in rows}
+        totals = {name: by_table.get(table, 0) for name, table in TOTAL_TABLES.items()}
+        totals['views'] += rolled_up_views(conn)
+        return totals, True
+
+    totals = {
+        name: conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+        for name, table in TOTAL_TABLES.items() if name != 'views'
+    }
+    # Live views may span several monthly tables; dropped months are rollups
+    totals['views'] = (conn.execute(text(f"SELECT COUNT(*) FROM {view_source(conn)} v")).scalar()
+                       + rolled_up_views(conn))
+    return totals, False
+
+
+def count_recent(conn, now=None, hours=24):
+    """Exact counts of rows created in the last ``hours`` hours"""
+    since = (now or datetime.utcnow()) - timedelta(hours=hours)
+    row = conn.execute(text("""
+        SELECT
+            (SELECT COUNT(*) FROM users WHERE created_at >= :since),
+            (SELECT COUNT(*) FROM pastes WHERE created_at >= :since),
+            (SELECT COUNT(*) FROM comments WHERE created_at >= :since)
+    """), {'since': since}).one()
+    return dict(zip(('users', 'pastes', 'comments'), row))
+
+
+def compute_paste_snapshot(conn, now=None):
+    """Full-scan paste distributions; only called by the scheduled refresh"""
+    now = now or datetime.utcnow()
+    counts = conn.execute(text("""
+        SELECT COUNT(*), COUNT(DISTINCT user_id), COALESCE(SUM(views), 0)
+        FROM pastes
+    """)).one()
+    languages = conn.execute(text("""
+        SELECT syntax, COUNT(*) AS count
+        FROM pastes
+        WHERE syntax IS NOT NULL AND syntax != ''
+        GROUP BY syntax
+        ORDER BY count DESC
+        LIMIT 10
+    """)).fetchall()
+    visibility = conn.execute(text("""
+        SELECT visibility, COUNT(*) AS count
+        FROM pastes
+        GROUP BY visibility
+        ORDER BY count DESC
+    """)).fetchall()
+    active = conn.execute(text("""
+        SELECT COUNT(*) FROM pastes WHERE expires_at IS NULL OR expires_at > :now
+    """), {'now': now}).scalar()
+
+    return {
+        'total_pastes': counts[0],
+        'total_users_with_pastes': counts[1],
+        'total_views': int(counts[2] or 0),
+        'active_pastes': active,
+        'top_languages': [{'language': language, 'count': count} for language, count in languages],
+        'visibility_distribution': {vis: count for vis, count in visibility},
+    }
+
+
+SNAPSHOTS = {
+    'pastes': compute_paste_snapshot,
+}
+
+
+def refresh_site_stats(conn, names=None, now=None):
+    """
+    Recompute snapshots and store them in site_stats_snapshots.
+
+    Returns:
+        dict: {name: seconds taken}
+    """
+    now = now or datetime.utcnow()
+    timings = {}
+    for name in names or SNAPSHOTS:
+        started = time.perf_counter()
+        data = SNAPSHOTS[name](conn, now)
+        timings[name] = time.perf_counter() - started
+        conn.execute(text("""
+            INSERT INTO site_stats_snapshots (name, data, computed_at, duration_ms)
+            VALUES (:name, :data, :computed_at, :duration_ms)
+            ON CONFLICT (name) DO UPDATE SET
+                data = excluded.data,
+                computed_at = excluded.computed_at,
+                duration_ms = excluded.duration_ms
+        """), {
+            'name': name,
+            'data': json.dumps(data),
+            'computed_at': now,
+            'duration_ms': int(timings[name] * 1000),
+        })
+    _cache.clear()
+    return timings
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def get_snapshot(conn, name):
+    """
+    The stored snapshot called ``name``.
+
+    Returns:
+        tuple: (data dict, computed_at), or (None, None) before the first refresh
+    """
+    row = conn.execute(text(
+        "SELECT data, computed_at FROM site_stats_snapshots WHERE name = :name"
+    ), {'name': name}).first()
+    if row is None:
+        return None, None
+    return json.loads(row[0]), _as_datetime(row[1])
+
+
+def is_stale(computed_at, now=None):
+    """True if a snapshot has missed at least one scheduled refresh"""
+    if computed_at is None:
+        return True
+    return (now or datetime.utcnow()) - computed_at > timedelta(seconds=2 * SNAPSHOT_INTERVAL)
+
+
+def get_site_stats(conn, now=None):
+    """
+    Everything the admin dashboard shows, with a timestamp per tier.
+
+    Totals and recent counts are cached for CACHE_TTL seconds so repeated
+    dashboard loads do not hit the database; snapshots are read as stored.
+    """
+    now = now or datetime.utcnow()
+    live = _cache.get('live')
+    if live is None:
+        totals, estimated = estimate_totals(conn)
+        live = {
+            'totals': totals,
+            'totals_estimated': estimated,
+            'recent': count_recent(conn, now),
+            'summary_cache': summary_cache_stats(conn, now=now),
+            'live_at': now,
+        }
+        _cache.set('live', live)
+
+    snapshot, snapshot_at = get_snapshot(conn, 'pastes')
+    return dict(
+        live,
+        snapshot=snapshot,
+        snapshot_at=snapshot_at,
+        snapshot_stale=is_stale(snapshot_at, now),
+    )
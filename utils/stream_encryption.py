@@ -0,0 +1,244 @@
+"""
+Segmented AES-GCM encryption for pastes ('aead-password' and 'aead-random').
+
+Fernet needs the whole plaintext in memory, and encrypt_content() base64
+encodes Fernet's already base64 encoded token again, so an encrypted paste
+took about 1.78 times its size and several full copies of it were held while
+encrypting or decrypting. This format encrypts in fixed-size segments and
+stores raw bytes, one row per segment, in the paste_cipher_segments table.
+The rows of a paste, concatenated in order, are:
+
+    header   'FBS1' | segment size (uint32, big-endian) | 7-byte nonce prefix
+    segment  AES-256-GCM(plaintext[i * size:(i + 1) * size]) with its 16-byte tag
+
+Each segment's nonce is the prefix, the segment's index (uint32) and a byte
+that is 1 only for the last segment, and the header is authenticated with
+every segment, so reordered, dropped or truncated segments fail to decrypt.
+Raw and download responses decrypt one segment at a time as they are sent.
+
+Keys are 32 bytes, passed around URL-safe base64 encoded like Fernet keys:
+derived from the password and encryption_salt with derive_password_key() for
+'aead-password', random and kept in encryption_salt (and the ?key= link) for
+'aead-random'. Pastes encrypted with Fernet keep their methods and still read.
+"""
+
+import os
+import base64
+import codecs
+import struct
+import logging
+import itertools
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SIZE = int(os.environ.get('ENCRYPTION_SEGMENT_SIZE', 64 * 1024))
+
+MAGIC = b'FBS1'
+HEADER = struct.Struct('>4sI7s')
+TAG_SIZE = 16
+
+PASSWORD_METHODS = ('fernet-password', 'aead-password')
+URL_KEY_METHODS = ('fernet-random', 'aead-random')
+STREAM_METHODS = ('aead-password', 'aead-random')
+
+
+class DecryptionError(Exception):
+    """Wrong key, or ciphertext that is malformed, truncated or tampered with"""
+
+
+def is_stream_encrypted(paste):
+    return bool(paste.is_encrypted) and paste.encryption_method in STREAM_METHODS
+
+
+def _aead(key):
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    return AESGCM(base64.urlsafe_b64decode(key))
+
+
+def _nonce(prefix, index, last):
+    return prefix + struct.pack('>IB', index, last)
+
+
+def encrypt_stream(pieces, key, segment_size=None):
+    """
+    Encrypt text or bytes arriving in ``pieces`` of any size.
+
+    Yields:
+        bytes: The header, then one ciphertext segment per ``segment_size``
+        bytes of plaintext (at least one, possibly empty, segment)
+    """
+    segment_size = segment_size or SEGMENT_SIZE
+    aead = _aead(key)
+    prefix = os.urandom(7)
+    header = HEADER.pack(MAGIC, segment_size, prefix)
+    yield header
+
+    buffer = bytearray()
+    index = 0
+    for piece in pieces:
+        buffer += piece.encode('utf-8') if isinstance(piece, str) else piece
+        # Keep at least one byte back so the last segment is known when input ends
+        while len(buffer) > segment_size:
+            yield aead.encrypt(_nonce(prefix, index, 0), bytes(buffer[:segment_size]), header)
+            del buffer[:segment_size]
+            index += 1
+    yield aead.encrypt(_nonce(prefix, index, 1), bytes(buffer), header)
+
+
+def decrypt_stream(pieces, key):
+    """
+    Decrypt ciphertext from encrypt_stream() arriving in ``pieces`` of any size.
+
+    Yields:
+        bytes: Plaintext, one segment at a time
+
+    Raises:
+        DecryptionError: At the first segment that fails to authenticate
+    """
+    from cryptography.exceptions import InvalidTag
+    aead = _aead(key)
+    buffer = bytearray()
+    header = None
+    index = 0
+    try:
+        for piece in pieces:
+            buffer += piece
+            if header is None:
+                if len(buffer) < HEADER.size:
+                    continue
+                header = bytes(buffer[:HEADER.size])
+                magic, segment_size, prefix = HEADER.unpack(header)
+                if magic != MAGIC:
+                    raise DecryptionError(f"Unknown encryption format {magic!r}")
+                encrypted_size = segment_size + TAG_SIZE
+                del buffer[:HEADER.size]
+            while len(buffer) > encrypted_size:
+                yield aead.decrypt(_nonce(prefix, index, 0), bytes(buffer[:encrypted_size]), header)
+                del buffer[:encrypted_size]
+                index += 1
+        if header is None:
+            raise DecryptionError("Ciphertext is too short")
+        yield aead.decrypt(_nonce(prefix, index, 1), bytes(buffer), header)
+    except InvalidTag:
+        raise DecryptionError(f"Segment {index} failed to authenticate") from None
+
+
+def iter_text(pieces, key):
+    """Decrypt to text one segment at a time (segments may split a character)"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for plaintext in decrypt_stream(pieces, key):
+        yield decoder.decode(plaintext)
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def new_key(password=None):
+    """
+    A key for a new paste.
+
+    Returns:
+        tuple: (key, encryption_salt) where encryption_salt is the base64
+        encoded salt for a password, or the key itself for a random key
+    """
+    if password:
+        from utils import derive_password_key
+        salt = os.urandom(16)
+        return derive_password_key(password, salt), base64.urlsafe_b64encode(salt).decode('utf-8')
+    key = base64.urlsafe_b64encode(os.urandom(32))
+    return key, key.decode('utf-8')
+
+
+def encrypt_paste(paste, content, password=None):
+    """
+    Set up ``paste`` as an encrypted paste and encrypt ``content`` for it.
+
+    The content column is cleared; store the returned pieces with
+    store_ciphertext() once the paste has an id.
+
+    Returns:
+        generator: Ciphertext pieces, encrypted as they are consumed
+    """
+    key, salt = new_key(password)
+    paste.is_encrypted = True
+    paste.encryption_method = 'aead-password' if password else 'aead-random'
+    paste.encryption_salt = salt
+    paste.password_protected = bool(password)
+    paste.content = ''
+    return encrypt_stream([content], key)
+
+
+def store_ciphertext(conn, paste_id, pieces):
+    """Insert one row per piece; returns the number of bytes stored"""
+    stored = 0
+    for seq, data in enumerate(pieces):
+        conn.execute(text("""
+            INSERT INTO paste_cipher_segments (paste_id, seq, data) VALUES (:paste_id, :seq, :data)
+        """), {'paste_id': paste_id, 'seq': seq, 'data': data})
+        stored += len(data)
+    return stored
+
+
+def copy_ciphertext(conn, from_paste_id, to_paste_id):
+    """Give a fork the same ciphertext (it keeps the original's key)"""
+    conn.execute(text("""
+        INSERT INTO paste_cipher_segments (paste_id, seq, data)
+        SELECT :to_paste_id, seq, data FROM paste_cipher_segments WHERE paste_id = :from_paste_id
+    """), {'from_paste_id': from_paste_id, 'to_paste_id': to_paste_id})
+
+
+def iter_ciphertext(engine, paste_id):
+    """A paste's stored rows, fetched as they are consumed"""
+    with engine.connect() as conn:
+        rows = conn.execution_options(stream_results=True, yield_per=8).execute(text("""
+            SELECT data FROM paste_cipher_segments WHERE paste_id = :paste_id ORDER BY seq
+        """), {'paste_id': paste_id})
+        for row in rows:
+            yield bytes(row.data)
+
+
+def _engine(engine):
+    if engine is not None:
+        return engine
+    from app import db
+    return db.engine
+
+
+def read_paste_text(paste, key, engine=None):
+    """
+    The whole decrypted content of a stream-encrypted paste.
+
+    Returns:
+        str: The content, or None if the key is wrong or the data damaged
+    """
+    if not key:
+        return None
+    try:
+        return ''.join(iter_text(iter_ciphertext(_engine(engine), paste.id), key))
+    except (DecryptionError, ValueError) as e:
+        logger.warning(f"Failed to decrypt paste {paste.id}: {e}")
+        return None
+
+
+def open_text_stream(paste, key, engine=None):
+    """
+    Decrypt a stream-encrypted paste lazily, for a streamed response.
+
+    The first segment is decrypted straight away so a wrong key is reported
+    before the response starts.
+
+    Returns:
+        iterator: Text pieces, or None if the key is wrong
+    """
+    if not key:
+        return None
+    chunks = iter_text(iter_ciphertext(_engine(engine), paste.id), key)
+    try:
+        first = next(chunks)
+    except (DecryptionError, ValueError, StopIteration) as e:
+        logger.warning(f"Failed to decrypt paste {paste.id}: {e}")
+        chunks.close()
+        return None
+    return itertools.chain([first], chunks)
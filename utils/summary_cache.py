@@ -0,0 +1,250 @@
+"""
+Shared cache of AI summaries keyed by paste content.
+
+Identical content gets the same summary, so forks, reposts and refreshes of
+unchanged pastes are served from the ai_summary_cache table instead of calling
+the model again. An entry is keyed by (hash of the normalised content,
+language, model, prompt version): changing SUMMARY_MODEL or bumping
+SUMMARY_PROMPT_VERSION in utils makes every older entry unreachable, and
+purge_summary_cache() deletes them. Entries expire after SUMMARY_CACHE_TTL
+seconds (30 days by default).
+
+Concurrent requests for the same key make one upstream call. Threads of one
+process wait on the first thread's flight. Processes coordinate through the
+row itself: the first one to insert it (or to take over an expired entry or
+an abandoned claim) sets claimed_at and generates; the others poll the row
+until the summary appears.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, inspect, text
+
+logger = logging.getLogger(__name__)
+
+TTL = int(os.environ.get('SUMMARY_CACHE_TTL', 30 * 86400))
+
+# Seconds after which another process may take over an unfinished claim
+CLAIM_TIMEOUT = 90
+
+# Seconds between checks while another process generates the summary
+WAIT_INTERVAL = 0.25
+
+KEY_FILTER = """
+    content_hash = :content_hash AND language = :language AND model = :model AND prompt_version = :prompt_version
+"""
+
+
+def normalize_content(content):
+    """Content with line endings, trailing whitespace and surrounding blank lines made uniform"""
+    lines = content.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip('\n')
+
+
+def content_hash(content):
+    return hashlib.sha256(normalize_content(content or '').encode('utf-8')).hexdigest()
+
+
+class _Flight:
+    """One in-process generation that other threads can wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.summary = None
+
+
+class SummaryCache:
+    """Cache for one model and prompt version"""
+
+    def __init__(self, engine, model, prompt_version, ttl=None):
+        self.engine = engine
+        self.model = model
+        self.prompt_version = prompt_version
+        self.ttl = TTL if ttl is None else ttl
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def key(self, content, language=None):
+        return {
+            'content_hash': content_hash(content),
+            'language': (language or '').lower(),
+            'model': self.model,
+            'prompt_version': self.prompt_version,
+        }
+
+    def lookup(self, key, now=None, newer_than=None):
+        """The cached summary for ``key`` if it has not expired, else None"""
+        with self.engine.connect() as conn:
+            row = conn.execute(text(f"""
+                SELECT summary, created_at, expires_at FROM ai_summary_cache WHERE {KEY_FILTER}
+            """).columns(created_at=DateTime, expires_at=DateTime), key).fetchone()
+        if row is None or row.summary is None or row.expires_at < (now or datetime.utcnow()):
+            return None
+        if newer_than is not None and row.created_at < newer_than:
+            return None
+        return row.summary
+
+    def claim(self, key, refresh=False, now=None):
+        """
+        Take the right to generate ``key``'s summary.
+
+        Succeeds for a new key, an expired entry, an entry being refreshed, or
+        a claim left unfinished for CLAIM_TIMEOUT seconds.
+        """
+        now = now or datetime.utcnow()
+        params = dict(key, now=now, stale=now - timedelta(seconds=CLAIM_TIMEOUT), refresh=refresh)
+        with self.engine.begin() as conn:
+            inserted = conn.execute(text("""
+                INSERT INTO ai_summary_cache (content_hash, language, model, prompt_version, claimed_at, created_at)
+                VALUES (:content_hash, :language, :model, :prompt_version, :now, :now)
+                ON CONFLICT (content_hash, language, model, prompt_version) DO NOTHING
+            """), params).rowcount
+            if inserted:
+                return True
+            return conn.execute(text(f"""
+                UPDATE ai_summary_cache SET claimed_at = :now
+                WHERE {KEY_FILTER}
+                AND (claimed_at IS NULL OR claimed_at < :stale)
+                AND (summary IS NULL OR expires_at < :now OR :refresh)
+            """), params).rowcount == 1
+
+    def store(self, key, summary, now=None):
+        now = now or datetime.utcnow()
+        with self.engine.begin() as conn:
+            conn.execute(text(f"""
+                UPDATE ai_summary_cache
+                SET summary = :summary, claimed_at = NULL, created_at = :now, expires_at = :expires_at
+                WHERE {KEY_FILTER}
+            """), dict(key, summary=summary, now=now, expires_at=now + timedelta(seconds=self.ttl)))
+
+    def release(self, key):
+        """Give up a claim after a failed generation so another request can retry"""
+        with self.engine.begin() as conn:
+            conn.execute(text(f"UPDATE ai_summary_cache SET claimed_at = NULL WHERE {KEY_FILTER}"), key)
+
+    def get_or_generate(self, content, language, generate, refresh=False):
+        """
+        The summary of ``content``, generating it with ``generate`` at most
+        once across every concurrent caller.
+
+        Args:
+            refresh: Generate a new summary even if a cached one is fresh
+
+        Returns:
+            tuple: (summary or None, source), where source is 'cache',
+            'coalesced' (waited for another request's call) or 'model'
+        """
+        key = self.key(content, language)
+        # A refresh must not settle for an ordinary lookup's flight, which may
+        # return the old cached summary; concurrent refreshes still share one
+        flight_key = (*key.values(), refresh)
+        with self._lock:
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[flight_key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            return flight.summary, 'coalesced'
+
+        try:
+            summary, source = self._resolve(key, content, language, generate, refresh)
+            flight.summary = summary
+            return summary, source
+        finally:
+            with self._lock:
+                del self._flights[flight_key]
+            flight.done.set()
+
+    def _resolve(self, key, content, language, generate, refresh):
+        if not refresh:
+            summary = self.lookup(key)
+            if summary:
+                return summary, 'cache'
+
+        # A refresh waiting on another process must not settle for the old entry
+        started = datetime.utcnow() if refresh else None
+        deadline = time.monotonic() + CLAIM_TIMEOUT
+        while True:
+            if self.claim(key, refresh=refresh):
+                break
+            if time.monotonic() > deadline:
+                # The claim holder is stuck; answer this request uncached
+                logger.warning(f"Gave up waiting for summary {key['content_hash'][:12]} from another process")
+                return generate(content, language=language), 'model'
+            time.sleep(WAIT_INTERVAL)
+            summary = self.lookup(key, newer_than=started)
+            if summary:
+                return summary, 'coalesced'
+
+        summary = None
+        try:
+            summary = generate(content, language=language)
+        finally:
+            if summary:
+                self.store(key, summary)
+            else:
+                self.release(key)
+        return summary, 'model'
+
+
+def purge_summary_cache(engine, model, prompt_version, now=None):
+    """
+    Delete expired entries and every entry for another model or prompt version.
+
+    Returns:
+        int: Number of entries deleted
+    """
+    now = now or datetime.utcnow()
+    with engine.begin() as conn:
+        return conn.execute(text("""
+            DELETE FROM ai_summary_cache
+            WHERE model != :model OR prompt_version != :prompt_version
+            OR (expires_at < :now AND (claimed_at IS NULL OR claimed_at < :stale))
+            OR (summary IS NULL AND (claimed_at IS NULL OR claimed_at < :stale))
+        """), {'model': model, 'prompt_version': prompt_version, 'now': now,
+               'stale': now - timedelta(seconds=CLAIM_TIMEOUT)}).rowcount
+
+
+def summary_cache_stats(conn, days=7, now=None):
+    """
+    How summary requests of the last ``days`` days were answered.
+
+    Returns:
+        dict: {'requests', 'cache', 'coalesced', 'model', 'hit_rate', 'entries'},
+        or None if the cache tables have not been created
+    """
+    inspector = inspect(conn)
+    if not inspector.has_table('ai_summary_cache') or not inspector.has_table('summary_jobs'):
+        return None
+    since = (now or datetime.utcnow()) - timedelta(days=days)
+    counts = dict(conn.execute(text("""
+        SELECT source, COUNT(*) FROM summary_jobs
+        WHERE status = 'done' AND created_at >= :since
+        GROUP BY source
+    """), {'since': since}).fetchall())
+    stats = {source: counts.get(source, 0) for source in ('cache', 'coalesced', 'model')}
+    stats['requests'] = sum(stats.values())
+    stats['hit_rate'] = (stats['cache'] + stats['coalesced']) / stats['requests'] if stats['requests'] else None
+    stats['entries'] = conn.execute(text("SELECT COUNT(*) FROM ai_summary_cache WHERE summary IS NOT NULL")).scalar()
+    return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache(engine):
+    """The process's cache for the current model and prompt version"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from utils import SUMMARY_MODEL, SUMMARY_PROMPT_VERSION
+                _cache = SummaryCache(engine, SUMMARY_MODEL, SUMMARY_PROMPT_VERSION)
+    return _cache
@@ -0,0 +1,233 @@
+"""
+Background AI summary generation.
+
+The summary routes no longer call the model while a gunicorn worker waits.
+They record a row in summary_jobs and hand its id to this worker's
+SummaryJobPool, a bounded thread pool that runs the model call and writes the
+result on its own connection. The client polls the job (any worker can answer,
+since the state is in the database) or, with the notification stream on,
+receives a ``summary`` event when it finishes.
+
+Jobs go through the content cache (utils.summary_cache) when one is given,
+so a paste whose content was summarised before is answered without a model
+call. Summaries served from the cache, or by waiting on another job's call
+for the same content, are not charged.
+
+Otherwise quota is charged only when a summary is stored, in the same transaction, with
+a conditional UPDATE so that concurrent jobs cannot spend more calls or free
+trials than the user has. Submission refuses jobs beyond the user's remaining
+quota minus the jobs they already have in flight.
+
+Settings:
+
+* SUMMARY_WORKERS: model calls run at once per app process (default 4)
+* SUMMARY_QUEUE_LIMIT: jobs waiting per process before new ones are refused
+  (default 100)
+* SUMMARY_JOBS_PER_USER: jobs a user may have in flight (default 2)
+* SUMMARY_JOB_TIMEOUT: seconds after which an unfinished job is reported as
+  failed, e.g. because its worker was restarted (default 120)
+"""
+
+import os
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import DateTime, text
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.environ.get('SUMMARY_WORKERS', 4))
+QUEUE_LIMIT = int(os.environ.get('SUMMARY_QUEUE_LIMIT', 100))
+JOBS_PER_USER = int(os.environ.get('SUMMARY_JOBS_PER_USER', 2))
+JOB_TIMEOUT = int(os.environ.get('SUMMARY_JOB_TIMEOUT', 120))
+
+# Same allowance as User.has_free_ai_trials_available
+MAX_FREE_TRIALS = 3
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Conditional charges: no row is updated once the quota is gone
+CHARGES = {
+    'call': """
+        UPDATE users SET ai_calls_remaining = ai_calls_remaining - 1
+        WHERE id = :user_id AND ai_calls_remaining > 0
+    """,
+    'trial': f"""
+        UPDATE users SET free_ai_trials_used = COALESCE(free_ai_trials_used, 0) + 1
+        WHERE id = :user_id AND COALESCE(free_ai_trials_used, 0) < {MAX_FREE_TRIALS}
+    """,
+}
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+def active_jobs(conn, user_id):
+    """(id, paste_id, status) of the user's unfinished jobs that have not timed out"""
+    return conn.execute(text("""
+        SELECT id, paste_id, status FROM summary_jobs
+        WHERE user_id = :user_id AND status IN ('queued', 'running') AND created_at >= :since
+    """), {'user_id': user_id, 'since': datetime.utcnow() - timedelta(seconds=JOB_TIMEOUT)}).fetchall()
+
+
+def get_job(conn, job_id):
+    """
+    A job as a dict, or None.
+
+    Jobs still unfinished after JOB_TIMEOUT are marked failed on the way out.
+    """
+    row = conn.execute(text("""
+        SELECT id, paste_id, user_id, kind, charge, status, summary, source, error, created_at, finished_at
+        FROM summary_jobs WHERE id = :id
+    """).columns(created_at=DateTime, finished_at=DateTime), {'id': job_id}).fetchone()
+    if row is None:
+        return None
+    job = dict(row._mapping)
+    if job['status'] in ACTIVE_STATUSES and job['created_at'] < datetime.utcnow() - timedelta(seconds=JOB_TIMEOUT):
+        finish(conn, job_id, 'failed', error='The summary took too long. Please try again.')
+        job.update(status='failed', error='The summary took too long. Please try again.')
+    return job
+
+
+def finish(conn, job_id, status, summary=None, error=None, source=None):
+    conn.execute(text("""
+        UPDATE summary_jobs
+        SET status = :status, summary = :summary, source = :source, error = :error, finished_at = :now
+        WHERE id = :id AND status IN ('queued', 'running')
+    """), {'id': job_id, 'status': status, 'summary': summary, 'source': source, 'error': error,
+          'now': datetime.utcnow()})
+
+
+def still_running(conn, job_id):
+    # A no-op UPDATE, so the row stays locked until the result is stored
+    return conn.execute(text(
+        "UPDATE summary_jobs SET status = 'running' WHERE id = :id AND status = 'running'"
+    ), {'id': job_id}).rowcount == 1
+
+
+def run_job(engine, job_id, summarize, cache=None):
+    """
+    Generate one job's summary and store it, charging the user's quota if
+    the model was called for it.
+
+    Returns:
+        dict: The job's final state
+    """
+    with engine.begin() as conn:
+        claimed = conn.execute(text(
+            "UPDATE summary_jobs SET status = 'running' WHERE id = :id AND status = 'queued'"
+        ), {'id': job_id}).rowcount
+        job = conn.execute(text("""
+            SELECT j.user_id, j.paste_id, j.kind, j.charge, p.content, p.syntax
+            FROM summary_jobs j JOIN pastes p ON p.id = j.paste_id
+            WHERE j.id = :id
+        """), {'id': job_id}).fetchone()
+    if not claimed or job is None:
+        return None
+
+    try:
+        if cache is None:
+            summary, source = summarize(job.content, language=job.syntax), 'model'
+        else:
+            summary, source = cache.get_or_generate(job.content, job.syntax, summarize,
+                                                    refresh=job.kind == 'refresh')
+    except Exception as e:
+        logger.error(f"Summary job {job_id} failed: {e}")
+        summary = None
+
+    with engine.begin() as conn:
+        if not summary:
+            finish(conn, job_id, 'failed', error='Failed to generate AI summary. Please try again later.')
+        elif not still_running(conn, job_id):
+            # Reported as timed out meanwhile; the user is not charged for it
+            pass
+        elif (source == 'model' and job.charge in CHARGES
+              and conn.execute(text(CHARGES[job.charge]), {'user_id': job.user_id}).rowcount == 0):
+            finish(conn, job_id, 'failed', error='You have no AI calls remaining.')
+        else:
+            conn.execute(text("UPDATE pastes SET ai_summary = :summary WHERE id = :id"),
+                         {'summary': summary, 'id': job.paste_id})
+            finish(conn, job_id, 'done', summary=summary, source=source)
+        result = get_job(conn, job_id)
+
+    publish_job(job.user_id, result)
+    return result
+
+
+def publish_job(user_id, job):
+    """Tell the user's open notification streams that a job finished"""
+    from utils.notification_events import get_broker
+    try:
+        get_broker().publish(user_id, 'summary', {
+            'job_id': job['id'], 'status': job['status'], 'summary': job['summary'], 'error': job['error'],
+        })
+    except Exception as e:
+        logger.warning(f"Could not publish summary job {job['id']}: {e}")
+
+
+class SummaryJobPool:
+    """This process's bounded pool of summary workers"""
+
+    def __init__(self, engine, summarize, workers=None, queue_limit=None, cache=None):
+        self.engine = engine
+        self.summarize = summarize
+        self.cache = cache
+        self.queue_limit = QUEUE_LIMIT if queue_limit is None else queue_limit
+        self.executor = ThreadPoolExecutor(max_workers=workers or WORKERS, thread_name_prefix='summary-worker')
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def has_capacity(self):
+        with self._lock:
+            return self.pending < self.queue_limit
+
+    def submit(self, job_id):
+        """Queue a committed job; False if the pool is full"""
+        with self._lock:
+            if self.pending >= self.queue_limit:
+                return False
+            self.pending += 1
+        self.executor.submit(self._run, job_id)
+        return True
+
+    def _run(self, job_id):
+        try:
+            run_job(self.engine, job_id, self.summarize, self.cache)
+        except Exception as e:
+            logger.error(f"Summary job {job_id} crashed: {e}")
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+def prune_finished_jobs(engine, days=30, now=None):
+    """
+    Delete jobs that finished more than ``days`` days ago.
+
+    Returns:
+        int: Number of jobs deleted
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    with engine.begin() as conn:
+        return conn.execute(text("DELETE FROM summary_jobs WHERE finished_at < :cutoff"),
+                            {'cutoff': cutoff}).rowcount
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_summary_pool(engine):
+    """The process's pool, created on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from utils import generate_ai_summary
+                from utils.summary_cache import get_summary_cache
+                _pool = SummaryJobPool(engine, generate_ai_summary, cache=get_summary_cache(engine))
+    return _pool
@@ -0,0 +1,252 @@
+"""
+Code symbol index for "jump to definition" style search.
+
+When a paste is created or edited, its Pygments token stream is scanned for
+definition names (functions, classes and variables) and stored in the compact
+paste_symbols table: one row per (paste, lowercased name, kind). The
+``symbol`` search type then answers exact and prefix lookups from the
+name_lower index instead of scanning paste content.
+
+Lexing runs on a single background thread after the request's transaction
+commits, so paste creation does not wait for it, and updates for one paste
+are applied in order.
+"""
+
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from pygments.lexers import get_lexer_by_name
+from pygments.token import Keyword, Name, Operator, Text, Whitespace
+from pygments.util import ClassNotFound
+from sqlalchemy import text, bindparam
+
+from utils.search_backends import PUBLIC_FILTER, SNIPPET_START, SNIPPET_STOP, SearchBackend
+
+logger = logging.getLogger(__name__)
+
+# Per-paste limits keep the table compact for huge generated files
+MAX_SYMBOLS = 500
+MAX_NAME_LENGTH = 100
+MAX_LEXED_CHARS = 512 * 1024
+
+# Declaration keywords whose following name is a definition, for lexers
+# (JavaScript, Go, ...) that do not tag definition names themselves
+DECLARATION_KEYWORDS = {
+    'def': 'function', 'function': 'function', 'func': 'function', 'fn': 'function',
+    'sub': 'function', 'proc': 'function',
+    'class': 'class', 'struct': 'class', 'interface': 'class', 'trait': 'class',
+    'type': 'class', 'enum': 'class', 'module': 'class',
+    'let': 'variable', 'const': 'variable', 'var': 'variable', 'val': 'variable',
+}
+
+# Paste columns that change which symbols a paste has
+INDEXED_ATTRIBUTES = ('content', 'syntax', 'is_encrypted')
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='symbol-index')
+
+# Set once the flush listeners are installed; they are per process, not per app
+_hooks_registered = False
+
+
+def extract_symbols(content, syntax):
+    """
+    Harvest definition names from code.
+
+    Returns:
+        set: (name, kind) pairs, kind being 'function', 'class' or 'variable'
+    """
+    try:
+        lexer = get_lexer_by_name(syntax or 'text')
+    except ClassNotFound:
+        return set()
+
+    symbols = set()
+    pending_kind = None   # set right after a declaration keyword
+    line_start = True     # only whitespace seen since the last newline
+    candidate = None      # name at line start that may be assigned to
+
+    for token, value in lexer.get_tokens((content or '')[:MAX_LEXED_CHARS]):
+        if len(symbols) >= MAX_SYMBOLS:
+            break
+        if token in Text or token in Whitespace:
+            if '\n' in value:
+                line_start, candidate = True, None
+            continue
+
+        kind = None
+        if token in Name.Function:
+            kind = 'function'
+        elif token in Name.Class:
+            kind = 'class'
+        elif token in Name and pending_kind:
+            kind = pending_kind
+        elif token in Operator and value == '=' and candidate:
+            symbols.add((candidate, 'variable'))
+
+        if kind:
+            name = value.lstrip('$@')
+            if name and len(name) <= MAX_NAME_LENGTH:
+                symbols.add((name, kind))
+
+        candidate = value.lstrip('$@') if line_start and token in Name and not kind else None
+        pending_kind = DECLARATION_KEYWORDS.get(value) if token in Keyword else None
+        line_start = False
+
+    return symbols
+
+
+def replace_paste_symbols(engine, paste_id, symbols):
+    """Replace the stored symbols of one paste"""
+    # Names differing only in case (MAX and Max) share a row; keep one spelling
+    rows = {}
+    for name, kind in sorted(symbols):
+        rows.setdefault((name.lower(), kind), name)
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM paste_symbols WHERE paste_id = :paste_id"),
+                     {'paste_id': paste_id})
+        if rows:
+            # The paste may have been deleted while this job was queued
+            conn.execute(text("""
+                INSERT INTO paste_symbols (paste_id, name, name_lower, kind)
+                SELECT :paste_id, :name, :name_lower, :kind
+                WHERE EXISTS (SELECT 1 FROM pastes WHERE id = :paste_id)
+            """), [
+                {'paste_id': paste_id, 'name': name, 'name_lower': name_lower, 'kind': kind}
+                for (name_lower, kind), name in rows.items()
+            ])
+
+
+def index_paste_symbols(engine, paste_id, content, syntax):
+    """Lex a paste and store its symbols (runs on the background thread)"""
+    try:
+        replace_paste_symbols(engine, paste_id, extract_symbols(content, syntax) if content else set())
+    except Exception as e:
+        logger.error(f"Failed to index symbols for paste {paste_id}: {e}")
+
+
+def register_symbol_index_hooks(engine):
+    """
+    Queue symbol indexing for pastes created, edited or deleted in a session.
+
+    Changes are collected on flush and handed to the background thread once
+    the transaction commits. Encrypted pastes get no symbols. Later calls
+    (another create_app() in the same process) do nothing.
+    """
+    from sqlalchemy import event, inspect
+    from sqlalchemy.orm import Session
+
+    global _hooks_registered
+    if _hooks_registered:
+        return
+    _hooks_registered = True
+
+    def snapshot(paste):
+        # Values are read now; after commit the instance is expired
+        return None if paste.is_encrypted else (paste.content, paste.syntax)
+
+    def collect(session, flush_context):
+        pending = session.info.setdefault('symbol_index_pending', {})
+        for paste in session.new:
+            if getattr(paste, '__tablename__', None) == 'pastes':
+                pending[paste.id] = snapshot(paste)
+        for paste in session.dirty:
+            if getattr(paste, '__tablename__', None) != 'pastes':
+                continue
+            attrs = inspect(paste).attrs
+            if any(name in attrs and attrs[name].history.has_changes() for name in INDEXED_ATTRIBUTES):
+                pending[paste.id] = snapshot(paste)
+        for paste in session.deleted:
+            if getattr(paste, '__tablename__', None) == 'pastes':
+                pending[paste.id] = None
+
+    def apply(session):
+        pending = session.info.pop('symbol_index_pending', None)
+        for paste_id, values in (pending or {}).items():
+            content, syntax = values or (None, None)
+            _executor.submit(index_paste_symbols, engine, paste_id, content, syntax)
+
+    def discard(session, previous_transaction):
+        session.info.pop('symbol_index_pending', None)
+
+    event.listen(Session, 'after_flush', collect)
+    event.listen(Session, 'after_commit', apply)
+    event.listen(Session, 'after_soft_rollback', discard)
+
+
+class SymbolSearchBackend(SearchBackend):
+    """
+    Exact and prefix search over definition names in paste_symbols.
+
+    A trailing * asks for prefix matches only; otherwise exact matches rank
+    first, followed by longer names that start with the query.
+    """
+
+    name = 'symbol'
+    fields = ('symbol',)
+
+    @staticmethod
+    def _normalize(query):
+        query = query.strip().lower()
+        return query.rstrip('*'), query.endswith('*')
+
+    @staticmethod
+    def _prefix_condition(conn, prefix):
+        """Index-friendly prefix match on name_lower"""
+        if conn.dialect.name == 'postgresql':
+            # Served by the varchar_pattern_ops index
+            escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            return "s.name_lower LIKE :prefix ESCAPE '\\'", {'prefix': f'{escaped}%'}
+        # SQLite only uses an index for LIKE with case_sensitive_like, so use
+        # the equivalent range scan
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return "s.name_lower >= :prefix AND s.name_lower < :upper", {'prefix': prefix, 'upper': upper}
+
+    def search(self, conn, query, field='symbol', now=None, offset=0, limit=20):
+        name, prefix_only = self._normalize(query)
+        if not name:
+            return [], 0
+        condition, params = self._prefix_condition(conn, name)
+
+        rows = conn.execute(text(f"""
+            SELECT p.id, MIN(CASE WHEN s.name_lower = :exact THEN 0 ELSE 1 END) AS rank,
+                   COUNT(*) OVER () AS total
+            FROM paste_symbols s
+            JOIN pastes p ON p.id = s.paste_id
+            WHERE {condition} AND {PUBLIC_FILTER}
+            GROUP BY p.id, p.created_at
+            ORDER BY rank, p.created_at DESC
+            LIMIT :limit OFFSET :offset
+        """), {
+            'exact': '' if prefix_only else name,
+            'visibility': 'public',
+            'now': now or datetime.utcnow(),
+            'limit': limit,
+            'offset': offset,
+            **params,
+        }).fetchall()
+
+        total = rows[0][2] if rows else 0
+        return [(row[0], -row[1]) for row in rows], total
+
+    def snippets(self, conn, query, field, paste_ids):
+        name, _ = self._normalize(query)
+        if not name or not paste_ids:
+            return {}
+        condition, params = self._prefix_condition(conn, name)
+        rows = conn.execute(
+            text(f"""
+                SELECT s.paste_id, s.kind, s.name FROM paste_symbols s
+                WHERE {condition} AND s.paste_id IN :ids
+                ORDER BY s.paste_id, s.kind, s.name
+            """).bindparams(bindparam('ids', expanding=True)),
+            {'ids': list(paste_ids), **params},
+        ).fetchall()
+
+        result = {}
+        for paste_id, kind, symbol in rows:
+            marked = SNIPPET_START + symbol[:len(name)] + SNIPPET_STOP + symbol[len(name):]
+            entry = f'{kind} {marked}'
+            result[paste_id] = f'{result[paste_id]}, {entry}' if paste_id in result else entry
+        return result
@@ -0,0 +1,229 @@
+"""
+Per-user, per-day activity rollups for the user dashboard.
+
+user_daily_stats holds one row per (user, UTC day) with the pastes the user
+created, views their pastes received, comments their pastes received and
+comments they made. Rows are maintained incrementally: session flush hooks
+turn new/deleted Paste, PasteView and Comment objects into upserts executed
+on the flushing connection, so the rollup commits or rolls back together with
+the write that caused it.
+
+Bulk query.delete() calls bypass the hook, so reconcile_user_stats()
+periodically recomputes recent days from the raw tables (see
+reconcile_user_stats.py). Views older than the live paste_views partitions
+are read from their daily rollups (see utils.view_partitions).
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('pastes_created', 'views_received', 'comments_received', 'comments_made')
+
+_UPSERT_SET = ', '.join(
+    f"{column} = user_daily_stats.{column} + excluded.{column}" for column in COUNTERS
+)
+
+# Deltas for a known user
+USER_UPSERT = f"""
+    INSERT INTO user_daily_stats (user_id, day, {', '.join(COUNTERS)})
+    VALUES (:user_id, :day, :pastes_created, :views_received, :comments_received, :comments_made)
+    ON CONFLICT (user_id, day) DO UPDATE SET {_UPSERT_SET}
+"""
+
+# Deltas for whoever owns a paste; guest pastes have no owner and no row
+PASTE_OWNER_UPSERT = f"""
+    INSERT INTO user_daily_stats (user_id, day, {', '.join(COUNTERS)})
+    SELECT p.user_id, :day, :pastes_created, :views_received, :comments_received, :comments_made
+    FROM pastes p
+    WHERE p.id = :paste_id AND p.user_id IS NOT NULL
+    ON CONFLICT (user_id, day) DO UPDATE SET {_UPSERT_SET}
+"""
+
+
+def _day(value):
+    return (value or datetime.utcnow()).date()
+
+
+def _add(deltas, key, counter, amount):
+    row = deltas.setdefault(key, dict.fromkeys(COUNTERS, 0))
+    row[counter] += amount
+
+
+def collect_deltas(new, deleted):
+    """
+    Turn flushed objects into rollup deltas.
+
+    Returns:
+        tuple: ({(user_id, day): counters}, {(paste_id, day): counters})
+    """
+    by_user, by_paste = {}, {}
+    for objects, sign in ((new, 1), (deleted, -1)):
+        for obj in objects:
+            table = getattr(obj, '__tablename__', None)
+            if table == 'pastes' and obj.user_id:
+                _add(by_user, (obj.user_id, _day(obj.created_at)), 'pastes_created', sign)
+            elif table == 'paste_views' and sign > 0:
+                # Views are only ever removed in bulk, which reconciliation handles
+                _add(by_paste, (obj.paste_id, _day(obj.created_at)), 'views_received', sign)
+            elif table == 'comments':
+                _add(by_paste, (obj.paste_id, _day(obj.created_at)), 'comments_received', sign)
+                if obj.user_id:
+                    _add(by_user, (obj.user_id, _day(obj.created_at)), 'comments_made', sign)
+    return by_user, by_paste
+
+
+def apply_deltas(conn, by_user, by_paste):
+    """Upsert collected deltas on ``conn``"""
+    if by_user:
+        conn.execute(text(USER_UPSERT), [
+            {'user_id': user_id, 'day': day, **counters}
+            for (user_id, day), counters in by_user.items()
+        ])
+    if by_paste:
+        conn.execute(text(PASTE_OWNER_UPSERT), [
+            {'paste_id': paste_id, 'day': day, **counters}
+            for (paste_id, day), counters in by_paste.items()
+        ])
+
+
+def _before_flush(session, flush_context, instances):
+    # Deleted objects are read now, while their rows still exist and expired
+    # attributes can be loaded
+    if session.deleted:
+        by_user, by_paste = collect_deltas((), session.deleted)
+        session.info['user_stats_deleted'] = (by_user, by_paste)
+
+
+def _after_flush(session, flush_context):
+    # New objects are read now, once column defaults such as created_at have
+    # been filled in
+    by_user, by_paste = collect_deltas(session.new, ())
+    deleted_by_user, deleted_by_paste = session.info.pop('user_stats_deleted', ({}, {}))
+    for deltas, extra in ((by_user, deleted_by_user), (by_paste, deleted_by_paste)):
+        for key, counters in extra.items():
+            for counter, amount in counters.items():
+                _add(deltas, key, counter, amount)
+    if by_user or by_paste:
+        apply_deltas(session.connection(), by_user, by_paste)
+
+
+def register_user_stats_hooks():
+    """
+    Maintain user_daily_stats from every ORM flush.
+
+    The listeners are module-level functions, so calling this again (a
+    second create_app() in the same process) does not add them twice.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    if event.contains(Session, 'after_flush', _after_flush):
+        return
+    event.listen(Session, 'before_flush', _before_flush)
+    event.listen(Session, 'after_flush', _after_flush)
+
+
+def reconcile_user_stats(conn, since=None, user_id=None):
+    """
+    Recompute rollups from the raw tables.
+
+    Rows for days on or after ``since`` (all days if None), optionally for a
+    single user, are replaced by fresh aggregates of pastes, paste_views
+    (live partitions plus the rollups of dropped ones) and comments.
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    from utils.view_partitions import has_catalog, view_source
+
+    filters = {'pastes': [], 'views': [], 'view_rollups': [], 'received': [], 'made': [], 'rollup': []}
+    params = {}
+    if since is not None:
+        params['since'] = datetime.combine(since, datetime.min.time())
+        params['since_day'] = since
+        filters['pastes'].append("p.created_at >= :since")
+        filters['views'].append("v.created_at >= :since")
+        filters['view_rollups'].append("r.day >= :since_day")
+        filters['received'].append("c.created_at >= :since")
+        filters['made'].append("c.created_at >= :since")
+        filters['rollup'].append("day >= :since_day")
+    if user_id is not None:
+        params['user_id'] = user_id
+        for key in ('pastes', 'views', 'view_rollups', 'received'):
+            filters[key].append("p.user_id = :user_id")
+        filters['made'].append("c.user_id = :user_id")
+        filters['rollup'].append("user_id = :user_id")
+
+    def where(key, *base):
+        clauses = list(base) + filters[key]
+        return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    view_rollups = ""
+    if has_catalog(conn):
+        view_rollups = f"""
+            UNION ALL
+            SELECT p.user_id, r.day, 0, r.views, 0, 0
+            FROM paste_view_daily r JOIN pastes p ON p.id = r.paste_id
+            {where('view_rollups', 'p.user_id IS NOT NULL')}
+        """
+
+    conn.execute(text(f"DELETE FROM user_daily_stats {where('rollup')}"), params)
+    result = conn.execute(text(f"""
+        INSERT INTO user_daily_stats (user_id, day, {', '.join(COUNTERS)})
+        SELECT user_id, day, SUM(pastes), SUM(views), SUM(received), SUM(made)
+        FROM (
+            SELECT p.user_id, DATE(p.created_at) AS day, 1 AS pastes, 0 AS views, 0 AS received, 0 AS made
+            FROM pastes p {where('pastes', 'p.user_id IS NOT NULL')}
+            UNION ALL
+            SELECT p.user_id, DATE(v.created_at), 0, 1, 0, 0
+            FROM {view_source(conn, params.get('since'))} v JOIN pastes p ON p.id = v.paste_id
+            {where('views', 'p.user_id IS NOT NULL')}
+            {view_rollups}
+            UNION ALL
+            SELECT p.user_id, DATE(c.created_at), 0, 0, 1, 0
+            FROM comments c JOIN pastes p ON p.id = c.paste_id
+            {where('received', 'p.user_id IS NOT NULL')}
+            UNION ALL
+            SELECT c.user_id, DATE(c.created_at), 0, 0, 0, 1
+            FROM comments c {where('made', 'c.user_id IS NOT NULL')}
+        ) AS activity
+        GROUP BY user_id, day
+    """), params)
+    return result.rowcount
+
+
+def get_daily_stats(conn, user_id, days=30, now=None):
+    """
+    Rollup totals plus the last ``days`` days for one user.
+
+    Returns:
+        tuple: (dict of all-time totals, {date: counters} for recent days)
+    """
+    today = _day(now)
+    rows = conn.execute(text(f"""
+        SELECT day, {', '.join(COUNTERS)} FROM user_daily_stats
+        WHERE user_id = :user_id AND day > :start
+    """), {'user_id': user_id, 'start': today - timedelta(days=days)}).fetchall()
+    recent = {}
+    for row in rows:
+        day = row[0] if not isinstance(row[0], str) else datetime.strptime(row[0], '%Y-%m-%d').date()
+        recent[day] = dict(zip(COUNTERS, row[1:]))
+
+    totals_row = conn.execute(text(f"""
+        SELECT {', '.join(f'COALESCE(SUM({column}), 0)' for column in COUNTERS)}
+        FROM user_daily_stats WHERE user_id = :user_id
+    """), {'user_id': user_id}).one()
+    return dict(zip(COUNTERS, totals_row)), recent
+
+
+def sum_recent(recent, counter, days, now=None):
+    """Sum one counter over the last ``days`` days, today included"""
+    today = _day(now)
+    return sum(
+        counters[counter] for day, counters in recent.items()
+        if day > today - timedelta(days=days)
+    )
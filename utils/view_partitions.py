@@ -0,0 +1,263 @@
+"""
+Time-partitioned paste view storage.
+
+paste_views is split by month so that old views can be retired by dropping a
+whole table instead of deleting rows one by one.
+
+PostgreSQL: paste_views is a native RANGE partitioned table on created_at,
+with one paste_views_pYYYY_MM partition per month created ahead of time and a
+paste_views_default partition catching anything outside them.
+
+SQLite: the application keeps writing to a plain paste_views table, which is
+rotated at the start of each month: it is renamed to paste_views_pYYYY_MM (an
+O(1) catalog change) and an empty paste_views takes its place. Readers that
+need a time window go through view_source(), which routes to the tables that
+cover it. Unique-viewer checks only see the current month's table.
+
+Both keep a catalog in paste_view_partitions. Once a partition is older than
+PASTE_VIEW_RETENTION_MONTHS it is rolled up into paste_view_daily (views per
+paste per day) and dropped. Readers add the rollups for the days whose
+partitions are gone.
+"""
+
+import os
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+# Whole months of raw view rows kept before they are rolled up and dropped
+RETENTION_MONTHS = int(os.environ.get('PASTE_VIEW_RETENTION_MONTHS', 3))
+
+# Months of PostgreSQL partitions created ahead of time
+AHEAD_MONTHS = 2
+
+ACTIVE_TABLE = 'paste_views'
+DEFAULT_PARTITION = 'paste_views_default'
+PARTITION_PREFIX = 'paste_views_p'
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def _literal(value):
+    # Partition bounds are DDL and cannot be bound parameters
+    return f"'{value:%Y-%m-%d %H:%M:%S}'"
+
+
+def has_catalog(conn):
+    return inspect(conn).has_table('paste_view_partitions')
+
+
+def is_partitioned(conn):
+    """True once paste_views is a PostgreSQL partitioned table"""
+    return bool(conn.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = :name AND pg_table_is_visible(c.oid)
+    """), {'name': ACTIVE_TABLE}).scalar())
+
+
+def list_partitions(conn, live=True):
+    """
+    Catalogued partitions, oldest first.
+
+    Args:
+        live: Only partitions that have not been rolled up and dropped
+    """
+    where = "WHERE rolled_up_at IS NULL" if live else ""
+    return conn.execute(text(f"""
+        SELECT name, range_start, range_end, row_count, rolled_up_at
+        FROM paste_view_partitions {where}
+        ORDER BY range_start
+    """)).fetchall()
+
+
+def _catalog(conn, name, range_start, range_end):
+    conn.execute(text("""
+        INSERT INTO paste_view_partitions (name, range_start, range_end, row_count)
+        VALUES (:name, :range_start, :range_end, 0)
+        ON CONFLICT (name) DO UPDATE SET range_start = excluded.range_start, range_end = excluded.range_end
+    """), {'name': name, 'range_start': range_start, 'range_end': range_end})
+
+
+def create_pg_partition(conn, month):
+    """
+    Create and attach the partition for ``month`` unless it exists.
+
+    Rows that already landed in the default partition for that month are
+    moved into the new partition first, since PostgreSQL refuses to attach a
+    range the default partition still holds rows for.
+
+    Returns:
+        bool: True if a partition was created
+    """
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar():
+        return False
+    start, end = _literal(month), _literal(add_months(month, 1))
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {ACTIVE_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    if conn.execute(text("SELECT to_regclass(:name)"), {'name': DEFAULT_PARTITION}).scalar():
+        in_range = f"created_at >= {start} AND created_at < {end}"
+        conn.execute(text(f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE {in_range}"))
+        conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}"))
+    conn.execute(text(f"ALTER TABLE {ACTIVE_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})"))
+    _catalog(conn, name, month, add_months(month, 1))
+    return True
+
+
+def rotate_sqlite(conn, now):
+    """
+    Swap in an empty paste_views if the current one started before this month.
+
+    Returns:
+        str: Name the old table was renamed to, or None if no rotation was due
+    """
+    active = conn.execute(text(
+        "SELECT range_start FROM paste_view_partitions WHERE name = :name"
+    ), {'name': ACTIVE_TABLE}).scalar()
+    if active is None:
+        # First run: the existing table becomes the active partition
+        first = conn.execute(text(f"SELECT MIN(created_at) FROM {ACTIVE_TABLE}")).scalar()
+        _catalog(conn, ACTIVE_TABLE, first or now, None)
+        return None
+    if isinstance(active, str):
+        active = datetime.fromisoformat(active)
+    if active >= month_start(now):
+        return None
+
+    sealed = partition_name(month_start(active))
+    table_sql = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {'name': ACTIVE_TABLE}).scalar()
+    indexes = conn.execute(text("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = :name AND sql IS NOT NULL
+    """), {'name': ACTIVE_TABLE}).fetchall()
+
+    # Catalog writes come first: pysqlite only opens a transaction on DML,
+    # and the DDL below must run inside it
+    conn.execute(text("UPDATE paste_view_partitions SET name = :sealed, range_end = :now WHERE name = :name"),
+                 {'sealed': sealed, 'now': now, 'name': ACTIVE_TABLE})
+    _catalog(conn, ACTIVE_TABLE, now, None)
+    conn.execute(text(f"ALTER TABLE {ACTIVE_TABLE} RENAME TO {sealed}"))
+    for index_name, index_sql in indexes:
+        # The sealed table is only read in full by the rollup; its index
+        # names are needed for the new table
+        conn.execute(text(f'DROP INDEX "{index_name}"'))
+    conn.execute(text(table_sql))
+    for index_name, index_sql in indexes:
+        conn.execute(text(index_sql))
+    return sealed
+
+
+def roll_up_partition(conn, name):
+    """
+    Fold a partition into paste_view_daily and drop it.
+
+    Views of pastes that no longer exist are discarded.
+
+    Returns:
+        int: Number of view rows rolled up
+    """
+    count = conn.execute(text(f"""
+        SELECT COUNT(*) FROM {name} v JOIN pastes p ON p.id = v.paste_id
+    """)).scalar()
+    conn.execute(text("UPDATE paste_view_partitions SET rolled_up_at = :now, row_count = :count WHERE name = :name"),
+                 {'now': datetime.utcnow(), 'count': count, 'name': name})
+    conn.execute(text(f"""
+        INSERT INTO paste_view_daily (paste_id, day, views)
+        SELECT v.paste_id, DATE(v.created_at), COUNT(*)
+        FROM {name} v JOIN pastes p ON p.id = v.paste_id
+        WHERE v.created_at IS NOT NULL
+        GROUP BY v.paste_id, DATE(v.created_at)
+        ON CONFLICT (paste_id, day) DO UPDATE SET views = paste_view_daily.views + excluded.views
+    """))
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(f"ALTER TABLE {ACTIVE_TABLE} DETACH PARTITION {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
+    return count
+
+
+def maintain_partitions(engine, now=None, retention_months=None, ahead=AHEAD_MONTHS):
+    """
+    Create upcoming partitions (PostgreSQL) or rotate the active table
+    (SQLite), then roll up and drop partitions past the retention period.
+
+    Each step commits on its own.
+
+    Returns:
+        dict: {'created': [names], 'rolled_up': {name: rows}}
+    """
+    now = now or datetime.utcnow()
+    retention = RETENTION_MONTHS if retention_months is None else retention_months
+    created = []
+
+    if engine.dialect.name == 'postgresql':
+        this_month = month_start(now)
+        for offset in range(ahead + 1):
+            with engine.begin() as conn:
+                month = add_months(this_month, offset)
+                if create_pg_partition(conn, month):
+                    created.append(partition_name(month))
+    else:
+        with engine.begin() as conn:
+            sealed = rotate_sqlite(conn, now)
+        if sealed:
+            created.append(sealed)
+
+    cutoff = add_months(month_start(now), -retention)
+    rolled_up = {}
+    with engine.connect() as conn:
+        expired = [
+            row.name for row in list_partitions(conn)
+            if row.name not in (ACTIVE_TABLE, DEFAULT_PARTITION)
+            and row.range_end is not None and _as_datetime(row.range_end) <= cutoff
+        ]
+    for name in expired:
+        with engine.begin() as conn:
+            rolled_up[name] = roll_up_partition(conn, name)
+    return {'created': created, 'rolled_up': rolled_up}
+
+
+def _as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def view_source(conn, since=None):
+    """
+    SQL usable in a FROM clause yielding the live (paste_id, created_at) view rows.
+
+    On PostgreSQL the partitioned parent already covers every live partition.
+    On SQLite the sealed monthly tables that overlap ``since`` are unioned
+    with the active one.
+    """
+    if conn.dialect.name == 'postgresql' or not has_catalog(conn):
+        return ACTIVE_TABLE
+    tables = [ACTIVE_TABLE]
+    for row in list_partitions(conn):
+        if row.name == ACTIVE_TABLE:
+            continue
+        if since is None or row.range_end is None or _as_datetime(row.range_end) > since:
+            tables.append(row.name)
+    if len(tables) == 1:
+        return ACTIVE_TABLE
+    return "(" + " UNION ALL ".join(f"SELECT paste_id, created_at FROM {table}" for table in tables) + ")"
+
+
+def rolled_up_views(conn):
+    """Number of view rows that now live only in paste_view_daily"""
+    if not has_catalog(conn):
+        return 0
+    return int(conn.execute(text(
+        "SELECT COALESCE(SUM(row_count), 0) FROM paste_view_partitions WHERE rolled_up_at IS NOT NULL"
+    )).scalar())